@@ -7,10 +7,17 @@ for interacting with `Myanimelist <https://myanimelist.net/>`__ data, as well as
 
 __all__ = ["SyncKunYu"]
 
-from typing import Dict, Optional, List
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional, List, Union
 import httpx
 from ._model import Anime, Character
 from .sync_malscraper import SyncMalScraper
+from ._cache_utils import SEARCH_TTL, CacheLimit, CacheTTL
+from ._cache_query import AnimeQuery
+from ._cache_backend import CacheBackend
+from ._archive import reparse
+from ._cache_transfer import export_cache, import_cache
 
 
 
@@ -23,7 +30,22 @@ class SyncKunYu:
         self, 
         use_cache: bool = False,
         db_path: str = "cache.db",
-        timeout: int = 10
+        timeout: int = 10,
+        local_search: bool = False,
+        local_search_score: float = 90,
+        search_ttl: Optional[float] = SEARCH_TTL,
+        cache_batch_size: int = 100,
+        cache_flush_interval: float = 0.05,
+        cache_synchronous: Optional[str] = None,
+        cache_ttl: Optional[CacheTTL] = None,
+        stale_while_revalidate: bool = False,
+        memory_cache_entries: Optional[int] = None,
+        memory_cache_bytes: Optional[int] = None,
+        cache_compression: Optional[str] = None,
+        archive_pages: bool = False,
+        cache_limit: Optional[CacheLimit] = None,
+        cache_backend: Optional[CacheBackend] = None,
+        cache_process_lock: bool = False
     ) -> None:
 
         """
@@ -32,10 +54,51 @@ class SyncKunYu:
         Args:
             use_cache (bool): If data should be cached. (Default: False)
             db_path: (str): The path of the database. (Default: cache.db)
+            local_search (bool): Let `search_anime` return a cached anime without going to MAL when one of its
+                titles (title, english or japanese) matches the query with a score of at least `local_search_score`.
+                Only used with ``use_cache=True``. (Default: False)
+            local_search_score (float): Minimum match score (0-100) for a local search result. (Default: 90)
+            search_ttl (Optional[float]): Seconds a searched name keeps resolving to the MAL id it was cached with,
+                so repeated searches skip the search page. None never expires. Only used with ``use_cache=True``. (Default: 7 days)
+            cache_batch_size (int): Cache writes are queued and written in one transaction once this many are pending,
+                or after `cache_flush_interval` seconds. Everything left is written when the scraper exits.
+                1 writes every row right away. (Default: 100)
+            cache_flush_interval (float): Seconds a queued cache write waits at most. (Default: 0.05)
+            cache_synchronous (Optional[str]): SQLite ``PRAGMA synchronous`` of the cache: "OFF", "NORMAL", "FULL" or "EXTRA".
+                "NORMAL" or "OFF" trade durability on a power loss for fewer fsyncs. (Default: None, SQLite's default)
+            cache_ttl (Optional[CacheTTL]): How long cached anime and characters stay fresh before they are fetched again,
+                e.g. ``CacheTTL(airing=3600)``. Airing anime get a shorter TTL than finished ones. (Default: None, never expire)
+            stale_while_revalidate (bool): Return an expired cached anime/character right away and refresh it in the background.
+                Refreshes still running are finished before the scraper exits. (Default: False)
+            memory_cache_entries (Optional[int]): Keep up to this many anime/characters in memory in front of the SQLite cache,
+                so a hot entry needs no query or json decode. Objects from it are shared between calls, don't modify them.
+                Only used with ``use_cache=True``. (Default: None, off)
+            memory_cache_bytes (Optional[int]): Bound the memory cache by the cached size of its entries instead of (or as well as)
+                their count. (Default: None)
+            cache_compression (Optional[str]): Compress new cache rows, "zlib" or "zdict" (zlib with a preset dictionary of
+                the anime/character json keys and common values, smaller again on these small rows). Rows written before or with another
+                setting still read. Only used with ``use_cache=True``. (Default: None, uncompressed)
+            archive_pages (bool): Also keep every fetched anime and character page in the cache (zlib compressed, with its
+                fetch time and response headers), so `reparse` can rebuild the cache after a parser fix without fetching
+                anything. Only used with ``use_cache=True``. (Default: False)
+            cache_limit (Optional[CacheLimit]): Keep the SQLite cache under a size, e.g. ``CacheLimit(max_bytes=500 * 2**20)``
+                or ``CacheLimit(max_rows=20000, policy="lfu")``. Reads are recorded and the least recently ("lru") or least
+                often ("lfu") read anime/characters over the limit are deleted, a batch per cache write.
+                Only used with ``use_cache=True``. (Default: None, no limit)
+            cache_backend (Optional[CacheBackend]): Keep the cache somewhere else than SQLite: a ``MemoryBackend()``,
+                a ``FileBackend("cache_dir")`` (a file per anime/character, shared by any number of processes) or your own
+                class with the `CacheBackend` methods. Passing one turns the cache on. The batching, compression, ``cache_limit`` and
+                ``archive_pages`` options are SQLite only. (Default: None, SQLite at `db_path`)
+            cache_process_lock (bool): Set when several processes share the SQLite cache (e.g. server workers): their cache writers
+                take turns through an flock of ``<db_path>.lock`` instead of racing for SQLite's write lock. Every write already
+                waits for and retries a locked database, this keeps those waits short under load. Not available on Windows. (Default: False)
         """
 
 
         self._shared_client: Optional[httpx.Client] = None
+        self._entered = False
+        self._users = 0 # calls in flight outside `with`
+        self._opening = threading.Lock()
         self.use_cache = use_cache
         self.db_path = db_path
         self.timeout = timeout
@@ -44,31 +107,79 @@ class SyncKunYu:
             use_cache=self.use_cache,
             db_path=self.db_path,
             timeout=self.timeout,
+            local_search=local_search,
+            local_search_score=local_search_score,
+            search_ttl=search_ttl,
+            cache_batch_size=cache_batch_size,
+            cache_flush_interval=cache_flush_interval,
+            cache_synchronous=cache_synchronous,
+            cache_ttl=cache_ttl,
+            stale_while_revalidate=stale_while_revalidate,
+            memory_cache_entries=memory_cache_entries,
+            memory_cache_bytes=memory_cache_bytes,
+            cache_compression=cache_compression,
+            archive_pages=archive_pages,
+            cache_limit=cache_limit,
+            cache_backend=cache_backend,
+            cache_process_lock=cache_process_lock,
         )
     
 
     def __enter__(self):
-        self._shared_client = httpx.Client(headers={
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.5",
-        "Connection": "keep-alive",
-        "Upgrade-Insecure-Requests": "1"
-
-        })
+        """
+        Opens one client (a keep-alive connection pool) and the cache for every call until exit,
+        so the TCP/TLS handshakes and the cache setup are paid once.
+        """
+        self._shared_client = self._Scraper._new_client()
+        self._Scraper.client = self._shared_client
+        self._Scraper.own_client = False
+        self._Scraper.__enter__()
+        self._entered = True
         return self
 
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if self._shared_client:
-            self._shared_client.close()
-
-    def search_anime(self, anime_name: str)-> Anime:
+        self._entered = False
+        try:
+            self._Scraper.__exit__(exc_type, exc_val, exc_tb)
+        finally:
+            if self._shared_client:
+                self._shared_client.close()
+                self._shared_client = None
+            self._Scraper.client = None
+            self._Scraper.own_client = True
+
+
+    @contextmanager
+    def _open(self)-> Iterator[SyncMalScraper]:
+        """
+        The open scraper. Inside ``with SyncKunYu()`` it is the one opened on entry, otherwise
+        it is opened by the first call in flight and closed after the last one, so calls from
+        several threads share its client and cache instead of closing them under each other.
+        """
+        if self._entered:
+            yield self._Scraper
+            return
+        with self._opening:
+            if self._users == 0:
+                self._Scraper.__enter__()
+            self._users += 1
+        try:
+            yield self._Scraper
+        finally:
+            with self._opening:
+                self._users -= 1
+                if self._users == 0:
+                    self._Scraper.__exit__(None, None, None)
+
+
+    def search_anime(self, anime_name: str, fields: Optional[Iterable[str]] = None)-> Anime:
         """
         Fetches and Returns Anime details from myanimelist.
 
         Args:
             anime_name (str): Name of the anime you want to search.
+            fields (Optional[Iterable[str]]): Only parse these `Anime` fields (e.g. ["title", "stats", "genres"]), the others are None. (Default: None, every field)
         
         Returns:
             Anime: Returns Anime object with anime details.
@@ -81,8 +192,8 @@ class SyncKunYu:
 
         """
 
-        with self._Scraper as scraper:
-            anime = scraper.search_anime(anime_name)
+        with self._open() as scraper:
+            anime = scraper.search_anime(anime_name, fields)
             return anime
 
 
@@ -105,23 +216,25 @@ class SyncKunYu:
         Notes:
             You can use ``with SyncKunYu`` context manager for same session use.
         """
-        with self._Scraper as scraper:
+        with self._open() as scraper:
             character = scraper.search_character(character_name)
             return character 
 
 
-    def get_anime(self, anime_id: str)->Anime:
+    def get_anime(self, anime_id: str, fields: Optional[Iterable[str]] = None, lazy: bool = False)->Anime:
         """
         Fetches anime details from MyAnimeList.
 
         Args:
             anime_id (str): The ID of the anime.
+            fields (Optional[Iterable[str]]): Only parse these `Anime` fields (e.g. ["title", "stats", "genres"]), the others are None. (Default: None, every field)
+            lazy (bool): Return a `LazyAnime` that parses each section (stats, characters etc.) when it is first read. Useful when only a few fields are used. (Default: False)
 
         Returns:
             Anime: An object containing anime details.
         """
-        with self._Scraper as scraper:
-            anime = scraper.get_anime(anime_id)
+        with self._open() as scraper:
+            anime = scraper.get_anime(anime_id, fields, lazy)
             return anime
 
     def get_character(self, character_id: str)-> Character:
@@ -134,23 +247,25 @@ class SyncKunYu:
         Returns:
             Character: An object containing character details.
         """
-        with self._Scraper as scraper:
+        with self._open() as scraper:
             character = scraper.get_character(character_id)
             return character
 
 
-    def get_batch_anime(self, anime_ids: List[str])-> List[Anime]:
+    def get_batch_anime(self, anime_ids: List[str], fields: Optional[Iterable[str]] = None, lazy: bool = False)-> List[Anime]:
         """
         Fetches multiple anime from the list of anime id.
 
         Args:
             anime_ids (List[str]): A list of anime id. (anime ID from Myanimelist)
+            fields (Optional[Iterable[str]]): Only parse these `Anime` fields (e.g. ["title", "stats", "genres"]), the others are None. (Default: None, every field)
+            lazy (bool): Return `LazyAnime` objects that parse each section (stats, characters etc.) when it is first read. Useful when only a few fields are used. (Default: False)
 
         Returns:
             List[Anime]: A list of Anime object containing anime details.
         """
-        with self._Scraper as scraper:
-            anime = scraper.get_batch_anime(anime_ids)
+        with self._open() as scraper:
+            anime = scraper.get_batch_anime(anime_ids, fields, lazy)
             return anime
 
 
@@ -164,22 +279,23 @@ class SyncKunYu:
         Returns:
             List[Character]: A list of Character object containing character details.
         """
-        with self._Scraper as scraper:
+        with self._open() as scraper:
             characters = scraper.get_batch_character(character_ids)
             return characters
 
-    def search_batch_anime(self, anime_names: List[str])-> List[Anime]:
+    def search_batch_anime(self, anime_names: List[str], fields: Optional[Iterable[str]] = None)-> List[Anime]:
         """
         Fetches anime details in batch.
         Args:
             anime_names (List(str)): List of anime names.
+            fields (Optional[Iterable[str]]): Only parse these `Anime` fields (e.g. ["title", "stats", "genres"]), the others are None. (Default: None, every field)
 
         Returns:
             List[Anime]: A list of Anime objects with Anime details.
         """
 
-        with self._Scraper as scraper:
-            anime_list = scraper.search_batch_anime(anime_names)
+        with self._open() as scraper:
+            anime_list = scraper.search_batch_anime(anime_names, fields)
 
         return anime_list
     
@@ -195,7 +311,7 @@ class SyncKunYu:
             List[Character]: A list of Character objects with character's details.
         """
 
-        with self._Scraper as scraper:
+        with self._open() as scraper:
             batch_characters = scraper.search_batch_character(character_names)
 
         return batch_characters
@@ -210,6 +326,125 @@ class SyncKunYu:
         Returns:
             List[Dict[str, str]]: Returns a list/array of dictionary with anime name, img, url
         """
-        with self._Scraper as scraper:
+        with self._open() as scraper:
             topAnime = scraper.top_anime(sort_by)
         return topAnime
+
+
+    def query_cached(
+        self,
+        genre: Union[str, Iterable[str], None] = None,
+        studio: Union[str, Iterable[str], None] = None,
+        anime_type: Optional[str] = None,
+        status: Optional[str] = None,
+        year: Optional[int] = None,
+        season: Optional[str] = None,
+        min_score: Optional[float] = None,
+        max_score: Optional[float] = None,
+        max_rank: Optional[int] = None,
+        min_members: Optional[int] = None,
+        order_by: str = "score",
+        descending: Optional[bool] = None,
+        limit: Optional[int] = None
+    )-> List[Anime]:
+        """
+        Searches the anime already in the cache, without going to MAL. The filters and the sort run in SQL
+        on side tables kept next to the cache, so only the matching anime are decoded.
+        Needs ``use_cache=True`` with the SQLite cache.
+
+        Args:
+            genre (Union[str, Iterable[str], None]): Genre(s) the anime must all have, e.g. "Action". (Default: None)
+            studio (Union[str, Iterable[str], None]): Studio(s) the anime must all have. (Default: None)
+            anime_type (Optional[str]): "TV", "Movie", "OVA", ... (Default: None)
+            status (Optional[str]): "Finished Airing", "Currently Airing", ... (Default: None)
+            year (Optional[int]): Year the anime premiered (or first aired). (Default: None)
+            season (Optional[str]): "winter", "spring", "summer" or "fall". (Default: None)
+            min_score (Optional[float]): Lowest score, anime without a score never match. (Default: None)
+            max_score (Optional[float]): Highest score. (Default: None)
+            max_rank (Optional[int]): Only anime ranked this high or higher (#1 is the highest). (Default: None)
+            min_members (Optional[int]): Fewest members. (Default: None)
+            order_by (str): "score", "rank", "popularity", "members", "year" or "title". (Default: score)
+            descending (Optional[bool]): Sort order, None sorts score, members and year from the highest and
+                rank, popularity and title from the first. (Default: None)
+            limit (Optional[int]): Most anime returned. (Default: None, all)
+
+        Returns:
+            List[Anime]: The matching cached anime, sorted.
+
+        Example:
+            >>> top_action = scraper.query_cached(genre="Action", min_score=8, limit=10)
+        """
+        query = AnimeQuery(
+            genre, studio, anime_type, status, year, season, min_score, max_score, max_rank, min_members,
+            order_by, descending, limit
+        )
+        with self._open() as scraper:
+            return scraper.query_cached(query)
+
+
+    def cache_stats(self)-> Dict[str, int]:
+        """
+        Returns the memory cache counters: entries, bytes, hits, misses and evictions
+        (if ``memory_cache_entries``/``memory_cache_bytes`` were set), and the counters of the
+        cache backend prefixed with ``cache_``: ``cache_hits``, ``cache_misses``, ``cache_puts``,
+        ``cache_deletes``, plus ``cache_flushes`` and ``cache_evictions`` (rows deleted to stay
+        under ``cache_limit``) for SQLite.
+        """
+        return self._Scraper.cache_stats()
+
+
+    def reparse(self, workers: Optional[int] = None)-> Dict[str, int]:
+        """
+        Rebuilds the cached anime and characters from the pages archived with ``archive_pages=True``,
+        parsing them in a process pool instead of fetching them again. Needs the SQLite cache,
+        queued cache writes are flushed first.
+
+        Args:
+            workers (Optional[int]): Number of parse processes. (Default: None, one per core)
+
+        Returns:
+            Dict[str, int]: How many anime and characters were rebuilt and how many pages failed to parse.
+        """
+        with self._open() as scraper:
+            backend = scraper._sqlite_cache("reparse")
+            counts = reparse(backend.db_path, workers, compression=backend.compression)
+            scraper._cache_rewritten()
+        return counts
+
+
+    def export_cache(self, path: str, tables: Iterable[str] = ("anime", "character"))-> Dict[str, int]:
+        """
+        Writes the cached anime and characters to a gzipped JSON lines file, streamed a row at a time.
+        Ship it to another machine and load it there with `import_cache` to start with a warm cache.
+        Needs the SQLite cache, queued cache writes are flushed first.
+
+        Args:
+            path (str): The export file, e.g. ``"cache.jsonl.gz"``.
+            tables (Iterable[str]): What to export, "anime" and/or "character". (Default: both)
+
+        Returns:
+            Dict[str, int]: How many rows of each table were exported and how many couldn't be read ("skipped").
+        """
+        backend = self._Scraper._sqlite_cache("export_cache")
+        return export_cache(backend.db_path, path, tables)
+
+
+    def import_cache(self, path: str, chunk_size: int = 1000)-> Dict[str, int]:
+        """
+        Loads a file written by `export_cache` into the cache, `chunk_size` rows per transaction.
+        The query indexes are built once at the end instead of row by row. Needs the SQLite cache,
+        queued cache writes are flushed first so they can't be written over the imported rows.
+
+        Args:
+            path (str): The export file.
+            chunk_size (int): Rows written per transaction. (Default: 1000)
+
+        Returns:
+            Dict[str, int]: How many anime and characters were written (a partial parse never replaces a cached
+            full one) and how many lines couldn't be read ("skipped").
+        """
+        with self._open() as scraper:
+            backend = scraper._sqlite_cache("import_cache")
+            counts = import_cache(backend.db_path, path, chunk_size, compression=backend.compression)
+            scraper._cache_rewritten()
+        return counts
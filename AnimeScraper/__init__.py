@@ -1,7 +1,18 @@
 from .AsyncScraper import KunYu
 from .SyncScraper import SyncKunYu
+from ._cache_utils import CacheLimit, CacheTTL
+from ._cache_backend import CacheBackend, FileBackend, MemoryBackend, SQLiteBackend
 
-__all__ = ["KunYu", "SyncKunYu"]
+__all__ = [
+    "KunYu",
+    "SyncKunYu",
+    "CacheTTL",
+    "CacheLimit",
+    "CacheBackend",
+    "SQLiteBackend",
+    "MemoryBackend",
+    "FileBackend",
+]
 
 # Package metadata
 __version__ = "1.1.9"
@@ -0,0 +1,121 @@
+"""
+The raw page archive. With `archive_pages` every fetched anime and
+character page is kept zlib compressed in the `pages` table of the cache,
+with its response headers and fetch time. `reparse` rebuilds the `anime` and
+`character` tables from it on every core, so a markup change or a parser fix
+doesn't need a re-crawl through the rate limiter.
+"""
+
+__all__ = ["reparse"]
+
+import re
+import zlib
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from ._cache_query import _UPSERT_INDEX, _index_row
+from ._cache_utils import _UPSERT, _compression_format, _connect, _encode_payload, _start_database
+from ._parse_anime_data import _parse_anime_data, parse_the_character
+
+_PAGE_URL = re.compile(r"^https://myanimelist\.net/(anime|character)/([^/?#]+)$")
+
+# (table, key, compressed html, fetched_at) of an archived page
+_Page = Tuple[str, str, bytes, Optional[float]]
+
+
+def _page_key(url: str)-> Optional[Tuple[str, str]]:
+    """The (table, key) an archived page is parsed into, None for pages that aren't archived."""
+    match = _PAGE_URL.match(url)
+    return (match.group(1), match.group(2)) if match else None
+
+
+def _reparse_pages(pages: List[_Page])-> Tuple[List[Tuple[str, str, bytes, Optional[float]]], int]:
+    """
+    Parses a chunk of archived pages in a pool worker, returns the
+    (table, key, `model_dump_bytes`, fetched_at) rows and how many pages failed.
+    """
+    rows = []
+    failed = 0
+    for table, key, html, fetched_at in pages:
+        parse = _parse_anime_data if table == "anime" else parse_the_character
+        try:
+            rows.append((table, key, parse(zlib.decompress(html).decode()).model_dump_bytes(), fetched_at))
+        except Exception:
+            # a 404 or a page the parser can't read keeps its cached row
+            failed += 1
+    return rows, failed
+
+
+def _archived_pages(db, chunk_size: int)-> Iterator[List[_Page]]:
+    """The archived pages in chunks, read by rowid so nothing stays open while the rows are written."""
+    last = 0
+    while True:
+        chunk = db.execute(
+            "SELECT rowid, url, html, fetched_at FROM pages WHERE rowid > ? ORDER BY rowid LIMIT ?", (last, chunk_size)
+        ).fetchall()
+        if not chunk:
+            return
+        last = chunk[-1][0]
+        pages = [(*key, html, fetched_at) for _, url, html, fetched_at in chunk if (key := _page_key(url))]
+        if pages:
+            yield pages
+
+
+def reparse(
+    db_path: str,
+    workers: Optional[int] = None,
+    chunk_size: int = 100,
+    compression: Optional[str] = None,
+    executor: Optional[Executor] = None
+)-> Dict[str, int]:
+    """
+    Rebuilds the cached anime and characters from the archived pages. Pages
+    are parsed in a process pool and every chunk is written in one
+    transaction, replacing the cached row (projected or not) with a full
+    parse that keeps the page's fetch time.
+
+    Scrapers that are open on the same cache keep their memory cache and
+    title index, open them again to see the new rows.
+
+    Args:
+        db_path (str): The cache database.
+        workers (Optional[int]): Parse processes, None uses every core.
+        chunk_size (int): Pages sent to a worker (and written) at a time.
+        compression (Optional[str]): Compression of the rewritten rows, like `cache_compression`.
+        executor (Optional[Executor]): Parse in this pool instead of a new `ProcessPoolExecutor`.
+
+    Returns:
+        Dict[str, int]: The number of anime and characters rebuilt and of pages that failed to parse.
+    """
+    compression = _compression_format(compression)
+    _start_database(db_path)
+    counts = {"anime": 0, "character": 0, "failed": 0}
+    pool = executor or ProcessPoolExecutor(max_workers=workers)
+    db = _connect(db_path)
+
+    def write(future: Future)-> None:
+        rows, failed = future.result()
+        counts["failed"] += failed
+        for table, key, data, fetched_at in rows:
+            db.execute(_UPSERT.format(table=table), (key, *_encode_payload(data, compression), None, fetched_at))
+            if table == "anime":
+                db.execute(_UPSERT_INDEX, _index_row(key, data, None))
+            counts[table] += 1
+        db.commit()
+
+    try:
+        # a few chunks per worker in flight keeps the pool busy without reading the whole archive into memory
+        in_flight = 2 * (workers or getattr(pool, "_max_workers", None) or 4)
+        pending: Deque[Future] = deque()
+        for pages in _archived_pages(db, chunk_size):
+            pending.append(pool.submit(_reparse_pages, pages))
+            if len(pending) >= in_flight:
+                write(pending.popleft())
+        while pending:
+            write(pending.popleft())
+    finally:
+        db.close()
+        if executor is None:
+            pool.shutdown()
+    return counts
@@ -0,0 +1,694 @@
+"""
+Cache backends. The scrapers read and write the cache only through a
+backend, so where the rows live is a deployment choice:
+
+    SQLiteBackend    one database file, write-behind batches, archived pages
+                     and `CacheLimit` eviction (the default)
+    MemoryBackend    a dict, for tests and short-lived processes
+    FileBackend      a file per row in hashed shard directories, readable and
+                     writable by many processes without a database lock
+
+Every backend stores (payload, fields, fetched_at) rows in the "anime",
+"character" and "search" tables. A search row is keyed by `_search_key` and
+its payload is the id the query resolved to. Like `_UPSERT`, a partial parse
+never replaces a full one.
+
+`CacheBackend` is what `SyncMalScraper` uses, `AsyncCacheBackend` what
+`MalScraper` uses. `AsyncSQLiteBackend` is the async SQLite backend and
+`AsyncBackend` runs any other `CacheBackend` under the async scraper.
+"""
+
+__all__ = [
+    "AsyncBackend",
+    "AsyncCacheBackend",
+    "AsyncSQLiteBackend",
+    "CacheBackend",
+    "FileBackend",
+    "MemoryBackend",
+    "SQLiteBackend",
+]
+
+import asyncio
+import inspect
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from collections import defaultdict
+from functools import partial
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Protocol, Tuple, Union
+from urllib.parse import quote, unquote
+
+import aiosqlite
+
+from ._cache_utils import (
+    CacheLimit,
+    Row,
+    _all_from_cache,
+    _compression_format,
+    _connect,
+    _decode_payload,
+    _delete_cache,
+    _delete_from_cache,
+    _encode_payload,
+    _fields_key,
+    _get_all_from_cache,
+    _get_row_from_cache,
+    _get_rows_from_cache,
+    _get_search_row_from_cache,
+    _initialize_database,
+    _open_connection,
+    _query_cache,
+    _query_from_cache,
+    _row_from_cache,
+    _rows_from_cache,
+    _search_row_from_cache,
+    _start_database,
+)
+from ._cache_query import AnimeQuery
+from ._cache_writer import AsyncCacheWriter, CacheWriter
+
+Payload = Union[str, bytes]
+
+
+def _search_key(kind: str, query: str)-> str:
+    """The key of a resolved search in the "search" table."""
+    return f"{kind}:{query}"
+
+
+def _split_search_key(key: str)-> Tuple[str, str]:
+    kind, _, query = key.partition(":")
+    return kind, query
+
+
+def _replaces(current: Optional[Row], fields: Optional[str])-> bool:
+    """Whether a row parsed with `fields` may replace the `current` one: a partial parse never replaces a full one."""
+    return current is None or current[1] is not None or fields is None
+
+
+
+class CacheBackend(Protocol):
+    """The cache operations `SyncMalScraper` needs."""
+
+    def open(self)-> None:
+        """Acquires what the backend needs (connections, threads), called when the scraper is entered."""
+
+    def close(self)-> None:
+        """Writes pending rows and releases what `open` acquired, the backend can be opened again."""
+
+    def get(self, table: str, key: str)-> Optional[Row]:
+        """The (payload, fields, fetched_at) row of `key`, None if it isn't cached."""
+
+    def get_many(self, table: str, keys: Iterable[str])-> Dict[str, Row]:
+        """The cached rows of `keys` by key, missing keys are left out."""
+
+    def put(self, table: str, key: str, value: Payload, fields: Optional[Iterable[str]] = None)-> None:
+        """Caches `value`, parsed with `fields` (None for a full parse)."""
+
+    def put_many(self, table: str, rows: Iterable[Tuple[str, Payload, Optional[Iterable[str]]]])-> None:
+        """Caches (key, value, fields) rows."""
+
+    def delete(self, table: str, key: str)-> None:
+        """Removes `key`, a missing key is ignored."""
+
+    def items(self, table: str)-> Iterable[Tuple[str, Payload]]:
+        """Every cached (key, payload) of `table`."""
+
+    def touch(self, table: str, key: str)-> None:
+        """Records a read of a row served from the cache, for backends that evict."""
+
+    def stats(self)-> Dict[str, int]:
+        """Operation counters of the backend."""
+
+
+
+class AsyncCacheBackend(Protocol):
+    """The cache operations `MalScraper` needs, `CacheBackend` with coroutines."""
+
+    async def open(self)-> None: ...
+    async def close(self)-> None: ...
+    async def get(self, table: str, key: str)-> Optional[Row]: ...
+    async def get_many(self, table: str, keys: Iterable[str])-> Dict[str, Row]: ...
+    async def put(self, table: str, key: str, value: Payload, fields: Optional[Iterable[str]] = None)-> None: ...
+    async def put_many(self, table: str, rows: Iterable[Tuple[str, Payload, Optional[Iterable[str]]]])-> None: ...
+    async def delete(self, table: str, key: str)-> None: ...
+    async def items(self, table: str)-> List[Tuple[str, Payload]]: ...
+    def touch(self, table: str, key: str)-> None: ...
+    def stats(self)-> Dict[str, int]: ...
+
+
+
+class _Counters:
+    """The counters every backend reports in `stats`."""
+
+    def __init__(self)-> None:
+        self.hits = 0
+        self.misses = 0
+        self.puts = 0
+        self.deletes = 0
+
+
+    def _counted(self, found: int, wanted: int)-> None:
+        self.hits += found
+        self.misses += wanted - found
+
+
+    def stats(self)-> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "puts": self.puts, "deletes": self.deletes}
+
+
+
+class MemoryBackend(_Counters):
+    """
+    Rows in a dict of the process, nothing is persisted and nothing is evicted.
+    Thread safe. Unlike `memory_cache_entries` it holds payloads, not built objects.
+    """
+    blocking = False
+
+    def __init__(self)-> None:
+        super().__init__()
+        self._tables: Dict[str, Dict[str, Row]] = defaultdict(dict)
+        self._lock = threading.Lock()
+
+
+    def open(self)-> None:
+        pass
+
+
+    def close(self)-> None:
+        pass
+
+
+    def get(self, table: str, key: str)-> Optional[Row]:
+        with self._lock:
+            row = self._tables[table].get(key)
+            self._counted(row is not None, 1)
+            return row
+
+
+    def get_many(self, table: str, keys: Iterable[str])-> Dict[str, Row]:
+        keys = list(dict.fromkeys(keys))
+        with self._lock:
+            rows = {key: row for key in keys if (row := self._tables[table].get(key))}
+            self._counted(len(rows), len(keys))
+            return rows
+
+
+    def put(self, table: str, key: str, value: Payload, fields: Optional[Iterable[str]] = None)-> None:
+        self.put_many(table, [(key, value, fields)])
+
+
+    def put_many(self, table: str, rows: Iterable[Tuple[str, Payload, Optional[Iterable[str]]]])-> None:
+        now = time.time()
+        with self._lock:
+            stored = self._tables[table]
+            for key, value, fields in rows:
+                fields = _fields_key(fields)
+                if _replaces(stored.get(key), fields):
+                    stored[key] = (value, fields, now)
+                    self.puts += 1
+
+
+    def delete(self, table: str, key: str)-> None:
+        with self._lock:
+            if self._tables[table].pop(key, None) is not None:
+                self.deletes += 1
+
+
+    def items(self, table: str)-> List[Tuple[str, Payload]]:
+        with self._lock:
+            return [(key, row[0]) for key, row in self._tables[table].items()]
+
+
+    def touch(self, table: str, key: str)-> None:
+        pass
+
+
+    def stats(self)-> Dict[str, int]:
+        with self._lock:
+            return {**super().stats(), "rows": sum(len(rows) for rows in self._tables.values())}
+
+
+
+class FileBackend(_Counters):
+    """
+    A file per row under `root/<table>/<shard>/`, the shard is a hash of the key
+    so no directory grows past a few thousand files. A row file is a json header
+    line ``[format, fields, fetched_at]`` followed by the payload, encoded like the
+    SQLite rows. Files are written to a temporary name and renamed over the old
+    one, so readers (in any process) never see half a row.
+    """
+    blocking = True
+
+    def __init__(self, root: str, shards: int = 256, compression: Optional[str] = None)-> None:
+        """
+        Args:
+            root (str): Directory of the cache, created if missing.
+            shards (int): Directories per table the rows are spread over.
+            compression (Optional[str]): How the payloads are compressed, like `cache_compression`.
+        """
+        super().__init__()
+        if shards < 1:
+            raise ValueError(f"shards must be at least 1, got {shards}")
+        self.root = root
+        self.shards = shards
+        self.compression = _compression_format(compression)
+
+
+    def open(self)-> None:
+        os.makedirs(self.root, exist_ok=True)
+
+
+    def close(self)-> None:
+        pass
+
+
+    def _path(self, table: str, key: str)-> str:
+        shard = f"{zlib.crc32(key.encode()) % self.shards:03x}"
+        return os.path.join(self.root, table, shard, quote(key, safe=""))
+
+
+    def _read(self, table: str, key: str)-> Optional[Row]:
+        try:
+            with open(self._path(table, key), "rb") as file:
+                header, data = file.read().split(b"\n", 1)
+        except FileNotFoundError:
+            return None
+        format, fields, fetched_at = json.loads(header)
+        return _decode_payload(data if format else data.decode(), format), fields, fetched_at
+
+
+    def get(self, table: str, key: str)-> Optional[Row]:
+        row = self._read(table, key)
+        self._counted(row is not None, 1)
+        return row
+
+
+    def get_many(self, table: str, keys: Iterable[str])-> Dict[str, Row]:
+        keys = list(dict.fromkeys(keys))
+        rows = {key: row for key in keys if (row := self._read(table, key))}
+        self._counted(len(rows), len(keys))
+        return rows
+
+
+    def put(self, table: str, key: str, value: Payload, fields: Optional[Iterable[str]] = None)-> None:
+        fields = _fields_key(fields)
+        if fields is not None and not _replaces(self._read(table, key), fields):
+            return
+        data, format = _encode_payload(value, self.compression)
+        path = self._path(table, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temporary = tempfile.mkstemp(prefix=".", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(json.dumps([format, fields, time.time()]).encode() + b"\n")
+                file.write(data.encode() if isinstance(data, str) else data)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        self.puts += 1
+
+
+    def put_many(self, table: str, rows: Iterable[Tuple[str, Payload, Optional[Iterable[str]]]])-> None:
+        for key, value, fields in rows:
+            self.put(table, key, value, fields)
+
+
+    def delete(self, table: str, key: str)-> None:
+        try:
+            os.unlink(self._path(table, key))
+            self.deletes += 1
+        except FileNotFoundError:
+            pass
+
+
+    def items(self, table: str)-> Iterator[Tuple[str, Payload]]:
+        directory = os.path.join(self.root, table)
+        if not os.path.isdir(directory):
+            return
+        for shard in os.scandir(directory):
+            for entry in os.scandir(shard.path):
+                # temporary files of writes in progress start with a dot
+                if not entry.name.startswith("."):
+                    key = unquote(entry.name)
+                    row = self._read(table, key)
+                    if row:
+                        yield key, row[0]
+
+
+    def touch(self, table: str, key: str)-> None:
+        pass
+
+
+
+class SQLiteBackend(_Counters):
+    """
+    The SQLite cache of `SyncMalScraper`. Rows are written by a `CacheWriter`
+    thread in batches and read through one connection per thread, pending rows
+    included.
+    """
+    blocking = True
+
+    def __init__(
+        self,
+        db_path: str,
+        batch_size: int = 100,
+        flush_interval: float = 0.05,
+        synchronous: Optional[str] = None,
+        compression: Optional[str] = None,
+        limit: Optional[CacheLimit] = None,
+        process_lock: bool = False
+    )-> None:
+        """
+        Args:
+            db_path (str): The cache database.
+            batch_size (int): Rows written per transaction, see `CacheWriter`.
+            flush_interval (float): Seconds a pending row waits at most before it is written.
+            synchronous (Optional[str]): PRAGMA synchronous of the writer connection.
+            compression (Optional[str]): How the rows are compressed, "zlib", "zdict" or None.
+            limit (Optional[CacheLimit]): Size limit of the cache, rows over it are evicted.
+            process_lock (bool): Let one process write at a time, through an flock of `<db_path>.lock`.
+                For several processes (server workers) sharing the cache, not available on Windows.
+        """
+        super().__init__()
+        _compression_format(compression)
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous
+        self.compression = compression
+        self.limit = limit
+        self.lock_path = f"{db_path}.lock" if process_lock else None
+        self.evictions = 0 # by the writers of the previous `open`s
+        self.writer: CacheWriter | None = None
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+
+    @property
+    def db(self)-> sqlite3.Connection:
+        """The cache connection of the calling thread, opened on first use."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = _connect(self.db_path)
+            with self._connections_lock:
+                self._connections.append(db)
+        return db
+
+
+    def _writer(self)-> CacheWriter:
+        if self.writer is None:
+            raise RuntimeError("Database is not initialized")
+        return self.writer
+
+
+    def open(self)-> None:
+        _start_database(self.db_path)
+        self.writer = CacheWriter(
+            self.db_path, self.batch_size, self.flush_interval, self.synchronous, self.compression, self.limit,
+            self.lock_path
+        )
+
+
+    def close(self)-> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.evictions += self.writer.evictions
+            self.writer = None
+        with self._connections_lock:
+            for db in self._connections:
+                db.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+    def get(self, table: str, key: str)-> Optional[Row]:
+        writer = self._writer()
+        if table == "search":
+            row = writer.search_row(*_split_search_key(key)) or _search_row_from_cache(self.db, *_split_search_key(key))
+        else:
+            row = writer.row(table, key) or _row_from_cache(self.db, table, key)
+        self._counted(row is not None, 1)
+        return row
+
+
+    def get_many(self, table: str, keys: Iterable[str])-> Dict[str, Row]:
+        writer = self._writer()
+        keys = list(dict.fromkeys(keys))
+        rows = {key: row for key in keys if (row := writer.row(table, key))}
+        rows.update(_rows_from_cache(self.db, table, (key for key in keys if key not in rows)))
+        self._counted(len(rows), len(keys))
+        return rows
+
+
+    def put(self, table: str, key: str, value: Payload, fields: Optional[Iterable[str]] = None)-> None:
+        if table == "search":
+            self._writer().store_search(*_split_search_key(key), value)
+        else:
+            self._writer().store(table, key, value, fields)
+        self.puts += 1
+
+
+    def put_many(self, table: str, rows: Iterable[Tuple[str, Payload, Optional[Iterable[str]]]])-> None:
+        for key, value, fields in rows:
+            self.put(table, key, value, fields)
+
+
+    def delete(self, table: str, key: str)-> None:
+        writer = self._writer()
+        key = _split_search_key(key) if table == "search" else key
+        pending = writer.discard(table, key)
+        # a flush already taking the row commits it before it is deleted
+        writer.flush()
+        self.deletes += _delete_cache(self.db, table, key) or pending
+
+
+    def items(self, table: str)-> List[Tuple[str, Payload]]:
+        return _all_from_cache(self.db, table)
+
+
+    def touch(self, table: str, key: str)-> None:
+        self._writer().touch(table, key)
+
+
+    def store_page(self, url: str, html: str, headers: Optional[Dict[str, str]] = None)-> None:
+        """Archives a fetched page for `reparse`."""
+        self._writer().store_page(url, html, headers)
+
+
+    def query(self, query: AnimeQuery)-> List[Tuple[str, Row]]:
+        """The (id, row) of the cached anime matching `query`, pending rows are written first."""
+        self._writer().flush()
+        return _query_cache(self.db, query)
+
+
+    def stats(self)-> Dict[str, int]:
+        writer = self.writer
+        return {
+            **super().stats(),
+            "flushes": writer.flushes if writer is not None else 0,
+            "evictions": self.evictions + (writer.evictions if writer is not None else 0),
+        }
+
+
+
+class AsyncSQLiteBackend(_Counters):
+    """The SQLite cache of `MalScraper`: an `aiosqlite` connection and an `AsyncCacheWriter`."""
+
+    def __init__(
+        self,
+        db_path: str,
+        batch_size: int = 100,
+        flush_interval: float = 0.05,
+        synchronous: Optional[str] = None,
+        compression: Optional[str] = None,
+        limit: Optional[CacheLimit] = None,
+        process_lock: bool = False
+    )-> None:
+        """Takes the arguments of `SQLiteBackend`."""
+        super().__init__()
+        _compression_format(compression)
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous
+        self.compression = compression
+        self.limit = limit
+        self.lock_path = f"{db_path}.lock" if process_lock else None
+        self.evictions = 0 # by the writers of the previous `open`s
+        self.db: aiosqlite.Connection | None = None
+        self.writer: AsyncCacheWriter | None = None
+
+
+    def _writer(self)-> AsyncCacheWriter:
+        if self.writer is None:
+            raise RuntimeError("Database is not initialized")
+        return self.writer
+
+
+    async def open(self)-> None:
+        await _initialize_database(self.db_path)
+        self.db = await _open_connection(self.db_path)
+        await AsyncCacheWriter.configure(self.db, self.synchronous)
+        self.writer = AsyncCacheWriter(
+            self.db, self.batch_size, self.flush_interval, self.compression, self.limit, self.lock_path
+        )
+
+
+    async def close(self)-> None:
+        if self.writer is not None:
+            await self.writer.close()
+            self.evictions += self.writer.evictions
+            self.writer = None
+        if self.db is not None:
+            await self.db.close()
+            self.db = None
+
+
+    async def get(self, table: str, key: str)-> Optional[Row]:
+        writer = self._writer()
+        if table == "search":
+            row = writer.search_row(*_split_search_key(key)) or await _get_search_row_from_cache(self.db, *_split_search_key(key))
+        else:
+            row = writer.row(table, key) or await _get_row_from_cache(self.db, table, key)
+        self._counted(row is not None, 1)
+        return row
+
+
+    async def get_many(self, table: str, keys: Iterable[str])-> Dict[str, Row]:
+        writer = self._writer()
+        keys = list(dict.fromkeys(keys))
+        rows = {key: row for key in keys if (row := writer.row(table, key))}
+        rows.update(await _get_rows_from_cache(self.db, table, (key for key in keys if key not in rows)))
+        self._counted(len(rows), len(keys))
+        return rows
+
+
+    async def put(self, table: str, key: str, value: Payload, fields: Optional[Iterable[str]] = None)-> None:
+        if table == "search":
+            await self._writer().store_search(*_split_search_key(key), value)
+        else:
+            await self._writer().store(table, key, value, fields)
+        self.puts += 1
+
+
+    async def put_many(self, table: str, rows: Iterable[Tuple[str, Payload, Optional[Iterable[str]]]])-> None:
+        for key, value, fields in rows:
+            await self.put(table, key, value, fields)
+
+
+    async def delete(self, table: str, key: str)-> None:
+        writer = self._writer()
+        key = _split_search_key(key) if table == "search" else key
+        pending = writer.discard(table, key)
+        await writer.flush()
+        self.deletes += await _delete_from_cache(self.db, table, key) or pending
+
+
+    async def items(self, table: str)-> List[Tuple[str, Payload]]:
+        return await _get_all_from_cache(self.db, table)
+
+
+    def touch(self, table: str, key: str)-> None:
+        self._writer().touch(table, key)
+
+
+    async def store_page(self, url: str, html: str, headers: Optional[Dict[str, str]] = None)-> None:
+        """Archives a fetched page for `reparse`."""
+        await self._writer().store_page(url, html, headers)
+
+
+    async def query(self, query: AnimeQuery)-> List[Tuple[str, Row]]:
+        """The (id, row) of the cached anime matching `query`, pending rows are written first."""
+        await self._writer().flush()
+        return await _query_from_cache(self.db, query)
+
+
+    def stats(self)-> Dict[str, int]:
+        writer = self.writer
+        return {
+            **super().stats(),
+            "flushes": writer.flushes if writer is not None else 0,
+            "evictions": self.evictions + (writer.evictions if writer is not None else 0),
+        }
+
+
+
+class AsyncBackend:
+    """
+    Runs a `CacheBackend` for `MalScraper`. Calls of a blocking backend (files,
+    SQLite) run in the default thread pool, the others on the event loop.
+    """
+
+    def __init__(self, backend: CacheBackend)-> None:
+        self.backend = backend
+
+
+    async def _call(self, method, *args)-> Any:
+        if not getattr(self.backend, "blocking", True):
+            return method(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, partial(method, *args))
+
+
+    async def open(self)-> None:
+        await self._call(self.backend.open)
+
+
+    async def close(self)-> None:
+        await self._call(self.backend.close)
+
+
+    async def get(self, table: str, key: str)-> Optional[Row]:
+        return await self._call(self.backend.get, table, key)
+
+
+    async def get_many(self, table: str, keys: Iterable[str])-> Dict[str, Row]:
+        return await self._call(self.backend.get_many, table, list(keys))
+
+
+    async def put(self, table: str, key: str, value: Payload, fields: Optional[Iterable[str]] = None)-> None:
+        await self._call(self.backend.put, table, key, value, fields)
+
+
+    async def put_many(self, table: str, rows: Iterable[Tuple[str, Payload, Optional[Iterable[str]]]])-> None:
+        await self._call(self.backend.put_many, table, list(rows))
+
+
+    async def delete(self, table: str, key: str)-> None:
+        await self._call(self.backend.delete, table, key)
+
+
+    async def items(self, table: str)-> List[Tuple[str, Payload]]:
+        return await self._call(lambda: list(self.backend.items(table)))
+
+
+    def touch(self, table: str, key: str)-> None:
+        self.backend.touch(table, key)
+
+
+    def stats(self)-> Dict[str, int]:
+        return self.backend.stats()
+
+
+    @property
+    def store_page(self):
+        # only when the wrapped backend archives pages
+        store_page = self.backend.store_page
+        return lambda url, html, headers=None: self._call(store_page, url, html, headers)
+
+
+    @property
+    def query(self):
+        # only when the wrapped backend can be queried
+        query = self.backend.query
+        return lambda anime_query: self._call(query, anime_query)
+
+
+def _async_backend(backend: Union[CacheBackend, AsyncCacheBackend])-> AsyncCacheBackend:
+    """`backend` itself when its methods are coroutines, else wrapped in an `AsyncBackend`."""
+    return backend if inspect.iscoroutinefunction(backend.get) else AsyncBackend(backend)
@@ -0,0 +1,243 @@
+"""
+Queryable side tables of the cached anime. Every anime row written to the
+SQLite cache also gets an `anime_index` row with its numeric score, rank,
+popularity and members, premiere year and season, type and status, plus one
+`anime_genre`/`anime_studio` row per genre and studio. `AnimeQuery` filters
+and sorts on them in SQL so only the matching rows are decoded.
+
+The link tables are kept up to date by triggers on `anime_index`, which in
+turn follows the `anime` table (an evicted or deleted anime leaves no index
+rows behind).
+"""
+
+__all__ = ["AnimeQuery"]
+
+import json
+import re
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple, Union
+
+from ._model import Anime
+
+_CREATE_INDEX_TABLES = (
+    # `fields` is the projection of the anime row, like `_UPSERT` a partial parse never replaces a full one.
+    # `genres` and `studios` are json arrays the link tables are filled from.
+    """
+    CREATE TABLE IF NOT EXISTS anime_index (
+        id TEXT PRIMARY KEY,
+        fields TEXT,
+        title TEXT COLLATE NOCASE,
+        score REAL,
+        ranked INTEGER,
+        popularity INTEGER,
+        members INTEGER,
+        year INTEGER,
+        season TEXT,
+        type TEXT COLLATE NOCASE,
+        status TEXT COLLATE NOCASE,
+        genres TEXT,
+        studios TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS anime_index_score ON anime_index (score)",
+    "CREATE INDEX IF NOT EXISTS anime_index_ranked ON anime_index (ranked)",
+    "CREATE INDEX IF NOT EXISTS anime_index_popularity ON anime_index (popularity)",
+    "CREATE INDEX IF NOT EXISTS anime_index_members ON anime_index (members)",
+    "CREATE INDEX IF NOT EXISTS anime_index_premiered ON anime_index (year, season)",
+    "CREATE INDEX IF NOT EXISTS anime_index_type ON anime_index (type)",
+    "CREATE TABLE IF NOT EXISTS anime_genre (genre TEXT COLLATE NOCASE, id TEXT, PRIMARY KEY (genre, id)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS anime_genre_id ON anime_genre (id)",
+    "CREATE TABLE IF NOT EXISTS anime_studio (studio TEXT COLLATE NOCASE, id TEXT, PRIMARY KEY (studio, id)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS anime_studio_id ON anime_studio (id)",
+    """
+    CREATE TRIGGER IF NOT EXISTS anime_index_insert AFTER INSERT ON anime_index BEGIN
+        INSERT OR IGNORE INTO anime_genre SELECT value, NEW.id FROM json_each(NEW.genres);
+        INSERT OR IGNORE INTO anime_studio SELECT value, NEW.id FROM json_each(NEW.studios);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS anime_index_update AFTER UPDATE ON anime_index BEGIN
+        DELETE FROM anime_genre WHERE id = OLD.id;
+        DELETE FROM anime_studio WHERE id = OLD.id;
+        INSERT OR IGNORE INTO anime_genre SELECT value, NEW.id FROM json_each(NEW.genres);
+        INSERT OR IGNORE INTO anime_studio SELECT value, NEW.id FROM json_each(NEW.studios);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS anime_index_delete AFTER DELETE ON anime_index BEGIN
+        DELETE FROM anime_genre WHERE id = OLD.id;
+        DELETE FROM anime_studio WHERE id = OLD.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS anime_delete AFTER DELETE ON anime BEGIN
+        DELETE FROM anime_index WHERE id = OLD.id;
+    END
+    """,
+)
+
+_INDEX_COLUMNS = ("id", "fields", "title", "score", "ranked", "popularity", "members",
+                  "year", "season", "type", "status", "genres", "studios")
+
+_UPSERT_INDEX = """
+    INSERT INTO anime_index ({columns}) VALUES ({values})
+    ON CONFLICT(id) DO UPDATE SET {updates}
+    WHERE anime_index.fields IS NOT NULL OR excluded.fields IS NULL
+""".format(
+    columns=", ".join(_INDEX_COLUMNS),
+    values=", ".join("?" * len(_INDEX_COLUMNS)),
+    updates=", ".join(f"{column} = excluded.{column}" for column in _INDEX_COLUMNS[1:]),
+)
+
+# the anime rows of a cache created before the side tables, indexed once when they are added
+_UNINDEXED = "SELECT id, data, fields, format FROM anime WHERE id NOT IN (SELECT id FROM anime_index)"
+
+SEASONS = ("winter", "spring", "summer", "fall")
+
+# `order_by` of a query -> (column, descending by default)
+QUERY_ORDERS = {
+    "score": ("score", True),
+    "rank": ("ranked", False),
+    "popularity": ("popularity", False),
+    "members": ("members", True),
+    "year": ("year", True),
+    "title": ("title", False),
+}
+
+_PREMIERED = re.compile(r"(winter|spring|summer|fall)\s+(\d{4})", re.IGNORECASE)
+_YEAR = re.compile(r"\b(\d{4})\b")
+
+
+def _number(text: Optional[str], kind: type)-> Union[int, float, None]:
+    """A MAL stat like "8.75", "#46" or "1,922,487" as a number, None for "N/A" and missing stats."""
+    if not text:
+        return None
+    try:
+        return kind(text.strip().lstrip("#").replace(",", ""))
+    except ValueError:
+        return None
+
+
+def _premiered(premiered: Optional[str], aired: Optional[str])-> Tuple[Optional[int], Optional[str]]:
+    """The (year, season) an anime premiered, movies and specials only have the year they aired."""
+    match = _PREMIERED.search(premiered or "")
+    if match:
+        return int(match.group(2)), match.group(1).lower()
+    match = _YEAR.search(aired or "")
+    return (int(match.group(1)) if match else None), None
+
+
+def _studios(studios: Optional[str])-> Optional[List[str]]:
+    if studios is None:
+        return None
+    if "None found" in studios:
+        return []
+    return [studio.strip() for studio in studios.split(",") if studio.strip()]
+
+
+def _index_row(key: str, value: Union[str, bytes], fields: Optional[str])-> tuple:
+    """The `anime_index` row of a cached anime payload (`model_dump_bytes` or json)."""
+    return _anime_index_row(key, Anime.from_bytes(value) if isinstance(value, bytes) else Anime.from_json(value), fields)
+
+
+def _anime_index_row(key: str, anime: Anime, fields: Optional[str])-> tuple:
+    stats = anime.stats
+    year, season = _premiered(anime.premiered, anime.aired)
+    studios = _studios(anime.studios)
+    return (
+        key,
+        fields,
+        anime.title,
+        _number(stats.score, float) if stats else None,
+        _number(stats.ranked, int) if stats else None,
+        _number(stats.popularity, int) if stats else None,
+        _number(stats.members, int) if stats else None,
+        year,
+        season,
+        anime.anime_type,
+        anime.status,
+        json.dumps(anime.genres) if anime.genres is not None else None,
+        json.dumps(studios) if studios is not None else None,
+    )
+
+
+def _try_index_row(key: str, value: Union[str, bytes], fields: Optional[str])-> Optional[tuple]:
+    """`_index_row`, None for a payload that isn't a decodable anime (it stays cached, just unindexed)."""
+    try:
+        return _index_row(key, value, fields)
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+def _one_or_many(value: Union[str, Iterable[str], None])-> Tuple[str, ...]:
+    if value is None:
+        return ()
+    return (value,) if isinstance(value, str) else tuple(value)
+
+
+@dataclass(frozen=True)
+class AnimeQuery:
+    """
+    Filters and order of `query_cached`. Every filter left None matches all
+    anime. Several genres (or studios) must all match, text filters ignore case.
+    """
+    genre: Union[str, Iterable[str], None] = None
+    studio: Union[str, Iterable[str], None] = None
+    anime_type: Optional[str] = None
+    status: Optional[str] = None
+    year: Optional[int] = None
+    season: Optional[str] = None
+    min_score: Optional[float] = None
+    max_score: Optional[float] = None
+    max_rank: Optional[int] = None
+    min_members: Optional[int] = None
+    order_by: str = "score"
+    descending: Optional[bool] = None
+    limit: Optional[int] = None
+
+    def __post_init__(self)-> None:
+        if self.order_by not in QUERY_ORDERS:
+            raise ValueError(f"order_by must be one of {tuple(QUERY_ORDERS)}, got {self.order_by!r}")
+        if self.season is not None and self.season.lower() not in SEASONS:
+            raise ValueError(f"season must be one of {SEASONS}, got {self.season!r}")
+        # a generator would be used up by the first `sql()`
+        object.__setattr__(self, "genre", _one_or_many(self.genre))
+        object.__setattr__(self, "studio", _one_or_many(self.studio))
+
+
+    def sql(self)-> Tuple[str, list]:
+        """The SELECT of the matching (id, data, fields, fetched_at, format) anime rows and its parameters."""
+        conditions: List[str] = []
+        params: list = []
+        for genre in self.genre:
+            conditions.append("i.id IN (SELECT id FROM anime_genre WHERE genre = ?)")
+            params.append(genre)
+        for studio in self.studio:
+            conditions.append("i.id IN (SELECT id FROM anime_studio WHERE studio = ?)")
+            params.append(studio)
+        for condition, value in (
+            ("i.type = ?", self.anime_type),
+            ("i.status = ?", self.status),
+            ("i.year = ?", self.year),
+            ("i.season = ?", self.season.lower() if self.season else None),
+            ("i.score >= ?", self.min_score),
+            ("i.score <= ?", self.max_score),
+            ("i.ranked <= ?", self.max_rank),
+            ("i.members >= ?", self.min_members),
+        ):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+
+        column, descending = QUERY_ORDERS[self.order_by]
+        if self.descending is not None:
+            descending = self.descending
+        sql = "SELECT a.id, a.data, a.fields, a.fetched_at, a.format FROM anime_index i JOIN anime a ON a.id = i.id"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        # anime without the column (N/A scores, partial parses) come last either way
+        sql += f" ORDER BY i.{column} IS NULL, i.{column} {'DESC' if descending else 'ASC'}, i.id"
+        if self.limit is not None:
+            sql += " LIMIT ?"
+            params.append(self.limit)
+        return sql, params
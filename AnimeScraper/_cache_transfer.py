@@ -0,0 +1,225 @@
+"""
+Bulk export and import of the SQLite cache. `export_cache` streams the cached
+anime and characters into a gzipped JSON lines file, one row per line, so a
+warm cache can be shipped to a new node without copying `cache.db` with its
+free pages, archived pages and WAL. `import_cache` loads such a file a chunk
+(and transaction) at a time. The secondary indexes of the query side tables
+are dropped for the import and built once at the end, which is much cheaper
+than keeping them up to date row by row.
+
+The first line of a file is a header, every other line a row:
+
+    {"format": "animescraper-cache", "version": 1}
+    {"table": "anime", "id": "1", "fields": null, "fetched_at": 1700000000.0, "data": {...}}
+
+`data` is the `model_dump_json` object of the anime or character, so a file
+doesn't depend on the cache's binary format or compression.
+"""
+
+__all__ = ["export_cache", "import_cache"]
+
+import gzip
+import json
+import os
+import tempfile
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ._cache_query import _CREATE_INDEX_TABLES, _UPSERT_INDEX, _anime_index_row
+from ._cache_utils import (
+    _UPSERT,
+    CACHE_TABLES,
+    _compression_format,
+    _connect,
+    _decode_payload,
+    _encode_payload,
+    _retry_busy,
+    _start_database,
+)
+from ._model import Anime, Character
+
+EXPORT_FORMAT = "animescraper-cache"
+EXPORT_VERSION = 1
+
+_MODELS = {"anime": Anime, "character": Character}
+
+# the secondary indexes of the side tables, an import drops them and builds them once at the end
+_INDEX_STATEMENTS = tuple(statement for statement in _CREATE_INDEX_TABLES if statement.startswith("CREATE INDEX"))
+
+
+def _row_line(table: str, key: str, fields: Optional[str], fetched_at: Optional[float], data: str)-> str:
+    # the payload is already json, it is spliced in instead of being decoded and encoded again
+    return (
+        f'{{"table": {json.dumps(table)}, "id": {json.dumps(key)}, "fields": {json.dumps(fields)}, '
+        f'"fetched_at": {json.dumps(fetched_at)}, "data": {data}}}\n'
+    )
+
+
+def export_cache(db_path: str, path: str, tables: Iterable[str] = CACHE_TABLES, compresslevel: int = 6)-> Dict[str, int]:
+    """
+    Writes the cached anime and characters to a gzipped JSON lines file. Rows
+    are streamed from the database, the file is written next to `path` and
+    moved over it once complete.
+
+    Args:
+        db_path (str): The cache database.
+        path (str): The export file, conventionally ``*.jsonl.gz``.
+        tables (Iterable[str]): The tables to export, "anime" and/or "character".
+        compresslevel (int): gzip level, 1 (fastest) to 9 (smallest).
+
+    Returns:
+        Dict[str, int]: The number of rows exported per table and of rows that couldn't be decoded ("skipped").
+    """
+    tables = tuple(tables)
+    for table in tables:
+        if table not in CACHE_TABLES:
+            raise ValueError(f"tables must be some of {CACHE_TABLES}, got {table!r}")
+    _start_database(db_path)
+    counts = {**dict.fromkeys(tables, 0), "skipped": 0}
+    db = _connect(db_path)
+    fd, temporary = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8", compresslevel=compresslevel) as out:
+            out.write(json.dumps({"format": EXPORT_FORMAT, "version": EXPORT_VERSION}) + "\n")
+            for table in tables:
+                for key, data, fields, fetched_at, format in db.execute(
+                    f"SELECT id, data, fields, fetched_at, format FROM {table}"
+                ):
+                    try:
+                        value = _decode_payload(data, format)
+                        if isinstance(value, bytes):
+                            value = _MODELS[table].from_bytes(value).model_dump_json()
+                        elif "\n" in value or "\r" in value:
+                            # pretty printed json of an older cache, a row has to stay on its line
+                            value = json.dumps(json.loads(value))
+                    except (ValueError, TypeError):
+                        counts["skipped"] += 1
+                        continue
+                    out.write(_row_line(table, key, fields, fetched_at, value))
+                    counts[table] += 1
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    finally:
+        db.close()
+    return counts
+
+
+def _check_header(line: str, path: str)-> None:
+    try:
+        header = json.loads(line)
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get("format") != EXPORT_FORMAT:
+        raise ValueError(f"{path} is not an AnimeScraper cache export")
+    if header.get("version", 0) > EXPORT_VERSION:
+        raise ValueError(f"{path} was exported by a newer AnimeScraper (version {header['version']})")
+
+
+def _lines(lines: Iterator[str], chunk_size: int)-> Iterator[List[str]]:
+    chunk: List[str] = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _chunk_rows(
+    lines: List[str],
+    compression: Optional[str]
+)-> Tuple[Dict[str, List[tuple]], List[tuple], int]:
+    """The `_UPSERT` rows by table and the `anime_index` rows of a chunk of lines, and how many lines were skipped."""
+    by_table: Dict[str, List[tuple]] = defaultdict(list)
+    indexed: List[tuple] = []
+    skipped = 0
+    for line in lines:
+        try:
+            row = json.loads(line)
+            table, key, fields, fetched_at = row["table"], row["id"], row["fields"], row["fetched_at"]
+            model = _MODELS[table].from_dict(row["data"])
+        except (ValueError, TypeError, KeyError):
+            skipped += 1
+            continue
+        by_table[table].append((key, *_encode_payload(model.model_dump_bytes(), compression), fields, fetched_at))
+        if table == "anime":
+            indexed.append(_anime_index_row(key, model, fields))
+    return by_table, indexed, skipped
+
+
+def _write_chunk(db, by_table: Dict[str, List[tuple]], indexed: List[tuple])-> Dict[str, int]:
+    """Writes a chunk in one transaction, returns how many rows of each table were written."""
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        # rows the upsert skipped (a partial parse over a full one) don't count
+        written = {table: db.executemany(_UPSERT.format(table=table), rows).rowcount for table, rows in by_table.items()}
+        if indexed:
+            db.executemany(_UPSERT_INDEX, indexed)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return written
+
+
+def _build_indexes(db)-> None:
+    for statement in _INDEX_STATEMENTS:
+        db.execute(statement)
+    db.commit()
+
+
+def import_cache(
+    db_path: str,
+    path: str,
+    chunk_size: int = 1000,
+    compression: Optional[str] = None,
+    defer_indexes: bool = True
+)-> Dict[str, int]:
+    """
+    Loads an `export_cache` file into the cache, `chunk_size` rows per
+    transaction. Imported rows replace cached ones like a fetch does (a
+    partial parse never replaces a full one) and keep their fetch time.
+
+    Scrapers that are open on the same cache keep their memory cache and
+    title index, open them again to see the new rows.
+
+    Args:
+        db_path (str): The cache database, created if it doesn't exist.
+        path (str): The export file.
+        chunk_size (int): Rows written per transaction.
+        compression (Optional[str]): Compression of the imported rows, like `cache_compression`.
+        defer_indexes (bool): Drop the query indexes during the import and build them at the end.
+            Queries on the cache are slower until then.
+
+    Returns:
+        Dict[str, int]: The number of anime and characters written and of lines that couldn't be read ("skipped").
+            Rows the cache kept (a partial parse over a full one) aren't counted.
+    """
+    compression = _compression_format(compression)
+    _start_database(db_path)
+    counts = {"anime": 0, "character": 0, "skipped": 0}
+    db = _connect(db_path)
+    # safe with WAL, a crash can only lose the last chunks
+    db.execute("PRAGMA synchronous = NORMAL")
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as lines:
+            _check_header(next(lines, ""), path)
+            if defer_indexes:
+                for statement in _INDEX_STATEMENTS:
+                    db.execute(f"DROP INDEX IF EXISTS {statement.split()[5]}")
+                db.commit()
+            try:
+                for chunk in _lines(lines, max(1, chunk_size)):
+                    by_table, indexed, skipped = _chunk_rows(chunk, compression)
+                    for table, written in _retry_busy(_write_chunk, db, by_table, indexed).items():
+                        counts[table] += written
+                    counts["skipped"] += skipped
+            finally:
+                if defer_indexes:
+                    _retry_busy(_build_indexes, db)
+    finally:
+        db.close()
+    return counts
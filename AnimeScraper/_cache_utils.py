@@ -1,78 +1,617 @@
 import aiosqlite
+import asyncio
+import heapq
+import random
 import sqlite3
+import time
+import zlib
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Collection, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar, Union
+
+from ._cache_query import _CREATE_INDEX_TABLES, _UNINDEXED, _UPSERT_INDEX, AnimeQuery, _try_index_row
+
+CACHE_TABLES = ("anime", "character")
+
+T = TypeVar("T")
+
+# how long a resolved search is reused, in seconds (7 days)
+SEARCH_TTL = 7 * 24 * 60 * 60
+
+# `fields` holds the comma separated fields a row was parsed with, NULL for a full parse
+# `fetched_at` is the unix time the page was fetched, NULL for rows cached before it was added
+# `format` tells how `data` is encoded, NULL for json text (see `_encode_payload`)
+# `last_access` and `hits` are the last read time and read count (the fetch counts as one) used by `CacheLimit`
+_CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id TEXT PRIMARY KEY,
+        data TEXT,
+        fields TEXT,
+        fetched_at REAL,
+        format TEXT,
+        last_access REAL,
+        hits INTEGER DEFAULT 1
+    )
+"""
+
+# resolved searches, `kind` is the cache table the id belongs to
+_CREATE_SEARCH_TABLE = """
+    CREATE TABLE IF NOT EXISTS search (
+        kind TEXT,
+        query TEXT,
+        id TEXT,
+        fetched_at REAL,
+        PRIMARY KEY (kind, query)
+    )
+"""
+
+_REPLACE_SEARCH = "INSERT OR REPLACE INTO search (kind, query, id, fetched_at) VALUES (?, ?, ?, ?)"
+
+_SELECT_SEARCH = "SELECT id, fetched_at FROM search WHERE kind = ? AND query = ?"
+
+# fetched detail pages kept for `reparse`, `html` is zlib compressed, `headers` the json of the response headers
+_CREATE_PAGES_TABLE = """
+    CREATE TABLE IF NOT EXISTS pages (
+        url TEXT PRIMARY KEY,
+        html BLOB,
+        headers TEXT,
+        fetched_at REAL
+    )
+"""
+
+# an upsert rather than INSERT OR REPLACE, whose delete wouldn't fire the `cache_size` triggers
+_REPLACE_PAGE = """
+    INSERT INTO pages (url, html, headers, fetched_at) VALUES (?, ?, ?, ?)
+    ON CONFLICT(url) DO UPDATE SET html = excluded.html, headers = excluded.headers, fetched_at = excluded.fetched_at
+"""
+
+# how long a connection waits for another one's write lock, in milliseconds
+BUSY_TIMEOUT_MS = 5000
+
+# settings of every cache connection, the cache is shared by the threads and processes of a deployment
+_CONNECTION_PRAGMAS = (
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16384",   # 16 MiB of page cache
+    "PRAGMA mmap_size = 268435456", # reads of the first 256 MiB come straight from the OS page cache
+)
+
+# a write still locked out after `busy_timeout` is retried this many times, waiting a bit longer each time
+BUSY_RETRIES = 5
+
+# ids per `WHERE id IN (...)` query, below SQLite's oldest 999 variable limit
+_IN_CHUNK = 500
+
+# columns added after the first release, (name, type) pairs for ALTER TABLE
+_ADDED_COLUMNS = (
+    ("fields", "TEXT"),
+    ("fetched_at", "REAL"),
+    ("format", "TEXT"),
+    ("last_access", "REAL"),
+    ("hits", "INTEGER DEFAULT 1"),
+)
+
+# a full parse replaces any row, a partial parse never replaces a full one. The fetch
+# counts as the first read (`last_access`), a row that was read keeps its last read.
+_UPSERT = """
+    INSERT INTO {table} (id, data, format, fields, fetched_at, last_access) VALUES (?1, ?2, ?3, ?4, ?5, COALESCE(?5, 0))
+    ON CONFLICT(id) DO UPDATE SET
+        data = excluded.data, format = excluded.format, fields = excluded.fields, fetched_at = excluded.fetched_at,
+        last_access = COALESCE({table}.last_access, excluded.last_access)
+    WHERE {table}.fields IS NOT NULL OR excluded.fields IS NULL
+"""
+
+_ROW_COLUMNS = "data, fields, fetched_at, format"
+
+# whether the queryable side tables exist yet, a cache older than them is indexed when they are created
+_HAS_INDEX = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'anime_index'"
+
+# reads of a row since the last flush: (last read time, count)
+_TOUCH = "UPDATE {table} SET last_access = MAX(COALESCE(last_access, 0), ?), hits = hits + ? WHERE id = ?"
+
+# the cached rows plus their archived pages, what a `CacheLimit` bounds. It is kept in the
+# single row of `cache_size` by triggers, so every write (of any process) keeps it exact and
+# checking the limit doesn't scan the cache. `_MEASURE_CACHE_SIZE` fills it once for older caches.
+_CREATE_SIZE_TABLE = """
+    CREATE TABLE IF NOT EXISTS cache_size (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        rows INTEGER NOT NULL,
+        bytes INTEGER NOT NULL
+    )
+"""
+
+_MEASURE_CACHE_SIZE = "INSERT INTO cache_size (id, rows, bytes) SELECT 0, {rows}, {size} WHERE NOT EXISTS (SELECT 1 FROM cache_size)".format(
+    rows=" + ".join(f"(SELECT COUNT(*) FROM {table})" for table in CACHE_TABLES),
+    size=" + ".join([*(f"(SELECT COALESCE(SUM(LENGTH(data)), 0) FROM {table})" for table in CACHE_TABLES),
+                     "(SELECT COALESCE(SUM(LENGTH(html)), 0) FROM pages)"]),
+)
+
+_CACHE_SIZE = "SELECT rows, bytes FROM cache_size"
+
+
+def _size_triggers(table: str, column: str, counted: bool)-> List[str]:
+    """The triggers keeping `cache_size` up to date with `table`, `counted` tables count towards its rows too."""
+    rows = 1 if counted else 0
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_size_insert AFTER INSERT ON {table} BEGIN
+            UPDATE cache_size SET rows = rows + {rows}, bytes = bytes + COALESCE(LENGTH(new.{column}), 0); END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_size_delete AFTER DELETE ON {table} BEGIN
+            UPDATE cache_size SET rows = rows - {rows}, bytes = bytes - COALESCE(LENGTH(old.{column}), 0); END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_size_update AFTER UPDATE OF {column} ON {table} BEGIN
+            UPDATE cache_size SET bytes = bytes + COALESCE(LENGTH(new.{column}), 0) - COALESCE(LENGTH(old.{column}), 0); END""",
+    ]
+
+
+# indexes the eviction policies walk, and the last read of rows cached before `last_access` was set on write
+_EVICTION_SCHEMA = tuple(
+    statement for table in CACHE_TABLES for statement in (
+        f"UPDATE {table} SET last_access = COALESCE(fetched_at, 0) WHERE last_access IS NULL",
+        f"CREATE INDEX IF NOT EXISTS {table}_last_access ON {table} (last_access)",
+        f"CREATE INDEX IF NOT EXISTS {table}_hits ON {table} (hits, last_access)",
+    )
+)
+
+# every statement keeping the size of the cache and its eviction order, run in the schema transaction
+_SIZE_SCHEMA = (
+    _CREATE_SIZE_TABLE,
+    *(trigger for table in CACHE_TABLES for trigger in _size_triggers(table, "data", True)),
+    *_size_triggers("pages", "html", False),
+    _MEASURE_CACHE_SIZE,
+    *_EVICTION_SCHEMA,
+)
+
+# the rows of a table first in line for eviction, by an index; the tables' candidates are merged by `_eviction_order`
+_EVICTION_CANDIDATES = "SELECT '{table}', id, LENGTH(data), last_access, hits FROM {table} ORDER BY {order} LIMIT ?"
+
+# ORDER BY of each `CacheLimit.policy`, the first rows are evicted first
+EVICTION_POLICIES = {"lru": "last_access", "lfu": "hits, last_access"}
+
+# zlib preset dictionary with the keys and common values of the cached json, it makes
+# small rows compress much better. Rows written with it are tagged "zdict1": never
+# change it, add a new dictionary and tag instead.
+_ZDICT_1 = (
+    b'{"id": "", "name": "", "japanese_name": "(\\u30", "about": {"Birthdate": "", "Age": "", "Height": " cm", '
+    b'"Weight": " kg", "Blood type": ""}, "description": "\\n\\n(Source: )", '
+    b'"img": "https://cdn.myanimelist.net/images/characters/.jpg", "favorites": "", "url": "https://myanimelist.net/character/"}'
+    b'[{"Sequel(TV)": ""}, {"Prequel(TV)": ""}, {"SideStory(Movie)": ""}, {"Adaptation(Manga)": ""}, {"Summary(Special)": ""}]'
+    b'{"id": "", "title": "", "english_title": "", "japanese_title": "\\u30", "anime_type": "TV", "episodes": "", '
+    b'"status": "Finished Airing", "aired": " to ", "duration": " min. per ep.", "premiered": "Spring ", '
+    b'"rating": "PG-13 - Teens 13 or older", "synopsis": "\\n\\n[Written by MAL Rewrite]", '
+    b'"genres": ["Action", "Adventure", "Comedy", "Drama", "Fantasy", "Romance", "Sci-Fi"], "studios": "", '
+    b'"themes": [""], "producers": ["", ""], "licensors": [""], '
+    b'"stats": {"score": "", "scored_by": "", "ranked": "#", "popularity": "#", "members": "", "favorites": ""}, '
+    b'"characters": [{"id": "", "name": "", "role": "Main", "voice_actor": {"id": "", "name": "", "role": "Japanese", '
+    b'"url": "https://myanimelist.net/people/"}}, {"id": "", "name": "", "role": "Supporting", "voice_actor": '
+    b'{"id": "", "name": "", "role": "Japanese", "url": "https://myanimelist.net/people/"}}], "related": [{"": ""}]}'
+)
+
+# `cache_compression` option -> the format tag of the rows it writes
+COMPRESSIONS = {"zlib": "zlib", "zdict": "zdict1"}
+
+# a cached (payload, fields, fetched_at) row, the payload is json (str) or `model_dump_bytes` (bytes)
+Row = Tuple[Union[str, bytes], Optional[str], Optional[float]]
+
+
+@dataclass(frozen=True)
+class CacheTTL:
+    """
+    Seconds a cached anime or character stays fresh, None never expires it.
+    Anime that are still airing (or not yet aired) change more often than finished ones.
+    """
+    airing: Optional[float] = 6 * 60 * 60
+    finished: Optional[float] = 30 * 24 * 60 * 60
+    character: Optional[float] = 30 * 24 * 60 * 60
+
+    def seconds(self, table: str, cached: Any)-> Optional[float]:
+        """The TTL of a cached `Anime` or `Character`."""
+        if table == "character":
+            return self.character
+        return self.finished if cached.status == "Finished Airing" else self.airing
+
+
+@dataclass(frozen=True)
+class CacheLimit:
+    """
+    Bounds the SQLite cache to `max_rows` anime and character rows and/or
+    `max_bytes` of payload (the cached rows plus their archived pages, the file
+    itself also holds indexes and free pages). Over the limit the least recently
+    ("lru") or least often ("lfu") read rows are deleted, at most `batch` per
+    cache write so no single write pays for a big eviction.
+    """
+    max_rows: Optional[int] = None
+    max_bytes: Optional[int] = None
+    policy: str = "lru"
+    batch: int = 100
+
+    def __post_init__(self)-> None:
+        if self.policy not in EVICTION_POLICIES:
+            raise ValueError(f"policy must be one of {tuple(EVICTION_POLICIES)}, got {self.policy!r}")
+
+    def exceeded(self, rows: int, size: int)-> bool:
+        return ((self.max_rows is not None and rows > self.max_rows)
+                or (self.max_bytes is not None and size > self.max_bytes))
+
+
+def _eviction_victims(
+    limit: CacheLimit,
+    rows: int,
+    size: int,
+    candidates: Iterable[tuple],
+    keep: Collection[Tuple[str, str]]
+)-> List[Tuple[str, str, int]]:
+    """The (table, id, size) of the candidate rows to delete to get back under `limit`, rows in `keep` are skipped."""
+    victims = []
+    for table, key, length, *_ in candidates:
+        if not limit.exceeded(rows, size) or len(victims) == limit.batch:
+            break
+        if (table, key) in keep:
+            continue
+        victims.append((table, key, length or 0))
+        rows -= 1
+        size -= length or 0
+    return victims
+
+
+def _eviction_order(policy: str)-> Callable[[tuple], tuple]:
+    """The sort key of `_EVICTION_CANDIDATES` rows under `policy`, to merge the tables' candidates."""
+    if policy == "lru":
+        return lambda row: (row[3] or 0,)
+    return lambda row: (row[4] or 0, row[3] or 0)
+
+
+def _deletes(table: str, key: Any)-> List[Tuple[str, tuple]]:
+    if table == "search":
+        return [("DELETE FROM search WHERE kind = ? AND query = ?", tuple(key))]
+    return [(f"DELETE FROM {table} WHERE id = ?", (key,)), ("DELETE FROM pages WHERE url = ?", (_page_url(table, key),))]
+
+
+def _index_rows(rows: Iterable[tuple])-> List[tuple]:
+    """The `anime_index` rows of (id, data, fields, format) anime rows, rows that can't be decoded are skipped."""
+    indexed = []
+    for key, data, fields, format in rows:
+        try:
+            value = _decode_payload(data, format)
+        except (ValueError, TypeError):
+            continue
+        if (row := _try_index_row(key, value, fields)) is not None:
+            indexed.append(row)
+    return indexed
+
+
+def _page_url(table: str, key: str)-> str:
+    """The url a cached row's page is archived under."""
+    return f"https://myanimelist.net/{table}/{key}"
+
+
+def _compression_format(compression: Optional[str])-> Optional[str]:
+    """The compression format tag a `cache_compression` option writes, None when rows aren't compressed."""
+    if compression is None:
+        return None
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"cache_compression must be None or one of {tuple(COMPRESSIONS)}, got {compression!r}")
+    return COMPRESSIONS[compression]
+
+
+def _compress(raw: bytes, format: str)-> bytes:
+    if format == "zlib":
+        return zlib.compress(raw)
+    compressor = zlib.compressobj(zdict=_ZDICT_1)
+    return compressor.compress(raw) + compressor.flush()
+
+
+def _decompress(data: bytes, format: str)-> bytes:
+    if format == "zlib":
+        return zlib.decompress(data)
+    if format == "zdict1":
+        decompressor = zlib.decompressobj(zdict=_ZDICT_1)
+        return decompressor.decompress(data) + decompressor.flush()
+    raise ValueError(f"Unknown cache row format {format!r}")
+
+
+def _encode_payload(value: Union[str, bytes], compression: Optional[str])-> Tuple[Any, Optional[str]]:
+    """
+    Encodes a json (str) or `model_dump_bytes` (bytes) payload for the `data` column,
+    returns (data, format tag). The tag is "bin" for binary payloads, followed by
+    "+" and the compression format when compressed.
+    """
+    binary = isinstance(value, bytes)
+    if compression is None:
+        return value, "bin" if binary else None
+    data = _compress(value if binary else value.encode(), compression)
+    return data, f"bin+{compression}" if binary else compression
+
+
+def _decode_payload(data: Any, format: Optional[str])-> Union[str, bytes]:
+    """The payload of a `data` column written with `format`, rows of any format ever written can be read."""
+    if format is None:
+        return data
+    codec, _, compression = format.partition("+")
+    if codec != "bin":
+        return _decompress(data, codec).decode()
+    return _decompress(data, compression) if compression else data
+
+
+def _decoded(data: Any, fields: Optional[str], fetched_at: Optional[float], format: Optional[str])-> Row:
+    return _decode_payload(data, format), fields, fetched_at
+
+
+def _fields_key(fields: Optional[Iterable[str]])-> Optional[str]:
+    """Serializes a field projection for the `fields` column, None for a full parse."""
+    return ",".join(sorted(fields)) if fields is not None else None
+
+
+def _expired(fetched_at: Optional[float], ttl: Optional[float])-> bool:
+    """True if something fetched at `fetched_at` (None if unknown) is older than `ttl` seconds."""
+    return ttl is not None and (fetched_at is None or time.time() - fetched_at > ttl)
+
+
+def _chunks(items: Sequence[str], size: int)-> Iterable[Sequence[str]]:
+    return (items[i:i + size] for i in range(0, len(items), size))
+
+
+def _covers(stored: Optional[str], fields: Optional[Iterable[str]])-> bool:
+    """True if a row parsed with `stored` fields has every field in `fields`."""
+    if stored is None:
+        return True
+    if fields is None:
+        return False
+    return set(fields) <= set(stored.split(","))
+
+
 async def _initialize_database(db_path):
         """
-        Initializes the SQLite database with necessary tables.
+        Initializes the SQLite database with necessary tables, retried while
+        another process holds the lock (several server workers starting together).
         """
+        await _retry_busy_async(_initialize_schema, db_path)
+
+
+async def _initialize_schema(db_path):
         async with aiosqlite.connect(db_path) as db:
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS anime (
-                    id TEXT PRIMARY KEY,
-                    data TEXT
-                )
-            """)
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS character (
-                    id TEXT PRIMARY KEY,
-                    data TEXT
-                )
-            """)
+            await db.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            await db.execute("PRAGMA journal_mode = WAL")
+            # one transaction, so the size measured for `cache_size` misses no concurrent write
+            await db.execute("BEGIN IMMEDIATE")
+            for table in CACHE_TABLES:
+                await db.execute(_CREATE_TABLE.format(table=table))
+                async with db.execute(f"PRAGMA table_info({table})") as cursor:
+                    columns = {row[1] for row in await cursor.fetchall()}
+                for column, kind in _ADDED_COLUMNS:
+                    if column not in columns:
+                        await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+            await db.execute(_CREATE_SEARCH_TABLE)
+            await db.execute(_CREATE_PAGES_TABLE)
+            async with db.execute(_HAS_INDEX) as cursor:
+                indexed = await cursor.fetchone()
+            for statement in _CREATE_INDEX_TABLES:
+                await db.execute(statement)
+            if not indexed:
+                async with db.execute(_UNINDEXED) as cursor:
+                    await db.executemany(_UPSERT_INDEX, _index_rows(await cursor.fetchall()))
+            for statement in _SIZE_SCHEMA:
+                await db.execute(statement)
             await db.commit()
 
 
-async def _get_from_cache(db, table: str, key: str)-> str | None:
-        async with db.execute(f"SELECT data FROM {table} WHERE id = ?", (key,)) as cursor:
+async def _get_row_from_cache(db, table: str, key: str)-> Row | None:
+        """Returns the cached (payload, fields, fetched_at) row."""
+        async with db.execute(f"SELECT {_ROW_COLUMNS} FROM {table} WHERE id = ?", (key,)) as cursor:
             row = await cursor.fetchone()
-            if row:
-                return row[0]  # Return deserialized JSON
-        return None
+        return _decoded(*row) if row else None
+
 
+async def _get_rows_from_cache(db, table: str, keys: Iterable[str])-> Dict[str, Row]:
+        """Returns the cached (payload, fields, fetched_at) rows of `keys` by id, missing keys are left out."""
+        keys = list(dict.fromkeys(keys))
+        rows = {}
+        for chunk in _chunks(keys, _IN_CHUNK):
+            sql = f"SELECT id, {_ROW_COLUMNS} FROM {table} WHERE id IN ({','.join('?' * len(chunk))})"
+            async with db.execute(sql, chunk) as cursor:
+                rows.update((key, _decoded(*row)) for key, *row in await cursor.fetchall())
+        return rows
 
 
-async def _store_in_cache(db, table: str, key: str, value: str):
-        async with db.execute(f"SELECT 1 FROM {table} WHERE id = ?", (key,)) as cursor:
+async def _get_search_row_from_cache(db, kind: str, query: str)-> Row | None:
+        """Returns the (id, None, fetched_at) row of the id a normalized `query` resolved to."""
+        async with db.execute(_SELECT_SEARCH, (kind, query)) as cursor:
             row = await cursor.fetchone()
-            if row:
-                return  # Skip if the data already exists
-        await db.execute(f"INSERT INTO {table} (id, data) VALUES (?, ?)", (key, value))
+        return (row[0], None, row[1]) if row else None
+
+
+async def _get_all_from_cache(db, table: str)-> List[Tuple[str, str]]:
+        """Returns every cached (id, payload) row of `table`."""
+        async with db.execute(f"SELECT id, data, format FROM {table}") as cursor:
+            return [(key, _decode_payload(data, format)) for key, data, format in await cursor.fetchall()]
+
+
+async def _delete_from_cache(db, table: str, key: Any)-> bool:
+        """
+        Deletes a row with its archived page, or a resolved search (`table` "search", `key` the (kind, query)).
+        Returns whether there was one.
+        """
+        counts = [(await db.execute(sql, args)).rowcount for sql, args in _deletes(table, key)]
         await db.commit()
+        return counts[0] > 0
+
+
+async def _get_cache_size(db)-> Tuple[int, int]:
+        """Returns the (rows, bytes) a `CacheLimit` is checked against."""
+        async with db.execute(_CACHE_SIZE) as cursor:
+            return tuple(await cursor.fetchone())
+
+
+async def _evict_from_cache(db, limit: CacheLimit, rows: int, size: int, keep: Collection[Tuple[str, str]] = ())-> Tuple[int, int]:
+        """
+        Deletes up to `limit.batch` rows (and their archived pages) by the limit's policy, returns the (rows, bytes) freed.
+        The (table, id) rows in `keep`, the ones just written, are never evicted.
+        """
+        order = EVICTION_POLICIES[limit.policy]
+        candidates = []
+        for table in CACHE_TABLES:
+            async with db.execute(_EVICTION_CANDIDATES.format(table=table, order=order), (limit.batch + len(keep),)) as cursor:
+                candidates.append(await cursor.fetchall())
+        victims = _eviction_victims(limit, rows, size, heapq.merge(*candidates, key=_eviction_order(limit.policy)), keep)
+        for table in CACHE_TABLES:
+            await db.executemany(f"DELETE FROM {table} WHERE id = ?", [(key,) for t, key, _ in victims if t == table])
+        await db.executemany("DELETE FROM pages WHERE url = ?", [(_page_url(table, key),) for table, key, _ in victims])
+        return len(victims), sum(length for _, _, length in victims)
+
+
+async def _query_from_cache(db, query: AnimeQuery)-> List[Tuple[str, Row]]:
+        """Returns the (id, row) of the cached anime matching `query`, in its order."""
+        async with db.execute(*query.sql()) as cursor:
+            return [(key, _decoded(*row)) for key, *row in await cursor.fetchall()]
+
 
+def _connect(db_path: str)-> sqlite3.Connection:
+        """
+        Opens a cache connection. It can be closed from another thread than the one
+        that uses it, but should only be used by one thread at a time.
+        """
+        db = sqlite3.connect(db_path, check_same_thread=False)
+        for pragma in _CONNECTION_PRAGMAS:
+            db.execute(pragma)
+        return db
+
+
+async def _open_connection(db_path: str)-> aiosqlite.Connection:
+        """Opens an `aiosqlite` cache connection with the settings of `_connect`."""
+        db = await aiosqlite.connect(db_path)
+        for pragma in _CONNECTION_PRAGMAS:
+            await db.execute(pragma)
+        return db
+
+
+def _is_busy(error: BaseException)-> bool:
+        """Whether `error` is SQLITE_BUSY/SQLITE_LOCKED: another connection holds the lock."""
+        if not isinstance(error, sqlite3.OperationalError):
+            return False
+        message = str(error).lower()
+        return "locked" in message or "busy" in message
+
+
+def _busy_delay(attempt: int)-> float:
+        """Seconds to wait before retry `attempt`, doubling from 50 ms with jitter so the processes don't retry in step."""
+        return min(2.0, 0.05 * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def _retry_busy(func: Callable[..., T], *args: Any, retries: int = BUSY_RETRIES)-> T:
+        """Calls `func`, calling it again up to `retries` times while the database is locked."""
+        for attempt in range(retries + 1):
+            try:
+                return func(*args)
+            except sqlite3.OperationalError as e:
+                if attempt == retries or not _is_busy(e):
+                    raise
+            time.sleep(_busy_delay(attempt))
+        raise AssertionError("unreachable")
+
+
+async def _retry_busy_async(func: Callable[..., Awaitable[T]], *args: Any, retries: int = BUSY_RETRIES)-> T:
+        """`_retry_busy` for a coroutine function, the retries wait without blocking the event loop."""
+        for attempt in range(retries + 1):
+            try:
+                return await func(*args)
+            except sqlite3.OperationalError as e:
+                if attempt == retries or not _is_busy(e):
+                    raise
+            await asyncio.sleep(_busy_delay(attempt))
+        raise AssertionError("unreachable")
 
 
 def _start_database(db_path):
         """
-        Initializes the SQLite database with necessary tables.
+        Initializes the SQLite database with necessary tables, retried while
+        another process holds the lock (several server workers starting together).
+        WAL mode lets the reader connections read while the writer writes.
         """
-        with sqlite3.connect(db_path) as db:
+        _retry_busy(_start_schema, db_path)
+
+
+def _start_schema(db_path):
+        with closing(sqlite3.connect(db_path)) as db:
             cursor =  db.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS anime (
-                    id TEXT PRIMARY KEY,
-                    data TEXT
-                )
-            """)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS character (
-                    id TEXT PRIMARY KEY,
-                    data TEXT
-                )
-            """)
+            cursor.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            cursor.execute("PRAGMA journal_mode = WAL")
+            # one transaction, so the size measured for `cache_size` misses no concurrent write
+            cursor.execute("BEGIN IMMEDIATE")
+            for table in CACHE_TABLES:
+                cursor.execute(_CREATE_TABLE.format(table=table))
+                columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+                for column, kind in _ADDED_COLUMNS:
+                    if column not in columns:
+                        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+            cursor.execute(_CREATE_SEARCH_TABLE)
+            cursor.execute(_CREATE_PAGES_TABLE)
+            indexed = cursor.execute(_HAS_INDEX).fetchone()
+            for statement in _CREATE_INDEX_TABLES:
+                cursor.execute(statement)
+            if not indexed:
+                cursor.executemany(_UPSERT_INDEX, _index_rows(cursor.execute(_UNINDEXED).fetchall()))
+            for statement in _SIZE_SCHEMA:
+                cursor.execute(statement)
             db.commit()
 
 
-def _from_cache(db, table: str, key: str):
-        cursor = db.execute(f"SELECT data FROM {table} WHERE id = ?", (key,))
-        row = cursor.fetchone()
-        if row:
-            return row[0]  # Return deserialized JSON
-        return None
+def _row_from_cache(db, table: str, key: str)-> Row | None:
+        """Returns the cached (payload, fields, fetched_at) row."""
+        row = db.execute(f"SELECT {_ROW_COLUMNS} FROM {table} WHERE id = ?", (key,)).fetchone()
+        return _decoded(*row) if row else None
 
 
-def _store_cache(db, table: str, key: str, value: str):
-        cursor = db.execute(f"SELECT 1 FROM {table} WHERE id = ?", (key,))
-        row = cursor.fetchone()
-        if row:
-            return  # Skip if the data already exists
-        db.execute(f"INSERT INTO {table} (id, data) VALUES (?, ?)", (key, value))
+def _rows_from_cache(db, table: str, keys: Iterable[str])-> Dict[str, Row]:
+        """Returns the cached (payload, fields, fetched_at) rows of `keys` by id, missing keys are left out."""
+        keys = list(dict.fromkeys(keys))
+        rows = {}
+        for chunk in _chunks(keys, _IN_CHUNK):
+            sql = f"SELECT id, {_ROW_COLUMNS} FROM {table} WHERE id IN ({','.join('?' * len(chunk))})"
+            rows.update((key, _decoded(*row)) for key, *row in db.execute(sql, chunk))
+        return rows
+
+
+def _search_row_from_cache(db, kind: str, query: str)-> Row | None:
+        """Returns the (id, None, fetched_at) row of the id a normalized `query` resolved to."""
+        row = db.execute(_SELECT_SEARCH, (kind, query)).fetchone()
+        return (row[0], None, row[1]) if row else None
+
+
+def _all_from_cache(db, table: str)-> List[Tuple[str, str]]:
+        """Returns every cached (id, payload) row of `table`."""
+        return [(key, _decode_payload(data, format)) for key, data, format in db.execute(f"SELECT id, data, format FROM {table}")]
+
+
+def _delete_cache(db, table: str, key: Any)-> bool:
+        """
+        Deletes a row with its archived page, or a resolved search (`table` "search", `key` the (kind, query)).
+        Returns whether there was one.
+        """
+        counts = [db.execute(sql, args).rowcount for sql, args in _deletes(table, key)]
         db.commit()
+        return counts[0] > 0
+
+
+def _cache_size(db)-> Tuple[int, int]:
+        """Returns the (rows, bytes) a `CacheLimit` is checked against."""
+        return tuple(db.execute(_CACHE_SIZE).fetchone())
+
+
+def _evict_cache(db, limit: CacheLimit, rows: int, size: int, keep: Collection[Tuple[str, str]] = ())-> Tuple[int, int]:
+        """
+        Deletes up to `limit.batch` rows (and their archived pages) by the limit's policy, returns the (rows, bytes) freed.
+        The (table, id) rows in `keep`, the ones just written, are never evicted.
+        """
+        order = EVICTION_POLICIES[limit.policy]
+        candidates = [
+            db.execute(_EVICTION_CANDIDATES.format(table=table, order=order), (limit.batch + len(keep),)).fetchall()
+            for table in CACHE_TABLES
+        ]
+        victims = _eviction_victims(limit, rows, size, heapq.merge(*candidates, key=_eviction_order(limit.policy)), keep)
+        for table in CACHE_TABLES:
+            db.executemany(f"DELETE FROM {table} WHERE id = ?", [(key,) for t, key, _ in victims if t == table])
+        db.executemany("DELETE FROM pages WHERE url = ?", [(_page_url(table, key),) for table, key, _ in victims])
+        return len(victims), sum(length for _, _, length in victims)
+
 
+def _query_cache(db, query: AnimeQuery)-> List[Tuple[str, Row]]:
+        """Returns the (id, row) of the cached anime matching `query`, in its order."""
+        return [(key, _decoded(*row)) for key, *row in db.execute(*query.sql())]
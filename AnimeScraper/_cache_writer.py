@@ -0,0 +1,613 @@
+"""
+Write-behind cache writers. Rows are kept in memory and written with one
+`executemany` per table and a single commit, every `batch_size` rows or
+`flush_interval` seconds after the first pending row, whichever comes first.
+
+Pending rows are readable through `row` and `search` so a fetched page is
+never fetched again only because its row hasn't been flushed yet. Archived
+pages (`store_page`) are only written.
+
+With a `CacheLimit` the reads are recorded too (`touch`) and every flush
+evicts a batch of rows once the cache is over the limit. The size is kept
+by triggers in `cache_size`, so checking it is a single row read.
+
+A flush takes the write lock up front (BEGIN IMMEDIATE) and is retried while
+another process holds it past the busy timeout. With `lock_path` the writers
+of every process also take turns on an flock of that file, so processes
+sharing a cache queue for it instead of polling SQLite's lock.
+"""
+
+__all__ = ["AsyncCacheWriter", "CacheWriter", "SYNCHRONOUS_MODES"]
+
+import asyncio
+import json
+import os
+import threading
+import time
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from ._cache_query import _UPSERT_INDEX, _try_index_row
+from ._cache_utils import (
+    _REPLACE_PAGE,
+    _REPLACE_SEARCH,
+    _TOUCH,
+    _UPSERT,
+    CacheLimit,
+    Row,
+    _cache_size,
+    _compression_format,
+    _connect,
+    _encode_payload,
+    _evict_cache,
+    _evict_from_cache,
+    _fields_key,
+    _get_cache_size,
+    _retry_busy,
+    _retry_busy_async,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# a page to archive: (html, response headers, fetched_at)
+Page = Tuple[str, Optional[Dict[str, str]], float]
+
+# values for PRAGMA synchronous, None keeps SQLite's default (FULL)
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+def _synchronous_pragma(mode: Optional[str])-> Optional[str]:
+    if mode is None:
+        return None
+    if mode.upper() not in SYNCHRONOUS_MODES:
+        raise ValueError(f"synchronous must be one of {SYNCHRONOUS_MODES}, got {mode!r}")
+    return f"PRAGMA synchronous = {mode.upper()}"
+
+
+class _ProcessLock:
+    """An exclusive flock on a file next to the cache, held by one process's writer at a time."""
+
+    def __init__(self, path: str) -> None:
+        if fcntl is None:
+            raise ValueError("process_lock needs fcntl, which isn't available on this platform")
+        self.path = path
+        self._fd: Optional[int] = None
+
+
+    def _file(self)-> int:
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        return self._fd
+
+
+    def acquire(self)-> None:
+        fcntl.flock(self._file(), fcntl.LOCK_EX)
+
+
+    async def acquire_async(self)-> None:
+        """Waits for the lock without blocking the event loop."""
+        while True:
+            try:
+                fcntl.flock(self._file(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                await asyncio.sleep(0.005)
+
+
+    def release(self)-> None:
+        fcntl.flock(self._file(), fcntl.LOCK_UN)
+
+
+    def close(self)-> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+
+class _WriteBuffer:
+    """The pending rows, the last write of a key wins unless it would replace a full parse with a partial one (like `_UPSERT`)."""
+
+    def __init__(
+        self,
+        batch_size: int,
+        flush_interval: float,
+        compression: Optional[str] = None,
+        limit: Optional[CacheLimit] = None,
+        lock_path: Optional[str] = None
+    ) -> None:
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.compression = _compression_format(compression)
+        self.limit = limit
+        self.process_lock = _ProcessLock(lock_path) if lock_path else None
+        self.flushes = 0
+        self.evictions = 0
+        self._rows: Dict[Tuple[str, str], Row] = {}
+        self._searches: Dict[Tuple[str, str], Tuple[str, float]] = {}
+        self._pages: Dict[str, Page] = {}
+        # (last read, reads) of the rows read since the last flush
+        self._touches: Dict[Tuple[str, str], Tuple[float, int]] = {}
+        # rows taken by a flush that hasn't committed yet
+        self._flushing_rows: Dict[Tuple[str, str], Row] = {}
+        self._flushing_searches: Dict[Tuple[str, str], Tuple[str, float]] = {}
+
+
+    def __len__(self)-> int:
+        return len(self._rows) + len(self._searches) + len(self._pages) + len(self._touches)
+
+
+    def row(self, table: str, key: str)-> Optional[Row]:
+        """The pending (payload, fields, fetched_at) row, like `_get_row_from_cache`."""
+        return self._rows.get((table, key)) or self._flushing_rows.get((table, key))
+
+
+    def search_row(self, kind: str, query: str)-> Optional[Row]:
+        """The pending (id, None, fetched_at) row of a resolved search, like `_search_row_from_cache`."""
+        pending = self._searches.get((kind, query)) or self._flushing_searches.get((kind, query))
+        return (pending[0], None, pending[1]) if pending else None
+
+
+    def _add_row(self, table: str, key: str, value: Union[str, bytes], fields: Optional[Iterable[str]])-> None:
+        fields_key = _fields_key(fields)
+        current = self._rows.get((table, key))
+        if current and current[1] is None and fields_key is not None:
+            return
+        self._rows[(table, key)] = (value, fields_key, time.time())
+
+
+    def _add_search(self, kind: str, query: str, key: str)-> None:
+        self._searches[(kind, query)] = (key, time.time())
+
+
+    def _add_page(self, url: str, html: str, headers: Optional[Dict[str, str]])-> None:
+        self._pages[url] = (html, headers, time.time())
+
+
+    def _discard(self, table: str, key)-> bool:
+        """Drops a pending row (or search, keyed by `(kind, query)` with `table` "search"), returns whether there was one."""
+        if table == "search":
+            return self._searches.pop(key, None) is not None
+        return self._rows.pop((table, key), None) is not None
+
+
+    def _add_touch(self, table: str, key: str)-> None:
+        touched = self._touches.get((table, key))
+        self._touches[(table, key)] = (time.time(), touched[1] + 1 if touched else 1)
+
+
+    def _take(self)-> Tuple[Dict[Tuple[str, str], Row], Dict[Tuple[str, str], Tuple[str, float]], Dict[str, Page], Dict[Tuple[str, str], Tuple[float, int]]]:
+        """Moves the buffer to the flushing rows and returns them with the pages to archive and the reads to record."""
+        self._flushing_rows, self._rows = self._rows, {}
+        self._flushing_searches, self._searches = self._searches, {}
+        pages, self._pages = self._pages, {}
+        touches, self._touches = self._touches, {}
+        return self._flushing_rows, self._flushing_searches, pages, touches
+
+
+    def _statements(
+        self,
+        rows: Dict[Tuple[str, str], Row],
+        searches: Dict[Tuple[str, str], Tuple[str, float]],
+        pages: Dict[str, Page],
+        touches: Dict[Tuple[str, str], Tuple[float, int]]
+    )-> List[Tuple[str, List[tuple]]]:
+        """
+        The (sql, rows) pairs writing the taken rows. Payloads are encoded and anime indexed here, it
+        only reads what it is given so it can run outside the lock (and the event loop).
+        """
+        by_table: Dict[str, List[tuple]] = defaultdict(list)
+        for (table, key), (value, fields, fetched_at) in rows.items():
+            by_table[table].append((key, *_encode_payload(value, self.compression), fields, fetched_at))
+        statements = [(_UPSERT.format(table=table), table_rows) for table, table_rows in by_table.items()]
+        indexed = [
+            index_row for (table, key), (value, fields, _) in rows.items()
+            if table == "anime" and (index_row := _try_index_row(key, value, fields)) is not None
+        ]
+        if indexed:
+            statements.append((_UPSERT_INDEX, indexed))
+        touched: Dict[str, List[tuple]] = defaultdict(list)
+        for (table, key), (at, hits) in touches.items():
+            touched[table].append((at, hits, key))
+        statements += [(_TOUCH.format(table=table), table_touches) for table, table_touches in touched.items()]
+        if searches:
+            statements.append((_REPLACE_SEARCH, [(kind, query, key, at) for (kind, query), (key, at) in searches.items()]))
+        archived = [
+            (url, zlib.compress(html.encode()), json.dumps(headers) if headers is not None else None, at)
+            for url, (html, headers, at) in pages.items()
+        ]
+        if archived:
+            statements.append((_REPLACE_PAGE, archived))
+        return statements
+
+
+    def _flushed(self)-> None:
+        self._flushing_rows = {}
+        self._flushing_searches = {}
+        self.flushes += 1
+
+
+    def _restore(
+        self,
+        rows: Dict[Tuple[str, str], Row],
+        searches: Dict[Tuple[str, str], Tuple[str, float]],
+        pages: Dict[str, Page],
+        touches: Dict[Tuple[str, str], Tuple[float, int]]
+    )-> None:
+        """Puts the rows of a failed flush back in the buffer for the next one, rows stored since then win like in `_add_row`."""
+        for (table, key), row in rows.items():
+            current = self._rows.get((table, key))
+            if current is None or (row[1] is None and current[1] is not None):
+                self._rows[(table, key)] = row
+        self._searches = {**searches, **self._searches}
+        self._pages = {**pages, **self._pages}
+        for key, (at, hits) in touches.items():
+            touched = self._touches.get(key)
+            self._touches[key] = (max(at, touched[0]), hits + touched[1]) if touched else (at, hits)
+        self._flushing_rows = {}
+        self._flushing_searches = {}
+
+
+    def _rolled_back(self, evictions: int)-> None:
+        """Undoes what a rolled back flush did to the eviction count, before it is retried."""
+        self.evictions = evictions
+
+
+
+class AsyncCacheWriter(_WriteBuffer):
+    """Write-behind writer for an `aiosqlite` connection."""
+
+    def __init__(
+        self,
+        db,
+        batch_size: int = 100,
+        flush_interval: float = 0.05,
+        compression: Optional[str] = None,
+        limit: Optional[CacheLimit] = None,
+        lock_path: Optional[str] = None
+    ) -> None:
+        """
+        Args:
+            db (aiosqlite.Connection): The cache connection.
+            batch_size (int): Flush once this many rows are pending. 1 writes every row right away.
+            flush_interval (float): Seconds a pending row waits at most before it is flushed.
+            compression (Optional[str]): How the rows are compressed, "zlib", "zdict" or None.
+            limit (Optional[CacheLimit]): Size limit of the cache, rows over it are evicted after a flush.
+            lock_path (Optional[str]): File flocked around every flush, shared by the processes writing the cache.
+        """
+        super().__init__(batch_size, flush_interval, compression, limit, lock_path)
+        self.db = db
+        self._lock = asyncio.Lock()
+        self._timer: asyncio.TimerHandle | None = None
+        # timed flushes still running
+        self._background: Set[asyncio.Task] = set()
+
+
+    async def store(self, table: str, key: str, value: Union[str, bytes], fields: Optional[Iterable[str]] = None)-> None:
+        self._add_row(table, key, value, fields)
+        await self._added()
+
+
+    async def store_search(self, kind: str, query: str, key: str)-> None:
+        self._add_search(kind, query, key)
+        await self._added()
+
+
+    async def store_page(self, url: str, html: str, headers: Optional[Dict[str, str]] = None)-> None:
+        self._add_page(url, html, headers)
+        await self._added()
+
+
+    def touch(self, table: str, key: str)-> None:
+        """Records a read of a cached row for the eviction policy, written with the next flush."""
+        if self.limit is not None:
+            self._add_touch(table, key)
+            self._schedule()
+
+
+    def discard(self, table: str, key)-> bool:
+        return self._discard(table, key)
+
+
+    async def _added(self)-> None:
+        if len(self) >= self.batch_size:
+            await self.flush()
+        else:
+            self._schedule()
+
+
+    def _schedule(self)-> None:
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._flush_later)
+
+
+    def _flush_later(self)-> None:
+        self._timer = None
+        task = asyncio.ensure_future(self.flush())
+        self._background.add(task)
+        task.add_done_callback(self._flushed_later)
+
+
+    def _flushed_later(self, task: asyncio.Task)-> None:
+        self._background.discard(task)
+        # nobody awaits a timed flush, its rows are back in the buffer and retried after the interval
+        if not task.cancelled() and task.exception() is not None and len(self):
+            self._schedule()
+
+
+    async def flush(self)-> None:
+        """Writes every pending row in one transaction, they stay pending if it fails."""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        async with self._lock:
+            taken = self._take()
+            rows, _, pages, _ = taken
+            try:
+                if rows or pages:
+                    # encoding, compressing and indexing decodes every anime, it runs off the event loop
+                    statements = await asyncio.get_running_loop().run_in_executor(None, self._statements, *taken)
+                else:
+                    statements = self._statements(*taken)
+                if statements:
+                    await _retry_busy_async(self._write, statements)
+            except BaseException:
+                self._restore(*taken)
+                raise
+            self._flushed()
+
+
+    async def _write(self, statements: List[Tuple[str, List[tuple]]])-> None:
+        if self.process_lock:
+            await self.process_lock.acquire_async()
+        evictions = self.evictions
+        try:
+            await self.db.execute("BEGIN IMMEDIATE")
+            for sql, rows in statements:
+                await self.db.executemany(sql, rows)
+            if self.limit is not None:
+                await self._evict()
+            await self.db.commit()
+        except BaseException:
+            await self.db.rollback()
+            self._rolled_back(evictions)
+            raise
+        finally:
+            if self.process_lock:
+                self.process_lock.release()
+
+
+    async def _evict(self)-> None:
+        size = await _get_cache_size(self.db)
+        if self.limit.exceeded(*size):
+            evicted, _ = await _evict_from_cache(self.db, self.limit, *size, self._flushing_rows)
+            self.evictions += evicted
+
+
+    async def close(self)-> None:
+        """Flushes the pending rows, waiting for the timed flushes that already started."""
+        try:
+            if self._background:
+                # their errors leave the rows pending, the last flush writes them or raises
+                await asyncio.gather(*self._background, return_exceptions=True)
+        finally:
+            try:
+                await self.flush()
+            finally:
+                if self.process_lock:
+                    self.process_lock.close()
+
+
+    @staticmethod
+    async def configure(db, synchronous: Optional[str] = None)-> None:
+        """Applies the durability setting (PRAGMA synchronous) to the connection."""
+        pragma = _synchronous_pragma(synchronous)
+        if pragma:
+            await db.execute(pragma)
+
+
+
+class CacheWriter(_WriteBuffer):
+    """
+    Write-behind writer with its own thread and `sqlite3` connection, rows
+    can be stored from any thread and only the writer thread writes.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        batch_size: int = 100,
+        flush_interval: float = 0.05,
+        synchronous: Optional[str] = None,
+        compression: Optional[str] = None,
+        limit: Optional[CacheLimit] = None,
+        lock_path: Optional[str] = None
+    ) -> None:
+        """
+        Args:
+            db_path (str): The cache database, the writer opens its own connection.
+            batch_size (int): Flush once this many rows are pending. 1 writes every row right away.
+            flush_interval (float): Seconds a pending row waits at most before it is flushed.
+            synchronous (Optional[str]): PRAGMA synchronous of the writer connection.
+            compression (Optional[str]): How the rows are compressed, "zlib", "zdict" or None.
+            limit (Optional[CacheLimit]): Size limit of the cache, rows over it are evicted after a flush.
+            lock_path (Optional[str]): File flocked around every flush, shared by the processes writing the cache.
+        """
+        super().__init__(batch_size, flush_interval, compression, limit, lock_path)
+        self.db_path = db_path
+        self.synchronous = _synchronous_pragma(synchronous)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._first_pending: float | None = None
+        self._requested = 0 # flush() calls so far
+        self._written = 0   # flush() calls whose rows are committed
+        self._closing = False
+        self._error: BaseException | None = None
+        self._retry_at: float | None = None # monotonic time a failed flush is retried at
+        self._thread = threading.Thread(target=self._run, name="animescraper-cache-writer", daemon=True)
+        self._thread.start()
+
+
+    def row(self, table: str, key: str)-> Optional[Row]:
+        with self._lock:
+            return super().row(table, key)
+
+
+    def search_row(self, kind: str, query: str)-> Optional[Row]:
+        with self._lock:
+            return super().search_row(kind, query)
+
+
+    def discard(self, table: str, key)-> bool:
+        with self._lock:
+            return self._discard(table, key)
+
+
+    def store(self, table: str, key: str, value: Union[str, bytes], fields: Optional[Iterable[str]] = None)-> None:
+        with self._changed:
+            self._add_row(table, key, value, fields)
+            self._added()
+
+
+    def store_search(self, kind: str, query: str, key: str)-> None:
+        with self._changed:
+            self._add_search(kind, query, key)
+            self._added()
+
+
+    def store_page(self, url: str, html: str, headers: Optional[Dict[str, str]] = None)-> None:
+        with self._changed:
+            self._add_page(url, html, headers)
+            self._added()
+
+
+    def touch(self, table: str, key: str)-> None:
+        """Records a read of a cached row for the eviction policy, written with the next flush."""
+        if self.limit is not None:
+            with self._changed:
+                self._add_touch(table, key)
+                self._added()
+
+
+    def _added(self)-> None:
+        if self._first_pending is None:
+            # the idle writer thread waits without a timeout, it starts the flush_interval from here
+            self._first_pending = time.monotonic()
+            self._changed.notify_all()
+        elif len(self) >= self.batch_size:
+            self._changed.notify_all()
+
+
+    def _due(self)-> Optional[float]:
+        """Seconds until the pending rows have to be written, 0 when they are due now, None if there are none."""
+        if self._closing or self._requested > self._written:
+            return 0
+        if len(self) >= self.batch_size and self._retry_at is None:
+            return 0
+        if self._first_pending is None:
+            return None
+        if self._retry_at is not None:
+            return max(0, self._retry_at - time.monotonic())
+        return max(0, self._first_pending + self.flush_interval - time.monotonic())
+
+
+    def _run(self)-> None:
+        db = _connect(self.db_path)
+        if self.synchronous:
+            db.execute(self.synchronous)
+        try:
+            while True:
+                with self._changed:
+                    while (wait := self._due()) != 0:
+                        self._changed.wait(wait)
+                    requested = self._requested
+                    closing = self._closing
+                    self._first_pending = None
+                    taken = self._take()
+
+                failed = False
+                try:
+                    statements = self._statements(*taken)
+                    if statements:
+                        _retry_busy(self._write, db, statements)
+                except BaseException as e:
+                    self._error = e
+                    failed = True
+
+                with self._changed:
+                    if failed and not closing:
+                        # pending again, retried after the interval or by the next flush()
+                        self._restore(*taken)
+                        self._first_pending = self._first_pending or time.monotonic()
+                        self._retry_at = time.monotonic() + self.flush_interval
+                    else:
+                        if any(taken):
+                            self._flushed()
+                        self._retry_at = None
+                    self._written = requested
+                    self._changed.notify_all()
+                    if closing and not len(self):
+                        return
+        finally:
+            db.close()
+            if self.process_lock:
+                self.process_lock.close()
+
+
+    def _write(self, db, statements: List[Tuple[str, List[tuple]]])-> None:
+        if self.process_lock:
+            self.process_lock.acquire()
+        evictions = self.evictions
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            for sql, rows in statements:
+                db.executemany(sql, rows)
+            if self.limit is not None:
+                self._evict(db)
+            db.commit()
+        except BaseException:
+            db.rollback()
+            self._rolled_back(evictions)
+            raise
+        finally:
+            if self.process_lock:
+                self.process_lock.release()
+
+
+    def _evict(self, db)-> None:
+        size = _cache_size(db)
+        if self.limit.exceeded(*size):
+            evicted, _ = _evict_cache(db, self.limit, *size, self._flushing_rows)
+            self.evictions += evicted
+
+
+    def flush(self)-> None:
+        """Writes every pending row in one transaction and waits until it is committed."""
+        with self._changed:
+            if not self._thread.is_alive():
+                return
+            self._requested += 1
+            target = self._requested
+            self._changed.notify_all()
+            while self._written < target and self._thread.is_alive():
+                self._changed.wait(0.1)
+        self._raise()
+
+
+    def close(self)-> None:
+        """Writes the pending rows and stops the writer thread."""
+        with self._changed:
+            self._closing = True
+            self._changed.notify_all()
+        self._thread.join()
+        self._raise()
+
+
+    def _raise(self)-> None:
+        if self._error:
+            error, self._error = self._error, None
+            raise error
@@ -0,0 +1,94 @@
+"""
+A lazily parsed variant of the `Anime` model.
+"""
+
+__all__ = ["LazyAnime"]
+
+import re
+from typing import Any, Dict, Tuple
+
+from ._model import Anime
+from ._parse_anime_data import (
+    ANIME_FIELDS,
+    _SIDEBAR_LINKS,
+    _SIDEBAR_TEXT,
+    _parse_anime_fields,
+    make_soup,
+)
+
+# (start marker, end marker) of the page slice a section is parsed from.
+# The slice stops where the end marker begins (or at the end of the page),
+# the whole page is used if the start marker is missing.
+_SECTIONS = {
+    "title": ('<h1 class="title-name', "</h1>"),
+    "sidebar": ('<div class="leftside">', '<div class="rightside'),
+    "ranked": ('<span class="numbers ranked"', "</span>"),
+    "synopsis": ('<p itemprop="description">', "</p>"),
+    "related": ('<div class="entries-tile">', '<div class="detail-characters-list'),
+    # the second characters list on the page is the staff list
+    "characters": ('<div class="detail-characters-list clearfix">', '<div class="detail-characters-list clearfix">'),
+}
+
+# the sections each field needs, fields sharing the same sections are parsed together
+_FIELD_SECTIONS: Dict[str, Tuple[str, ...]] = {
+    "title": ("title",),
+    **{field: ("sidebar", "ranked") for field in (*_SIDEBAR_TEXT, *_SIDEBAR_LINKS, "stats")},
+    "synopsis": ("synopsis",),
+    "related": ("related",),
+    "characters": ("characters",),
+}
+
+_AID_INPUT = re.compile(r'<input[^>]*name="aid"[^>]*>')
+
+
+class LazyAnime(Anime):
+    """
+    An `Anime` that keeps the fetched html and parses a section (sidebar,
+    stats, characters, related entries etc.) the first time one of its
+    fields is read. Parsed values are kept on the instance.
+
+    Only the section offsets and the anime id are found when it is created.
+    """
+
+    def __init__(self, html: str) -> None:
+        self._html = html
+        self._offsets = {name: _find_section(html, *markers) for name, markers in _SECTIONS.items()}
+        aid = _AID_INPUT.search(html)
+        tag = make_soup(aid.group() if aid else html).find("input", attrs={"name": "aid"})
+        self.id = tag.attrs["value"] # type: ignore
+
+
+    def __getattr__(self, name: str) -> Any:
+        # only called for fields that haven't been parsed yet
+        if name not in _FIELD_SECTIONS:
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        self._parse_section(_FIELD_SECTIONS[name])
+        return self.__dict__[name]
+
+
+    def _parse_section(self, sections: Tuple[str, ...]) -> None:
+        html = "".join(self._html[start:end] for start, end in map(self._offsets.get, sections)) # type: ignore
+        wanted = {field for field, needs in _FIELD_SECTIONS.items() if needs == sections}
+        self.__dict__.update(_parse_anime_fields(make_soup(html), wanted))
+
+
+    def parsed_fields(self) -> frozenset:
+        """The fields parsed so far."""
+        return ANIME_FIELDS & self.__dict__.keys()
+
+
+    def to_anime(self) -> Anime:
+        """Parses every remaining section and returns a plain `Anime`."""
+        return Anime(**{field: getattr(self, field) for field in ANIME_FIELDS})
+
+
+    def __reduce__(self):
+        return (type(self), (self._html,))
+
+
+def _find_section(html: str, start_marker: str, end_marker: str) -> Tuple[int, int]:
+    start = html.find(start_marker)
+    if start == -1:
+        return 0, len(html)
+    end = html.find(end_marker, start + len(start_marker))
+    return start, end if end != -1 else len(html)
@@ -0,0 +1,96 @@
+"""
+An in-process LRU of built `Anime` and `Character` objects, checked before
+the SQLite cache so a hot entry costs a dict lookup instead of a query and
+a json decode.
+"""
+
+__all__ = ["LRUCache"]
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class LRUCache:
+    """
+    A thread safe least recently used cache bounded by a number of entries,
+    a total size in bytes, or both. The size of an entry is given by the
+    caller (the length of its json for the scrapers).
+    """
+
+    def __init__(self, max_entries: Optional[int] = 1024, max_bytes: Optional[int] = None) -> None:
+        """
+        Args:
+            max_entries (Optional[int]): Most entries kept, None for no limit.
+            max_bytes (Optional[int]): Most bytes kept (sum of the entry sizes), None for no limit.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def __len__(self)-> int:
+        return len(self._entries)
+
+
+    def get(self, key: Hashable)-> Any:
+        """Returns the value of `key` (marking it as recently used) or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+
+    def put(self, key: Hashable, value: Any, size: int = 1)-> None:
+        """Adds or replaces `key`, evicting the least recently used entries over the limits."""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._entries and self._over_limit():
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+
+    def _over_limit(self)-> bool:
+        return ((self.max_entries is not None and len(self._entries) > self.max_entries)
+                or (self.max_bytes is not None and self._bytes > self.max_bytes))
+
+
+    def pop(self, key: Hashable)-> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+
+    def clear(self)-> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+    def stats(self)-> Dict[str, int]:
+        """Entry count, size in bytes, hits, misses and evictions so far."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -1,88 +1,155 @@
 import re
 import difflib
-from bs4 import BeautifulSoup
-from typing import Dict, List
+from collections import Counter
+from bs4 import BeautifulSoup, Tag, NavigableString, CData
+from dataclasses import fields as dataclass_fields
+from typing import AbstractSet, Any, Dict, FrozenSet, Iterable, List, Optional
 from ._model import Anime, AnimeCharacter, AnimeStats, Character
 from .exceptions import CharacterNotFoundError
 
-def _parse_anime_data(html: str)-> Anime:
-
-    soup = BeautifulSoup(html, "html.parser")
-    anime_id = soup.find("input", attrs={"name": "aid"}).attrs["value"] # type: ignore 
-
-    title = soup.find("h1", "title-name h1_bold_none").text # type: ignore
-    jap_title = get_span_text(soup, "Japanese") 
-    eng_title = get_span_text(soup, "English")
-    anime_type = get_span_text(soup, "Type")
-    episodes = get_span_text(soup, "Episodes")
-    duration = get_span_text(soup, "Duration")
-    status = get_span_text(soup, "Status")
-    aired = get_span_text(soup, "Aired")
-    premiered = get_span_text(soup, "Premiered")
-    studios = get_span_text(soup, "Studios")
-    rating = get_span_text(soup, "Rating")
-    synopsis = soup.find_all("p", attrs={'itemprop': 'description'})[0].text 
-
-    theme = soup.find("span", "dark_text", string="Theme:")  # type: ignore
-    if theme == None:
-        theme = soup.find("span", "dark_text", string="Themes:")
-    theme_list = [i.string for i in theme.parent.find_all("a")] if theme else ["N/A"] # type: ignore 
-    
-    genres = soup.find("span", "dark_text", string="Genres:")
-    if genres == None:
-        genres = soup.find("span", "dark_text", string="Genre:")
-    genres_list = [a.string for a in genres.parent.find_all("a")] if genres else ["N/A"]  # type: ignore 
-
-    producers = soup.find("span", "dark_text", string="Producers:")
-    producers = [a.string for a in producers.parent.find_all("a")] if producers else ["N/A"]#type: ignore
-
-
-    licensors = soup.find("span", "dark_text", string="Licensors:")
-    licensors = [a.string for a in licensors.parent.find_all("a")] if licensors else ["N/A"]#type: ignore
-
+try:
+    import lxml # noqa: F401 C-accelerated tree builder for BeautifulSoup
+    DEFAULT_PARSER = "lxml"
+except ImportError:
+    DEFAULT_PARSER = "html.parser"
+
+PARSER_BACKENDS = ("lxml", "html.parser")
+_parser_backend = DEFAULT_PARSER
+
+ANIME_FIELDS = frozenset(field.name for field in dataclass_fields(Anime))
+
+_MEMBER_FAVORITES = re.compile(r"Member Favorites:\s*([\d,]+)")
+_TEXT_TYPES = (NavigableString, CData)
+
+
+def set_parser_backend(backend: Optional[str] = None)-> str:
+    """
+    Selects the tree builder every parse_* function uses.
+
+    Args:
+        backend (Optional[str]): "lxml" or "html.parser". None restores the default,
+            which is "lxml" when it is installed.
+
+    Returns:
+        str: The backend now in use.
+    """
+    global _parser_backend
+    backend = backend or DEFAULT_PARSER
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend {backend!r}. Choose from {PARSER_BACKENDS}")
+    if backend == "lxml" and DEFAULT_PARSER != "lxml":
+        raise ValueError("The lxml backend needs `lxml` installed: pip install AnimeScraper[fast]")
+    _parser_backend = backend
+    return backend
+
+
+def make_soup(html: str)-> BeautifulSoup:
+    """Builds a BeautifulSoup tree with the selected parser backend."""
+    return BeautifulSoup(html, _parser_backend)
+
+
+# Anime fields read from a "Label: text" sidebar row
+_SIDEBAR_TEXT = {
+    "japanese_title": "Japanese",
+    "english_title": "English",
+    "anime_type": "Type",
+    "episodes": "Episodes",
+    "duration": "Duration",
+    "status": "Status",
+    "aired": "Aired",
+    "premiered": "Premiered",
+    "studios": "Studios",
+    "rating": "Rating",
+}
+# Anime fields read from the links of a sidebar row, first label found wins
+_SIDEBAR_LINKS = {
+    "themes": ("Theme", "Themes"),
+    "genres": ("Genres", "Genre"),
+    "producers": ("Producers",),
+    "licensors": ("Licensors",),
+}
+_SIDEBAR_FIELDS = frozenset({*_SIDEBAR_TEXT, *_SIDEBAR_LINKS, "stats"})
+
+
+def anime_fields(fields: Optional[Iterable[str]] = None)-> FrozenSet[str]:
+    """
+    Validates a `fields` projection. None means every field, `id` is always included.
+
+    Raises:
+        ValueError: If a name isn't an `Anime` attribute.
+    """
+    if fields is None:
+        return ANIME_FIELDS
+    wanted = frozenset(fields) | {"id"}
+    unknown = wanted - ANIME_FIELDS
+    if unknown:
+        raise ValueError(f"Unknown anime fields {sorted(unknown)}. Choose from {sorted(ANIME_FIELDS)}")
+    return wanted
+
+
+def _parse_anime_data(html: str, fields: Optional[Iterable[str]] = None)-> Anime:
+    """
+    Parses an anime page. When `fields` is given only those sections are
+    parsed and every other field of the returned Anime is None.
+    """
+    wanted = anime_fields(fields)
+    values: Dict[str, Any] = dict.fromkeys(ANIME_FIELDS)
+
+    soup = make_soup(html)
+    values["id"] = soup.find("input", attrs={"name": "aid"}).attrs["value"] # type: ignore 
+    values.update(_parse_anime_fields(soup, wanted - {"id"}))
+    return Anime(**values)
+
+
+def _parse_anime_fields(soup: BeautifulSoup, wanted: AbstractSet[str])-> Dict[str, Any]:
+    """Parses the `wanted` Anime fields (except `id`) from an anime page or a fragment of it."""
+    values: Dict[str, Any] = {}
+
+    if "title" in wanted:
+        values["title"] = soup.find("h1", "title-name h1_bold_none").text # type: ignore
+
+    # one walk over the sidebar instead of a soup.find() per field
+    if wanted & _SIDEBAR_FIELDS:
+        sidebar = _index_sidebar(soup)
+        for field, label in _SIDEBAR_TEXT.items():
+            if field in wanted:
+                values[field] = get_span_text(soup, label, sidebar)
+        for field, labels in _SIDEBAR_LINKS.items():
+            if field in wanted:
+                values[field] = get_span_links(sidebar, *labels)
+        if "stats" in wanted:
+            values["stats"] = get_anime_stats(soup, sidebar)
+
+    if "synopsis" in wanted:
+        values["synopsis"] = soup.find("p", attrs={'itemprop': 'description'}).text # type: ignore
+
+    if "related" in wanted:
+        values["related"] = _related_entries(soup)
+
+    if "characters" in wanted:
+        values["characters"] = _anime_characters(soup)
+
+    return values
+
+
+def _related_entries(soup)-> List[Dict[str, str]]:
     related = soup.find("div", "entries-tile")
-
-    related_entries = [
+    return [
     {''.join(content.find('div', class_='relation').get_text(strip=True).split()): 
      content.find('div', class_='title').a.get_text(strip=True)} 
     for content in related.find_all('div', class_='content')]
 
 
-    anime_stats = get_anime_stats(soup)
-    anime_characters = _anime_characters(soup)
-
-    return Anime(
-        id=anime_id,
-        title=title,
-        english_title=eng_title,
-        japanese_title=jap_title,
-        anime_type=anime_type,
-        episodes=episodes,
-        status=status,
-        aired=aired,
-        duration=duration,
-        premiered=premiered,
-        rating=rating,
-        synopsis=synopsis,
-        genres=genres_list,
-        studios=studios,
-        themes=theme_list,
-        producers=producers,
-        licensors=licensors,
-        stats=anime_stats,
-        characters=anime_characters,
-        related=related_entries
-    )
 
-
-
-def get_anime_stats(soup: BeautifulSoup)-> AnimeStats:
-    score = soup.find("span", attrs={"itemprop": "ratingValue"}).text #type: ignore
-    scored_by = soup.find("span", attrs={"itemprop": "ratingCount"}).text #type: ignore
-    popularity = get_span_text(soup, "Popularity")
-    members = get_span_text(soup, "Members")
-    favorites = get_span_text(soup, "Favorites")
-    ranked = soup.find("span", "numbers ranked").strong.text # type: ignore
+def get_anime_stats(soup: BeautifulSoup, sidebar: Optional[Dict[str, Tag]] = None)-> AnimeStats:
+    if sidebar is None:
+        sidebar = _index_sidebar(soup)
+    score = sidebar.get("ratingValue").text #type: ignore
+    scored_by = sidebar.get("ratingCount").text #type: ignore
+    popularity = get_span_text(soup, "Popularity", sidebar)
+    members = get_span_text(soup, "Members", sidebar)
+    favorites = get_span_text(soup, "Favorites", sidebar)
+    ranked = sidebar.get("numbers ranked").strong.text # type: ignore
     return AnimeStats(
         score=score, 
         scored_by=scored_by, 
@@ -134,15 +201,57 @@ def get_id(url):
     return url.split("https://myanimelist.net/")[1].split("/")[1]
 
 
-def get_span_text(soup: BeautifulSoup, info_name: str)->str:
-    if soup.find("span", "dark_text", string=f"{info_name}:"):
-        return soup.find("span", "dark_text", string=f"{info_name}:").parent.text.strip().split(f"{info_name}:")[-1].strip() # type: ignore 
+def _index_sidebar(soup: BeautifulSoup)-> Dict[str, Tag]:
+    """
+    Walks every <span> of the page once and indexes the ones the anime
+    parser needs. Sidebar labels are keyed by their text (``"Type:"``),
+    the score spans by their itemprop (``"ratingValue"``, ``"ratingCount"``)
+    and the rank badge by its class (``"numbers ranked"``).
+    Only the first span for a key is kept, same as ``soup.find``.
+    """
+    index: Dict[str, Tag] = {}
+    for span in soup.find_all("span"):
+        classes = span.get("class") or ()
+        if "dark_text" in classes:
+            label = span.string
+            if label is not None:
+                index.setdefault(str(label), span)
+        if "itemprop" in span.attrs:
+            index.setdefault(span["itemprop"], span)
+        if " ".join(classes) == "numbers ranked":
+            index.setdefault("numbers ranked", span)
+    return index
+
+
+def get_span_text(soup: BeautifulSoup, info_name: str, sidebar: Optional[Dict[str, Tag]] = None)->str:
+    label = f"{info_name}:"
+    if sidebar is not None:
+        span = sidebar.get(label)
+    else:
+        span = soup.find("span", "dark_text", string=label)
+    if span:
+        return span.parent.text.strip().split(label)[-1].strip() # type: ignore 
     else:
         return "N/A"
 
 
+def _string(tag: Tag)-> Optional[str]:
+    """``tag.string`` as a plain str, a NavigableString would keep the whole tree alive."""
+    string = tag.string
+    return None if string is None else str(string)
+
+
+def get_span_links(sidebar: Dict[str, Tag], *info_names: str)-> List[str]:
+    """Returns the link texts next to the first matching sidebar label (Genres, Producers etc.)"""
+    for info_name in info_names:
+        span = sidebar.get(f"{info_name}:")
+        if span is not None:
+            return [_string(a) for a in span.parent.find_all("a")] # type: ignore 
+    return ["N/A"]
+
+
 def parse_anime_search(html)-> List:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
     data = [
         [tag.text, tag.get("href")] for tag in soup.find_all("a", "hoverinfo_trigger fw-b fl-l")
     ]
@@ -150,7 +259,7 @@ def parse_anime_search(html)-> List:
     return data
 
 def parse_character_search(html)-> tuple:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
     tag = soup.find("a")
     name = tag.text #type: ignore
     url = tag.get("href") #type: ignore
@@ -163,41 +272,28 @@ def parse_the_character(html):
     if '<div class="badresult">Invalid ID provided.</div>' in html:
         raise CharacterNotFoundError("The MAL Character id is Invalid")
 
-    soup = BeautifulSoup(html, "html.parser")
+    # the whole page is parsed once, every field is read from this tree
+    soup = make_soup(html)
     url = soup.find("meta", {"property":"og:url"}).get("content") #type: ignore
     img = soup.find("meta", {"property": "og:image"}).get("content") #type: ignore
-    match = re.search(r"Member Favorites:\s*([\d,]+)", soup.get_text())
+    favorites = soup.find(string=re.compile("Member Favorites"))
+    match = _MEMBER_FAVORITES.search(favorites.parent.get_text()) #type: ignore
     # Remove commas for integer conversion
     member_favorites = match.group(1).replace(",", "")  #type: ignore
-    start = '<h2 class="normal_header" style="height: 15px;">'
-    end = '<div class="normal_header">'
-
-    html = html.split(start)[1].split(end)[0]
-    soup = BeautifulSoup(html, "html.parser")
-
-    for spoiler in soup.find_all("div", "spoiler"):
-        spoiler.decompose()
-
-    cleaned_text = str(soup)
-    pattern = r".*?:\s*<br\s*/?>\n?"  # Matches "Text: <br>" or "Text:<br/>" followed by an optional newline
-    cleaned_text = re.sub(pattern, "", cleaned_text)
-    soup = BeautifulSoup(cleaned_text, "html.parser")
 
-
-    # removing <br> to prepare `about` dictionary
-    clean_content = "".join(cleaned_text.split("<br/>"))
-    soup_for_texts = BeautifulSoup(clean_content, "html.parser")
+    header = soup.find("h2", attrs={"class": "normal_header", "style": "height: 15px;"})
+    texts = _character_texts(header) #type: ignore
 
     # spliting to get the names and character `about`
-    lines = soup_for_texts.get_text("\n").splitlines()
+    lines = "\n".join(texts).splitlines()
     name, japanese_name = lines[0], lines[1]
 
     # dictionary may contain age, height, Weight etc.
     about = {
         key: value.strip() for line in lines if ":" in line and len(line) <40 and "(Source" not in line for key, value in [line.split(':')]
     }
-    # spliting the soup for character description
-    pure_texts = soup_for_texts.get_text(strip=True)
+    # spliting the texts for character description
+    pure_texts = "".join(text.strip() for text in texts)
 
     #getting last item of dict to split description
     k, v = next(reversed(about.items()))
@@ -215,6 +311,70 @@ def parse_the_character(html):
         url=url #type: ignore
     )
 
+
+def _character_texts(header: Tag)-> List[str]:
+    """
+    Collects the text of a character page from the name header up to the
+    next ``<div class="normal_header">``.
+
+    Spoilers, ``<br>`` tags and "Label:<br>" heading lines are skipped, so
+    strings only separated by them are joined into one, the same way
+    ``get_text`` sees them once those tags are stripped from the html.
+    """
+    texts: List[str] = []
+    joinable = False # a new string extends texts[-1]
+    after_text = False # the previous node was a string
+    eat_newline = False # the previous node was a removed "Label:<br>"
+    line = (0, 0) # (texts index, offset) where the current source line starts
+    run_line = line # where the line of texts[-1]'s first character starts
+
+    def walk(nodes)-> bool:
+        nonlocal joinable, after_text, eat_newline, line, run_line
+        for node in nodes:
+            if isinstance(node, Tag):
+                if node.name == "div" and node.get("class") == ["normal_header"]:
+                    return True
+                if node.name == "br":
+                    label = texts[-1].rstrip() if after_text else ""
+                    eat_newline = label.endswith(":")
+                    if eat_newline:
+                        # drop everything from the start of the "Label:" line
+                        if "\n" in label:
+                            line = (len(texts) - 1, label.rfind("\n") + 1)
+                        else:
+                            line = run_line
+                        index, offset = run_line = line
+                        texts[index:] = [texts[index][:offset]]
+                    after_text = False
+                    continue
+                if node.name == "div" and "spoiler" in (node.get("class") or ()):
+                    continue
+                joinable = after_text = eat_newline = False
+                if walk(node.contents):
+                    return True
+                joinable = after_text = eat_newline = False
+            elif type(node) in _TEXT_TYPES:
+                text = str(node)
+                if eat_newline and text.startswith("\n"):
+                    text = text[1:]
+                if joinable:
+                    texts[-1] += text
+                else:
+                    texts.append(text)
+                    run_line = line
+                if "\n" in text:
+                    line = (len(texts) - 1, texts[-1].rfind("\n") + 1)
+                joinable = after_text = True
+                eat_newline = False
+            else:
+                joinable = after_text = eat_newline = False
+        return False
+
+    if not walk(header.contents):
+        walk(header.next_siblings)
+    return [text for text in texts if text]
+
+
 def typ(url: str)-> str:
     """Returns TYPE from url anime, character etc."""
     if "cat=" in url:
@@ -222,22 +382,46 @@ def typ(url: str)-> str:
     else:
         return "".join(url.split("https://myanimelist.net/")[1].split("/")[0])
 
+_NOT_WORD = re.compile(r"[^a-zA-Z0-9\s]")
+
+
 def normalize(text)-> str:
-    return re.sub(r"[^a-zA-Z0-9\s]", "", text).lower()
+    return _NOT_WORD.sub("", text).lower()
+
+
+def _ratio(matches: int, length: int)-> float:
+    # same formula as difflib.SequenceMatcher.ratio, so bounds and scores compare exactly
+    return 2.0 * matches / length if length else 1.0
 
 
 def get_close_match(query, choices):
+    """
+    Returns (choice, score, index) of the choice closest to `query`, scored
+    like `difflib.SequenceMatcher(None, query, choice).ratio() * 100` on the
+    normalized strings. The first choice wins a tie.
+
+    The exact ratio is only computed for a choice whose length and character
+    count upper bounds (real_quick_ratio, quick_ratio) beat the best score so far.
+    """
     normalized_query = normalize(query)
+    query_counts = Counter(normalized_query).items()
+    matcher = difflib.SequenceMatcher(None)
+    matcher.set_seq1(normalized_query)
 
     best_index = -1
     best_score = -1.0
 
     for i, choice in enumerate(choices):
-        score = difflib.SequenceMatcher(
-            None,
-            normalized_query,
-            normalize(choice)
-        ).ratio()
+        normalized = normalize(choice)
+        length = len(normalized_query) + len(normalized)
+        if _ratio(min(len(normalized_query), len(normalized)), length) <= best_score:
+            continue
+        common = sum(min(count, normalized.count(char)) for char, count in query_counts)
+        if _ratio(common, length) <= best_score:
+            continue
+
+        matcher.set_seq2(normalized)
+        score = matcher.ratio()
 
         if score > best_score:
             best_score = score
@@ -258,14 +442,14 @@ def parse_top_anime(html: str)-> List[Dict[str, str]]:
     end = '</table>'
 
     table = html.split(start)[1].split(end)[0]
-    soup = BeautifulSoup(table, "html.parser")
+    soup = make_soup(table)
     tags = soup.find_all("td", "title al va-t word-break")
     if not tags:
         raise AttributeError("MAL html code structure has probably changed")
     TopAnimeList = [
         {
             "id": get_id(tag.a.get("href")),
-            "name": tag.h3.string,
+            "name": _string(tag.h3),
             "img": tag.img.get("data-src")
     } for tag in tags
 ]
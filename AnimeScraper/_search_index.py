@@ -0,0 +1,133 @@
+"""
+A local title index over the cached anime, `search_anime` uses it to answer
+a query without the search and detail page round-trips when the anime is
+already in the cache.
+"""
+
+__all__ = ["TitleIndex"]
+
+import difflib
+import json
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Optional, Set, Tuple, Union
+
+from ._model import Anime
+
+TITLE_FIELDS = ("title", "english_title", "japanese_title")
+
+# unicode aware, unlike `normalize`, so japanese titles are kept
+_NOT_WORD = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_title(text: str)-> str:
+    return _SPACES.sub(" ", _NOT_WORD.sub("", text.casefold())).strip()
+
+
+def _trigrams(text: str)-> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    """
+    A character trigram inverted index over the title, english and japanese
+    title of each anime.
+
+    `match` scores the anime sharing the most trigrams with the query using
+    the same ratio as `get_close_match`.
+    """
+
+    def __init__(self, max_candidates: int = 20) -> None:
+        """
+        Args:
+            max_candidates (int): How many of the anime sharing the most trigrams
+                with a query are scored.
+        """
+        self.max_candidates = max_candidates
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        self._titles: Dict[str, Tuple[str, ...]] = {}
+        # the sync scraper updates the index from its batch threads
+        self._lock = threading.RLock()
+
+
+    def __len__(self)-> int:
+        return len(self._titles)
+
+
+    def __contains__(self, anime_id: str)-> bool:
+        return anime_id in self._titles
+
+
+    def add(self, anime_id: str, titles: Iterable[Optional[str]])-> None:
+        """Indexes (or re-indexes) an anime under its titles, missing ones (None, "N/A") are skipped."""
+        normalized = tuple(dict.fromkeys(filter(None, (normalize_title(t) for t in titles if t and t != "N/A"))))
+        with self._lock:
+            self.remove(anime_id)
+            if not normalized:
+                return
+            self._titles[anime_id] = normalized
+            for title in normalized:
+                for gram in _trigrams(title):
+                    self._postings[gram].add(anime_id)
+
+
+    def add_anime(self, anime_id: str, anime: Anime)-> None:
+        self.add(anime_id, (getattr(anime, field) for field in TITLE_FIELDS))
+
+
+    def add_row(self, anime_id: str, data: Union[str, bytes])-> None:
+        """Indexes a cached `Anime.model_dump_bytes()` (or, for older rows, `model_dump_json()`) payload."""
+        try:
+            if isinstance(data, bytes):
+                self.add_anime(anime_id, Anime.from_bytes(data))
+                return
+            anime = json.loads(data)
+        except ValueError:
+            # a row that can't be decoded is indexed once it is fetched again
+            return
+        self.add(anime_id, (anime.get(field) for field in TITLE_FIELDS))
+
+
+    def remove(self, anime_id: str)-> None:
+        with self._lock:
+            for title in self._titles.pop(anime_id, ()):
+                for gram in _trigrams(title):
+                    ids = self._postings[gram]
+                    ids.discard(anime_id)
+                    if not ids:
+                        del self._postings[gram]
+
+
+    def match(self, query: str, min_score: float)-> Optional[str]:
+        """
+        Returns the id of the anime whose title matches `query` best, if its
+        score (0-100) is at least `min_score` and no other anime scores the same.
+        """
+        normalized_query = normalize_title(query)
+        if not normalized_query:
+            return None
+
+        shared: Counter = Counter()
+        with self._lock:
+            for gram in _trigrams(normalized_query):
+                shared.update(self._postings.get(gram, ()))
+            candidates = [(anime_id, self._titles[anime_id]) for anime_id, _ in shared.most_common(self.max_candidates)]
+
+        matcher = difflib.SequenceMatcher(None)
+        matcher.set_seq1(normalized_query)
+        best_id, best_score, tied = None, -1.0, False
+        for anime_id, titles in candidates:
+            for title in titles:
+                matcher.set_seq2(title)
+                score = matcher.ratio() * 100
+                if score > best_score:
+                    best_id, best_score, tied = anime_id, score, False
+                elif score == best_score and anime_id != best_id:
+                    tied = True
+
+        if best_id is None or tied or best_score < min_score:
+            return None
+        return best_id
@@ -0,0 +1,95 @@
+"""
+Single-flight deduplication of concurrent identical calls. The first caller
+of a key runs the call, callers arriving while it is in flight wait for its
+result (or exception) instead of fetching and parsing the same page again and
+spending rate limiter budget on it. The callers get the same object back,
+like from the memory cache. Nothing is kept once the call finishes, the next
+call runs again (that is what the cache is for).
+"""
+
+__all__ = ["AsyncSingleFlight", "SingleFlight"]
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from functools import partial
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class AsyncSingleFlight:
+    """Single flight for coroutines, the shared call runs in its own task."""
+
+    def __init__(self)-> None:
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.shared = 0 # calls answered by another caller's call
+
+
+    def __len__(self)-> int:
+        return len(self._calls)
+
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[T]])-> T:
+        """Returns the result of `func()`, shared with every call of `key` made while it runs."""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(partial(self._done, key))
+        else:
+            self.shared += 1
+        # a cancelled caller doesn't cancel the call the others are waiting for
+        return await asyncio.shield(task)
+
+
+    def _done(self, key: Hashable, task: asyncio.Task)-> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # retrieved here too, so a call whose callers were all cancelled isn't logged as unhandled
+            task.exception()
+
+
+    async def wait(self)-> None:
+        """Waits for the calls in flight, whatever their outcome."""
+        if self._calls:
+            await asyncio.gather(*self._calls.values(), return_exceptions=True)
+
+
+
+class SingleFlight:
+    """Single flight for threads, the shared call runs on the first caller's thread."""
+
+    def __init__(self)-> None:
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.shared = 0 # calls answered by another caller's call
+
+
+    def __len__(self)-> int:
+        return len(self._calls)
+
+
+    def run(self, key: Hashable, func: Callable[[], T])-> T:
+        """Returns the result of `func()`, shared with every call of `key` made while it runs."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
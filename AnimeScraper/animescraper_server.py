@@ -1,15 +1,51 @@
 from fastapi import FastAPI, HTTPException, Depends, Query
-from AnimeScraper import KunYu  # Import KunYu (main entry point)
+from AnimeScraper import KunYu, __version__  # Import KunYu (main entry point)
 from AnimeScraper._model import Anime, Character  # Import response models
-from typing import Dict, Generator, List
+from typing import Dict, List, Optional
 from fastapi.middleware.cors import CORSMiddleware
-import asyncio
+from contextlib import asynccontextmanager
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
+
+USE_CACHE = os.getenv("ANIME_SCRAPER_USE_CACHE", "False") == "True"
+DB_PATH = os.getenv("ANIME_SCRAPER_DB_PATH", "cache.db")
+# seconds a searched name keeps resolving to the same MAL id
+SEARCH_TTL = float(os.getenv("ANIME_SCRAPER_SEARCH_TTL", 7 * 24 * 60 * 60))
+# keep the fetched pages so `animescraper reparse` can rebuild the cache
+ARCHIVE_PAGES = os.getenv("ANIME_SCRAPER_ARCHIVE_PAGES", "False") == "True"
+# set by `animescraper server --workers N`, the workers' cache writers take turns on `<db_path>.lock`
+PROCESS_LOCK = os.getenv("ANIME_SCRAPER_PROCESS_LOCK", "False") == "True"
+# built anime/characters kept in memory in front of the cache, 0 turns it off
+MEMORY_CACHE_ENTRIES = int(os.getenv("ANIME_SCRAPER_MEMORY_CACHE_ENTRIES", 0))
+
+# One KunYu for the whole app: its session (keep-alive connection pool), rate limiter,
+# cache connection and memory cache are shared by every request
+kunyu = KunYu(
+    use_cache=USE_CACHE,
+    db_path=DB_PATH,
+    max_requests=3,
+    search_ttl=SEARCH_TTL,
+    archive_pages=ARCHIVE_PAGES,
+    cache_process_lock=PROCESS_LOCK,
+    memory_cache_entries=MEMORY_CACHE_ENTRIES or None,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with kunyu:
+        yield
+    logger.info("KunYu instance closed")
+
+
 app = FastAPI(
     title="AnimeScraper API", 
     description="API for interacting with MyAnimeList data using AnimeScraper", 
-    version="1.1.8"
+    version=__version__,
+    lifespan=lifespan
 )
 app.add_middleware(
     CORSMiddleware,
@@ -19,31 +55,23 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
-USE_CACHE = os.getenv("ANIME_SCRAPER_USE_CACHE", "False") == "True"
-DB_PATH = os.getenv("ANIME_SCRAPER_DB_PATH", "cache.db")
-# Dependency to provide KunYu instance
-# For resuing session :)
-def get_kunyu_instance() -> Generator[KunYu, None, None]:
-    """
-    Dependency to manage KunYu instance and session.
-    Ensures the session is created once and reused across requests.
-    """
 
-    kunyu_instance = KunYu(use_cache=USE_CACHE, db_path=DB_PATH, max_requests=3)  # Reusing session across requests
-    yield kunyu_instance
-    # Clean up and close the session once the app shuts down
-    if kunyu_instance._shared_session:
-        asyncio.run(kunyu_instance._shared_session.close())
-        print("✅ KunYu instance closed successfully!")
+# Dependency to provide the KunYu instance
+def get_kunyu_instance() -> KunYu:
+    return kunyu
 
 
 @app.get("/anime/{anime_id}", response_model=Anime)
-async def get_anime(anime_id: str, kunyu_instance: KunYu = Depends(get_kunyu_instance)) -> Anime:
+async def get_anime(
+    anime_id: str,
+    fields: Optional[List[str]] = Query(None, description="Only return these anime fields"),
+    kunyu_instance: KunYu = Depends(get_kunyu_instance)
+) -> Anime:
     """
     Endpoint to get anime details by its MAL ID.
     """
     try:
-        anime = await kunyu_instance.get_anime(anime_id)
+        anime = await kunyu_instance.get_anime(anime_id, fields)
         if anime is None:
             raise HTTPException(status_code=404, detail="Anime not found")
         return anime
@@ -66,12 +94,16 @@ async def get_character(character_id: str, kunyu_instance: KunYu = Depends(get_k
 
 
 @app.get("/search-anime/{anime_name}", response_model=Anime)
-async def search_anime(anime_name: str, kunyu_instance: KunYu = Depends(get_kunyu_instance)) -> Anime:
+async def search_anime(
+    anime_name: str,
+    fields: Optional[List[str]] = Query(None, description="Only return these anime fields"),
+    kunyu_instance: KunYu = Depends(get_kunyu_instance)
+) -> Anime:
     """
     Endpoint to search for anime by name.
     """
     try:
-        anime = await kunyu_instance.search_anime(anime_name)
+        anime = await kunyu_instance.search_anime(anime_name, fields)
         if anime is None:
             raise HTTPException(status_code=404, detail="Anime not found")
         return anime
@@ -109,7 +141,7 @@ async def search_batch_anime(
         List[Anime]: A list of anime details for the searched names.
     """
     try:
-        print(f"Searching batch anime for: {anime_names}")
+        logger.debug("Searching batch anime for: %s", anime_names)
         animes = await kunyu_instance.search_batch_anime(anime_names)
         if not animes:
             raise HTTPException(status_code=404, detail="No anime found for batch search")
@@ -136,7 +168,7 @@ async def search_batch_character(
         List[Character]: A list of character details for the searched names.
     """
     try:
-        print(f"Searching batch character for: {character_names}")
+        logger.debug("Searching batch character for: %s", character_names)
         character = await kunyu_instance.search_batch_character(character_names)
         if not character:
             raise HTTPException(status_code=404, detail="No character found for batch search")
@@ -1,33 +1,65 @@
 import aiohttp
 import asyncio
-from typing import Dict, Optional, List
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Optional, List, Tuple, TypeVar
 from urllib.parse import quote
 from aiolimiter import AsyncLimiter
 from aiohttp import ClientTimeout
-import aiosqlite
 from .exceptions import (
     CharacterNotFoundError,
     AnimeNotFoundError,
     NetworkError
 )
-from ._cache_utils import _get_from_cache, _initialize_database, _store_in_cache
+from ._cache_utils import (
+    SEARCH_TTL,
+    CacheLimit,
+    CacheTTL,
+    Row,
+    _compression_format,
+    _covers,
+    _fields_key,
+    _expired,
+)
+from ._cache_query import AnimeQuery
+from ._cache_backend import (
+    AsyncBackend,
+    AsyncCacheBackend,
+    AsyncSQLiteBackend,
+    CacheBackend,
+    SQLiteBackend,
+    _async_backend,
+    _search_key,
+)
+from ._cache_writer import _synchronous_pragma
+from ._archive import _page_key
 
 from ._parse_anime_data import (
     get_id,
+    anime_fields,
     _parse_anime_data,  
     parse_anime_search, 
     parse_character_search, 
     parse_the_character,
     parse_top_anime,
     get_close_match,
-    normalize
 )
 
+from ._lazy_anime import LazyAnime
+from ._memory_cache import LRUCache
+from ._single_flight import AsyncSingleFlight
+from ._search_index import TitleIndex, normalize_title
 from ._model import (
     Anime,
     Character
 )
 
+T = TypeVar("T")
+
+# where the html of fetched pages gets parsed
+PARSE_EXECUTORS = ("inline", "thread", "process")
+
 
 class MalScraper:
     """
@@ -52,6 +84,11 @@ class MalScraper:
     "Upgrade-Insecure-Requests": "1"
 }
 
+    # the limiter bounds the request rate, these the pooled keep-alive connections to MAL
+    CONNECTION_LIMIT = 10
+    KEEPALIVE_TIMEOUT = 30
+    DNS_CACHE_TTL = 300
+
     def __init__(
         self, 
         use_cache: bool,
@@ -60,20 +97,101 @@ class MalScraper:
         per_second: int,
         timeout: int,
         session: Optional[aiohttp.ClientSession] = None,
+        parse_executor: str = "inline",
+        parse_workers: Optional[int] = None,
+        local_search: bool = False,
+        local_search_score: float = 90,
+        search_ttl: Optional[float] = SEARCH_TTL,
+        cache_batch_size: int = 100,
+        cache_flush_interval: float = 0.05,
+        cache_synchronous: Optional[str] = None,
+        cache_ttl: Optional[CacheTTL] = None,
+        stale_while_revalidate: bool = False,
+        memory_cache_entries: Optional[int] = None,
+        memory_cache_bytes: Optional[int] = None,
+        cache_compression: Optional[str] = None,
+        archive_pages: bool = False,
+        cache_limit: Optional[CacheLimit] = None,
+        cache_backend: Optional[CacheBackend | AsyncCacheBackend] = None,
+        cache_process_lock: bool = False,
     ) -> None:
         """
         Initializes the scraper with an optional aiohttp session.
 
         Args:
             session (Optional[aiohttp.ClientSession]): An existing HTTP session. If None, a new session will be created.
+            parse_executor (str): Where html is parsed: "inline" (on the event loop), "thread" or "process" pool.
+            parse_workers (Optional[int]): Number of pool workers. None lets the pool decide (cpu count based).
+            local_search (bool): Answer `search_anime` from a title index of the cached anime when
+                a title scores at least `local_search_score` (0-100). Needs `use_cache`.
+            search_ttl (Optional[float]): Seconds a search query keeps resolving to the id it was cached with,
+                None never expires it. Needs `use_cache`.
+            cache_batch_size (int): Cache rows are written in one transaction once this many are pending.
+                1 writes (and commits) every row right away.
+            cache_flush_interval (float): Seconds a pending cache row waits at most before it is written.
+            cache_synchronous (Optional[str]): PRAGMA synchronous of the cache ("OFF", "NORMAL", "FULL", "EXTRA").
+                None keeps the SQLite default.
+            cache_ttl (Optional[CacheTTL]): How long cached anime and characters stay fresh, an expired row
+                is fetched again. None never expires them.
+            stale_while_revalidate (bool): Return an expired row right away and refresh it in the background.
+                Refreshes still running are awaited when the scraper exits.
+            memory_cache_entries (Optional[int]): Keep up to this many built anime/characters in memory in front of
+                the cache. Returned objects are shared, don't modify them.
+            memory_cache_bytes (Optional[int]): Bound the memory cache by the cached size of its entries instead (or too).
+            cache_compression (Optional[str]): Compress new cache rows with "zlib" or "zdict" (zlib with a preset
+                dictionary of the json keys), None leaves them uncompressed. Rows of any format are read.
+            archive_pages (bool): Keep every fetched anime and character page (compressed, with its response headers)
+                in the cache so `reparse` can rebuild the cache from them. Needs `use_cache`.
+            cache_limit (Optional[CacheLimit]): Most rows/bytes the cache keeps, the least recently or least often
+                read rows over it are evicted a batch at a time. None lets it grow.
+            cache_backend (Optional[CacheBackend | AsyncCacheBackend]): Where the cache is kept, like a `MemoryBackend`
+                or `FileBackend`. Passing one turns the cache on. None uses an `AsyncSQLiteBackend` at `db_path`
+                built from the cache_* options above.
+            cache_process_lock (bool): Let one process at a time write the SQLite cache (an flock of `<db_path>.lock`),
+                for several processes sharing it. Not available on Windows.
         """
+        if parse_executor not in PARSE_EXECUTORS:
+            raise ValueError(f"parse_executor must be one of {PARSE_EXECUTORS}, got {parse_executor!r}")
+        _synchronous_pragma(cache_synchronous)
+        _compression_format(cache_compression)
         self.session = session
         self.own_session = session is None # True if this instance manages its own session
         self.limiter = AsyncLimiter(max_requests, per_second)
         self.timeout = ClientTimeout(total=timeout)
-        self.use_cache = use_cache
+        self.use_cache = use_cache or cache_backend is not None
         self.db_path = db_path
-        self.db: aiosqlite.Connection | None= None
+        self.parse_executor = parse_executor
+        self.parse_workers = parse_workers
+        self._executor: Executor | None = None
+        self.local_search = local_search
+        self.local_search_score = local_search_score
+        self.search_index: TitleIndex | None = None
+        self.search_ttl = search_ttl
+        self.cache_batch_size = cache_batch_size
+        self.cache_flush_interval = cache_flush_interval
+        self.cache_synchronous = cache_synchronous
+        self.cache_compression = cache_compression
+        self.archive_pages = archive_pages
+        self.cache_limit = cache_limit
+        if cache_backend is None:
+            cache_backend = AsyncSQLiteBackend(
+                db_path, cache_batch_size, cache_flush_interval, cache_synchronous, cache_compression, cache_limit,
+                cache_process_lock
+            )
+        self.cache: AsyncCacheBackend = _async_backend(cache_backend)
+        if archive_pages and not hasattr(self.cache, "store_page"):
+            raise ValueError("archive_pages needs a cache backend that archives pages (SQLite)")
+        # response headers of fetched pages that are about to be archived, by url
+        self._headers: Dict[str, Dict[str, str]] = {}
+        self.cache_ttl = cache_ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        # built objects in front of the cache, kept across `with` blocks
+        self.memory: LRUCache | None = None
+        if memory_cache_entries is not None or memory_cache_bytes is not None:
+            self.memory = LRUCache(memory_cache_entries, memory_cache_bytes)
+        self._refreshes: Dict[Tuple[str, str], asyncio.Task] = {}
+        # concurrent identical fetches, searches and top lists share one request
+        self.flights = AsyncSingleFlight()
 
 
     async def __aenter__(self):
@@ -84,13 +202,45 @@ class MalScraper:
             MalScraper: The current instance with an initialized session.
         """
         if not self.session:
-            self.session = aiohttp.ClientSession(headers=self.HEADERS)
+            self.session = self._new_session()
         if self.use_cache:
-            await _initialize_database(self.db_path)
-            self.db = await aiosqlite.connect(self.db_path)
+            await self.cache.open()
+            if self.local_search and self.search_index is None:
+                # built once, then kept up to date by get_anime
+                await self._build_search_index()
         return self
 
 
+    async def _build_search_index(self)-> None:
+        """Builds the title index from the cached anime, it replaces the current one once complete."""
+        index = TitleIndex()
+        for anime_id, data in await self.cache.items("anime"):
+            index.add_row(anime_id, data)
+        self.search_index = index
+
+
+    async def _cache_rewritten(self)-> None:
+        """
+        Catches up with cached rows rewritten in the database (reparse, import): the objects
+        built from the old rows are dropped and the title index is built again from the new ones.
+        """
+        if self.memory is not None:
+            self.memory.clear()
+        if self.use_cache and self.local_search:
+            await self._build_search_index()
+
+
+    def _new_session(self)-> aiohttp.ClientSession:
+        """A session with the MAL headers over a keep-alive connection pool, to be created on the running loop."""
+        connector = aiohttp.TCPConnector(
+            limit=self.CONNECTION_LIMIT,
+            limit_per_host=self.CONNECTION_LIMIT,
+            ttl_dns_cache=self.DNS_CACHE_TTL,
+            keepalive_timeout=self.KEEPALIVE_TIMEOUT,
+        )
+        return aiohttp.ClientSession(headers=self.HEADERS, connector=connector)
+
+
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """
         Exit the context manager and close the session if owned.
@@ -100,11 +250,41 @@ class MalScraper:
             exc_val: Exception value.
             exc_tb: Traceback.
         """
+        if self._refreshes:
+            await asyncio.gather(*self._refreshes.values(), return_exceptions=True)
+        await self.flights.wait()
         if self.session and self.own_session:
             await self.session.close()
             self.session = None
-        if self.db:
-            await self.db.close()
+        if self.use_cache:
+            await self.cache.close()
+
+
+    async def _parse(self, parser: Callable[[str], T], html: str)-> T:
+        """
+        Runs a parse_* function on the configured executor so parsing
+        doesn't block the event loop while other requests are in flight.
+
+        The pool is created on first use and kept until `shutdown_executor`.
+        """
+        if self.parse_executor == "inline":
+            return parser(html)
+
+        if self._executor is None:
+            if self.parse_executor == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=self.parse_workers)
+            else:
+                self._executor = ProcessPoolExecutor(max_workers=self.parse_workers)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, parser, html)
+
+
+    def shutdown_executor(self)-> None:
+        """Shuts down the parse pool, if one was started."""
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
 
 
     async def _fetch(self, url: str, query: str, req: int | None = None)-> str:
@@ -135,45 +315,221 @@ class MalScraper:
                     elif response.status == 404 and req == self.CHARACTER:
                         raise CharacterNotFoundError(query)
 
-                    return await response.text()
+                    html = await response.text()
+                    if self.archive_pages and _page_key(url):
+                        self._headers[url] = dict(response.headers)
+                    return html
 
             except aiohttp.ClientError as e:
                 raise NetworkError(f"Network error occurred: {e}")
                 
 
 
-    async def get_anime(self, anime_id: str)->Anime:
+    async def get_anime(self, anime_id: str, fields: Optional[Iterable[str]] = None, lazy: bool = False)->Anime:
         """
         Fetch and parse anime details.
 
         Args:
             anime_id (str): The MyAnimeList ID of the anime.
+            fields (Optional[Iterable[str]]): Only parse these `Anime` fields, the others are None.
+                None parses everything.
+            lazy (bool): Return a `LazyAnime` that parses each section when it is first read.
+                Lazy results are not written to the cache.
 
         Returns:
             Anime: An object containing detailed anime information.
         """
+        if lazy and fields is not None:
+            raise ValueError("Pass either `fields` or `lazy`, not both")
+        wanted = anime_fields(fields) if fields is not None else None
+        cached = None
         if self.use_cache:
-            if not self.db:
-                raise RuntimeError("Database is not initialized")
-            cached_data = await _get_from_cache(self.db, "anime", anime_id)
-            if cached_data:
-                return Anime.from_json(cached_data)
-
+            cached = self._memory_row("anime", anime_id) or await self.cache.get("anime", anime_id)
+        return await self._anime_from_row(anime_id, wanted, lazy, cached)
+
+
+    async def _anime_from_row(
+        self,
+        anime_id: str,
+        wanted: Optional[FrozenSet[str]],
+        lazy: bool,
+        cached: Optional[Row]
+    )-> Anime:
+        """Returns the anime from its cached row if it has the `wanted` fields, otherwise fetches it."""
+        anime = self._from_row("anime", anime_id, cached, wanted)
+        if anime:
+            return anime
+        if cached and wanted is not None:
+            # keep the fields the cached row already had, an expired full row is fetched in full
+            wanted = None if cached[1] is None else wanted | set(cached[1].split(","))
+        return await self.flights.run(("anime", anime_id, wanted, lazy), partial(self._fetch_anime, anime_id, wanted, lazy))
+
+
+    async def _fetch_anime(self, anime_id: str, wanted: Optional[FrozenSet[str]], lazy: bool)-> Anime:
         url = f"{self.BASE_URL}/anime/{anime_id}"
         html = await self._fetch(url, anime_id,self.CHARACTER)
-        anime =  _parse_anime_data(html)
+        await self._archive(url, html)
+        if lazy:
+            return LazyAnime(html)
+        anime = await self._parse(partial(_parse_anime_data, fields=wanted), html)
 
         if self.use_cache:
-            await _store_in_cache(self.db, "anime", anime_id, anime.model_dump_json())
+            data = anime.model_dump_bytes()
+            await self.cache.put("anime", anime_id, data, wanted)
+            self._remember("anime", anime_id, anime, _fields_key(wanted), time.time(), len(data))
+            if self.search_index is not None:
+                self.search_index.add_anime(anime_id, anime)
 
         return anime
 
 
+    def _memory_row(self, table: str, key: str)-> Optional[Row]:
+        """The (object, fields, fetched_at) row of the memory cache."""
+        return self.memory.get((table, key)) if self.memory is not None else None
+
+
+    async def _archive(self, url: str, html: str)-> None:
+        headers = self._headers.pop(url, None)
+        if self.use_cache and self.archive_pages:
+            await self.cache.store_page(url, html, headers)
+
+
+    def _remember(self, table: str, key: str, cached: Any, fields: Optional[str], fetched_at: Optional[float], size: int)-> None:
+        if self.memory is not None:
+            self.memory.put((table, key), (cached, fields, fetched_at), size)
+
+
+    async def query_cached(self, query: AnimeQuery)-> List[Anime]:
+        """
+        The cached anime matching `query`, filtered and sorted by the SQLite side tables so
+        only the matches are decoded. Nothing is fetched, expired anime are returned too.
+        """
+        if not self.use_cache:
+            raise ValueError("query_cached needs use_cache=True")
+        if not hasattr(self.cache, "query"):
+            raise ValueError("query_cached needs a cache backend that can be queried (SQLite)")
+        found = []
+        for key, row in await self.cache.query(query):
+            try:
+                found.append(self._built("anime", key, self._memory_row("anime", key) or row))
+            except ValueError:
+                continue # a row that can't be decoded, see `_from_row`
+        return found
+
+
+    async def _sqlite_cache(self, action: str)-> AsyncSQLiteBackend | SQLiteBackend:
+        """
+        The SQLite backend of the cache for `action` (reparse, export, ...), which works on its database
+        file directly. The pending writes are flushed first, so `action` sees them and they can't be
+        written over its rows later. Other backends raise ValueError.
+        """
+        backend = self.cache.backend if isinstance(self.cache, AsyncBackend) else self.cache
+        if isinstance(backend, AsyncSQLiteBackend):
+            if backend.writer is not None:
+                await backend.writer.flush()
+        elif isinstance(backend, SQLiteBackend):
+            if backend.writer is not None:
+                await asyncio.get_running_loop().run_in_executor(None, backend.writer.flush)
+        else:
+            raise ValueError(f"{action} needs the SQLite cache backend, not {type(backend).__name__}")
+        return backend
+
+
+    def cache_stats(self)-> Dict[str, int]:
+        """
+        Counters of the memory cache (entries, bytes, hits, misses, evictions) and of the
+        cache backend prefixed with "cache_" (cache_hits, cache_misses, cache_puts, ...).
+        The SQLite backend adds its flushes and evicted rows (cache_evictions).
+        """
+        stats = self.memory.stats() if self.memory is not None else {}
+        if self.use_cache:
+            stats.update((f"cache_{name}", count) for name, count in self.cache.stats().items())
+        return stats
+
+
+    def _built(self, table: str, key: str, row: Row)-> Any:
+        """The `Anime` or `Character` of a cached row, decoded rows are kept in the memory cache."""
+        if isinstance(row[0], bytes):
+            cached = (Anime if table == "anime" else Character).from_bytes(row[0])
+            self._remember(table, key, cached, row[1], row[2], len(row[0]))
+        elif isinstance(row[0], str):
+            # rows cached as json before the binary format
+            cached = (Anime if table == "anime" else Character).from_json(row[0])
+            self._remember(table, key, cached, row[1], row[2], len(row[0]))
+        else:
+            # a row of the memory cache holds the built object
+            cached = row[0]
+        return cached
+
+
+    def _from_row(self, table: str, key: str, row: Optional[Row], wanted: Optional[FrozenSet[str]] = None)-> Any:
+        """
+        The `Anime` or `Character` of a cached row that has the `wanted` fields and hasn't expired, else None.
+        With `stale_while_revalidate` an expired one is returned too and refreshed in the background.
+        """
+        if not row or not _covers(row[1], wanted):
+            return None
+        try:
+            cached = self._built(table, key, row)
+        except ValueError:
+            # written by an older binary format (or damaged), fetched again like a miss
+            return None
+        if self.cache_ttl is None or not _expired(row[2], self.cache_ttl.seconds(table, cached)):
+            self.cache.touch(table, key)
+            return cached
+        if self.stale_while_revalidate:
+            self._revalidate(table, key, row)
+            self.cache.touch(table, key)
+            return cached
+        return None
+
+
+    def _revalidate(self, table: str, key: str, row: Row)-> None:
+        """Fetches an expired row again in a background task, one task per row at a time."""
+        if (table, key) in self._refreshes:
+            return
+        if table == "anime":
+            fields = None if row[1] is None else frozenset(row[1].split(","))
+            refresh = self._anime_from_row(key, fields, False, None)
+        else:
+            refresh = self._character_from_row(key, None)
+        task = asyncio.create_task(refresh)
+        self._refreshes[(table, key)] = task
+        task.add_done_callback(partial(self._refreshed, (table, key)))
+
+
+    def _refreshed(self, key: Tuple[str, str], task: asyncio.Task)-> None:
+        self._refreshes.pop(key, None)
+        if not task.cancelled():
+            # a failed refresh keeps the expired row, the next read tries again
+            task.exception()
+
+
+    async def _cached_rows(self, table: str, keys: List[str])-> Dict[str, Row]:
+        """The cached rows of `keys` (pending writes included), looked up with a few `IN` queries."""
+        if not self.use_cache:
+            return {}
+        rows = {key: row for key in keys if (row := self._memory_row(table, key))}
+        rows.update(await self.cache.get_many(table, (key for key in keys if key not in rows)))
+        return rows
+
+
+
+    async def get_batch_anime(self, anime_ids: List[str], fields: Optional[Iterable[str]] = None, lazy: bool = False)-> List[Anime]:
+        """
+        Fetch multiple anime. Cached anime are read with a few bulk queries, only the rest are fetched.
+        A repeated id is fetched once.
+        """
+        if lazy and fields is not None:
+            raise ValueError("Pass either `fields` or `lazy`, not both")
+        wanted = anime_fields(fields) if fields is not None else None
+        rows = await self._cached_rows("anime", anime_ids)
+        anime = {key: hit for key, row in rows.items() if (hit := self._from_row("anime", key, row, wanted))}
 
-    async def get_batch_anime(self, anime_ids: List[str])-> List[Anime]:
-        tasks = [asyncio.create_task(self.get_anime(id)) for id in anime_ids]
-        results = await asyncio.gather(*tasks)
-        return [anime for anime in results]
+        misses = [key for key in dict.fromkeys(anime_ids) if key not in anime]
+        tasks = [asyncio.create_task(self._anime_from_row(key, wanted, lazy, rows.get(key))) for key in misses]
+        anime.update(zip(misses, await asyncio.gather(*tasks)))
+        return [anime[key] for key in anime_ids]
 
 
 
@@ -187,40 +543,82 @@ class MalScraper:
         Returns:
             Character: An object containing detailed character information.
         """
-        
+        cached = None
         if self.use_cache:
-            if not self.db:
-                raise RuntimeError("Database is not initialized")
-            cached_data = await _get_from_cache(self.db, "character", character_id)
-            if cached_data:
-                return Character.from_json(cached_data)
+            cached = self._memory_row("character", character_id) or await self.cache.get("character", character_id)
+        return await self._character_from_row(character_id, cached)
+
+
+    async def _character_from_row(self, character_id: str, cached: Optional[Row])-> Character:
+        """Returns the character from its cached row, fetches it if there is none (or it expired)."""
+        character = self._from_row("character", character_id, cached)
+        if character:
+            return character
+        return await self.flights.run(("character", character_id), partial(self._fetch_character, character_id))
+
 
+    async def _fetch_character(self, character_id: str)-> Character:
         url = f"{self.BASE_URL}/character/{character_id}"
         html = await self._fetch(url, character_id, self.CHARACTER)
-        character = parse_the_character(html)
+        await self._archive(url, html)
+        character = await self._parse(parse_the_character, html)
 
         if self.use_cache:
-            await _store_in_cache(self.db, "character", character_id, character.model_dump_json())
+            data = character.model_dump_bytes()
+            await self.cache.put("character", character_id, data)
+            self._remember("character", character_id, character, None, time.time(), len(data))
         return character
 
 
     async def get_batch_character(self, character_ids: List[str])-> List[Character]:
-        tasks = [asyncio.create_task(self.get_character(id)) for id in character_ids]
-        results = await asyncio.gather(*tasks)
+        """
+        Fetch multiple characters. Cached characters are read with a few bulk queries, only the rest are fetched.
+        A repeated id is fetched once.
+        """
+        rows = await self._cached_rows("character", character_ids)
+        characters = {key: hit for key, row in rows.items() if (hit := self._from_row("character", key, row))}
+
+        misses = [key for key in dict.fromkeys(character_ids) if key not in characters]
+        tasks = [asyncio.create_task(self._character_from_row(key, None)) for key in misses]
+        characters.update(zip(misses, await asyncio.gather(*tasks)))
+        return [characters[key] for key in character_ids]
+
 
-        return [character for character in results]
+    async def _resolved_search(self, kind: str, query: str)-> str | None:
+        """The cached id a search for `query` resolved to, if it hasn't expired."""
+        if not self.use_cache:
+            return None
+        row = await self.cache.get("search", _search_key(kind, normalize_title(query)))
+        if row and not _expired(row[2], self.search_ttl):
+            return row[0]
+        return None
 
 
-    async def search_anime(self, query: str):
+    async def search_anime(self, query: str, fields: Optional[Iterable[str]] = None):
         """
         Search anime by name in myanimelist.net
 
         Args:
             query (str): The name of the anime.
+            fields (Optional[Iterable[str]]): Only parse these `Anime` fields. (see `get_anime`)
 
         Returns:
             Anime: An Anime object with Anime Details.
         """
+        wanted = frozenset(fields) if fields is not None else None
+        return await self.flights.run(("search", "anime", query, wanted), partial(self._search_anime, query, fields))
+
+
+    async def _search_anime(self, query: str, fields: Optional[Iterable[str]])-> Anime:
+        cached_id = await self._resolved_search("anime", query)
+        if cached_id:
+            return await self.get_anime(cached_id, fields)
+
+        if self.search_index is not None:
+            anime_id = self.search_index.match(query, self.local_search_score)
+            if anime_id:
+                return await self.get_anime(anime_id, fields)
+
         url = f"{self.BASE_URL}/anime.php?q={quote(query)}&cat=anime"
         html = await self._fetch(url, query ,self.ANIME)
         start = '<table border="0" cellpadding="0" cellspacing="0" width="100%">'
@@ -229,14 +627,18 @@ class MalScraper:
         # spliting and getting table contents remove useless codes
         anime_lists = "".join(html.split(start)[1].split(end, 9)[1:-1])
         # ((anime name, anime url)) tuple
-        allanime = parse_anime_search(anime_lists)
+        allanime = await self._parse(parse_anime_search, anime_lists)
         animeNames = tuple((x[0] for x in allanime))
 
         matched = get_close_match(query, animeNames)
         # if match rate > 50 return matched anime else first anime from list
         index = matched[2] if matched[1] > 60 else 0
         url = allanime[index][1]
-        return await self.get_anime(get_id(url).strip())
+        anime_id = get_id(url).strip()
+        anime = await self.get_anime(anime_id, fields)
+        if self.use_cache:
+            await self.cache.put("search", _search_key("anime", normalize_title(query)), anime_id)
+        return anime
 
 
 
@@ -251,6 +653,13 @@ class MalScraper:
         Returns:
             Character: A Character object with The Character Details.
         """
+        return await self.flights.run(("search", "character", query), partial(self._search_character, query))
+
+
+    async def _search_character(self, query: str)-> Character:
+        cached_id = await self._resolved_search("character", query)
+        if cached_id:
+            return await self.get_character(cached_id)
 
         url = f"{self.BASE_URL}/character.php?q={query}&cat=character"
         html = await self._fetch(url, query ,self.CHARACTER)
@@ -259,31 +668,38 @@ class MalScraper:
         # getting all the Character row from table of search results
         table = html.split(start)[1].split(end)[0].split('width="175">', 8)
         chars = tuple((parse_character_search(x) for x in table))
-        names = tuple((normalize(x[0]) for x in chars))
+        names = tuple((x[0] for x in chars))
 
         # if match rate higher than 50 return match else first char
         matched = get_close_match(query, names)
         index = matched[2] if matched[1] > 50 else 0
         url = chars[index][1]
-        return await self.get_character(get_id(url))
+        character_id = get_id(url)
+        character = await self.get_character(character_id)
+        if self.use_cache:
+            await self.cache.put("search", _search_key("character", normalize_title(query)), character_id)
+        return character
 
 
 
-    async def search_batch_anime(self, anime_names: List)-> List[Anime]:
+    async def search_batch_anime(self, anime_names: List, fields: Optional[Iterable[str]] = None)-> List[Anime]:
         """
         Fetches multiple anime in batch.
 
         Args:
             anime_names (List): List of anime names.
+            fields (Optional[Iterable[str]]): Only parse these `Anime` fields. (see `get_anime`)
 
         Returns:
             List[Anime]: Returns a list of Anime class object with anime details.
 
         """
 
-        tasks = [asyncio.create_task(self.search_anime(name)) for name in anime_names]
-        animes = await asyncio.gather(*tasks)
-        return [anime for anime in animes]
+        # a repeated name is searched once
+        names = list(dict.fromkeys(anime_names))
+        tasks = [asyncio.create_task(self.search_anime(name, fields)) for name in names]
+        animes = dict(zip(names, await asyncio.gather(*tasks)))
+        return [animes[name] for name in anime_names]
 
     
     async def search_batch_character(self, character_names: List)-> List[Character]:
@@ -298,9 +714,10 @@ class MalScraper:
 
         """
 
-        tasks = [asyncio.create_task(self.search_character(name)) for name in character_names]
-        characters = await asyncio.gather(*tasks)
-        return [anime for anime in characters]
+        names = list(dict.fromkeys(character_names))
+        tasks = [asyncio.create_task(self.search_character(name)) for name in names]
+        characters = dict(zip(names, await asyncio.gather(*tasks)))
+        return [characters[name] for name in character_names]
 
     async def top_anime(self, top_type: str | None = None)-> List[Dict[str, str]]:
         """
@@ -310,6 +727,10 @@ class MalScraper:
             Dict: Returns a Dictionary with anime name, img, url 
         """
 
+        return await self.flights.run(("top", top_type), partial(self._top_anime, top_type))
+
+
+    async def _top_anime(self, top_type: str | None)-> List[Dict[str, str]]:
         url = 'https://myanimelist.net/topanime.php'
 
         if top_type:
@@ -317,7 +738,7 @@ class MalScraper:
 
         html = await self._fetch(url, "topanime.php")
 
-        return parse_top_anime(html)
+        return await self._parse(parse_top_anime, html)
 
         
 
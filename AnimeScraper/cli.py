@@ -3,6 +3,8 @@ import click
 import asyncio
 from uvicorn import run as start_server
 from . import KunYu 
+from ._archive import reparse as reparse_pages
+from ._cache_transfer import export_cache, import_cache
 from .exceptions import AnimeNotFoundError, CharacterNotFoundError
 
 
@@ -159,7 +161,11 @@ def search_character(character_name: str):
 @click.option("--port", default=None, help="Port for the API server (overrides config.json)")
 @click.option("--use-cache", is_flag=True, help="Enable database caching (overrides config.json)")
 @click.option("--db-path", default=None, help="Path for the local SQLite cache database (overrides config.json)")
-def server(host: str, port: int, use_cache: bool, db_path: str):
+@click.option("--search-ttl", default=None, type=float, help="Seconds a cached search keeps resolving to the same id (overrides config.json)")
+@click.option("--archive-pages", is_flag=True, help="Keep the fetched pages in the cache for `reparse` (overrides config.json)")
+@click.option("--workers", default=None, type=int, help="Server processes sharing the cache, more than 1 turns off auto-reload (overrides config.json)")
+@click.option("--memory-cache", default=None, type=int, help="Anime/characters each worker keeps in memory in front of the cache (overrides config.json)")
+def server(host: str, port: int, use_cache: bool, db_path: str, search_ttl: float, archive_pages: bool, workers: int, memory_cache: int):
     """Start the FastAPI server for AnimeScraper."""
     
     # Load from config file and merge with CLI args
@@ -170,15 +176,68 @@ def server(host: str, port: int, use_cache: bool, db_path: str):
     final_port = port if port else config.get("port", 8000)
     final_use_cache = use_cache if use_cache else config.get("use_cache", False)
     final_db_path = db_path if db_path else config.get("db_path", "cache.db")
+    final_search_ttl = search_ttl if search_ttl is not None else config.get("search_ttl", 7 * 24 * 60 * 60)
+    final_archive_pages = archive_pages if archive_pages else config.get("archive_pages", False)
+    final_workers = workers if workers else config.get("workers", 1)
+    final_memory_cache = memory_cache if memory_cache is not None else config.get("memory_cache", 0)
 
     click.echo(f"🚀 Starting server on http://{final_host}:{final_port}")
     click.echo(f"📁 Database Path: {final_db_path} | 📦 Use Cache: {final_use_cache}")
     # Pass the user arguments to the server through environment variables
     os.environ["ANIME_SCRAPER_USE_CACHE"] = str(final_use_cache)
     os.environ["ANIME_SCRAPER_DB_PATH"] = final_db_path
+    os.environ["ANIME_SCRAPER_SEARCH_TTL"] = str(final_search_ttl)
+    os.environ["ANIME_SCRAPER_ARCHIVE_PAGES"] = str(final_archive_pages)
+    # several workers share the cache, their writers take turns on a lock file
+    os.environ["ANIME_SCRAPER_PROCESS_LOCK"] = str(int(final_workers) > 1)
+    os.environ["ANIME_SCRAPER_MEMORY_CACHE_ENTRIES"] = str(final_memory_cache)
 
-    # Run the FastAPI server
-    start_server("AnimeScraper.animescraper_server:app", host=final_host, port=int(final_port), reload=True)
+    # Run the FastAPI server, uvicorn can only reload a single process
+    if int(final_workers) > 1:
+        start_server("AnimeScraper.animescraper_server:app", host=final_host, port=int(final_port), workers=int(final_workers))
+    else:
+        start_server("AnimeScraper.animescraper_server:app", host=final_host, port=int(final_port), reload=True)
+
+
+
+@click.command()
+@click.option("--db-path", default=None, help="Path of the SQLite cache database (overrides config.json)")
+@click.option("--workers", default=None, type=int, help="Number of parse processes, one per core by default")
+def reparse(db_path: str, workers: int):
+    """Rebuild the cached anime and characters from the archived pages."""
+    final_db_path = db_path if db_path else load_config().get("db_path", "cache.db")
+    click.echo(f"📁 Re-parsing the pages archived in {final_db_path}")
+    counts = reparse_pages(final_db_path, workers)
+    click.echo(f"{S}Anime{E}: {VA}{counts['anime']}{E}")
+    click.echo(f"{S}Characters{E}: {VA}{counts['character']}{E}")
+    click.echo(f"{S}Failed{E}: {VA}{counts['failed']}{E}")
+
+
+@click.command(name="export")
+@click.argument("path")
+@click.option("--db-path", default=None, help="Path of the SQLite cache database (overrides config.json)")
+def export(path: str, db_path: str):
+    """Export the cached anime and characters to a gzipped JSON lines file."""
+    final_db_path = db_path if db_path else load_config().get("db_path", "cache.db")
+    click.echo(f"📁 Exporting {final_db_path} to {path}")
+    counts = export_cache(final_db_path, path)
+    click.echo(f"{S}Anime{E}: {VA}{counts['anime']}{E}")
+    click.echo(f"{S}Characters{E}: {VA}{counts['character']}{E}")
+    click.echo(f"{S}Skipped{E}: {VA}{counts['skipped']}{E}")
+
+
+@click.command(name="import")
+@click.argument("path")
+@click.option("--db-path", default=None, help="Path of the SQLite cache database (overrides config.json)")
+@click.option("--chunk-size", default=1000, type=int, help="Rows written per transaction")
+def import_(path: str, db_path: str, chunk_size: int):
+    """Load a file written by `export` into the cache."""
+    final_db_path = db_path if db_path else load_config().get("db_path", "cache.db")
+    click.echo(f"📁 Importing {path} into {final_db_path}")
+    counts = import_cache(final_db_path, path, chunk_size)
+    click.echo(f"{S}Anime{E}: {VA}{counts['anime']}{E}")
+    click.echo(f"{S}Characters{E}: {VA}{counts['character']}{E}")
+    click.echo(f"{S}Skipped{E}: {VA}{counts['skipped']}{E}")
 
         
 # Add all commands to the CLI
@@ -187,6 +246,9 @@ cli.add_command(search_character)
 cli.add_command(get_anime)
 cli.add_command(get_character)
 cli.add_command(server)
+cli.add_command(reparse)
+cli.add_command(export)
+cli.add_command(import_)
 
 if __name__ == '__main__':
     cli()
@@ -1,10 +1,12 @@
 # SyncMalScraper is the Synchronous version of AnimeScraper
 
 import httpx
-from typing import Optional, List, Dict
+from typing import Any, FrozenSet, Iterable, Optional, List, Dict, Tuple
 from urllib.parse import quote 
-from concurrent.futures import ThreadPoolExecutor
-import sqlite3
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+import threading
+import time
 
 
 from .exceptions import (
@@ -12,18 +14,35 @@ from .exceptions import (
     CharacterNotFoundError, 
     NetworkError
 )
-from ._cache_utils import _start_database, _from_cache, _store_cache
+from ._cache_utils import (
+    SEARCH_TTL,
+    CacheLimit,
+    CacheTTL,
+    Row,
+    _expired,
+    _compression_format,
+    _covers,
+    _fields_key,
+)
+from ._cache_query import AnimeQuery
+from ._cache_backend import CacheBackend, SQLiteBackend, _search_key
+from ._cache_writer import _synchronous_pragma
+from ._archive import _page_key
 from ._parse_anime_data import (
     _parse_anime_data,
+    anime_fields,
     parse_anime_search, 
     parse_the_character,
     parse_character_search,
     get_id,
     get_close_match,
-    normalize,
     parse_top_anime
 )
 
+from ._lazy_anime import LazyAnime
+from ._memory_cache import LRUCache
+from ._single_flight import SingleFlight
+from ._search_index import TitleIndex, normalize_title
 from ._model import Anime, Character
 
 
@@ -38,14 +57,61 @@ class SyncMalScraper():
         client: Optional[httpx.Client],
         use_cache: bool,
         db_path: str,
-        timeout: int
+        timeout: int,
+        local_search: bool = False,
+        local_search_score: float = 90,
+        search_ttl: Optional[float] = SEARCH_TTL,
+        cache_batch_size: int = 100,
+        cache_flush_interval: float = 0.05,
+        cache_synchronous: Optional[str] = None,
+        cache_ttl: Optional[CacheTTL] = None,
+        stale_while_revalidate: bool = False,
+        memory_cache_entries: Optional[int] = None,
+        memory_cache_bytes: Optional[int] = None,
+        cache_compression: Optional[str] = None,
+        archive_pages: bool = False,
+        cache_limit: Optional[CacheLimit] = None,
+        cache_backend: Optional[CacheBackend] = None,
+        cache_process_lock: bool = False,
         ) -> None:
+        _synchronous_pragma(cache_synchronous)
+        _compression_format(cache_compression)
         self.client = client
         self.own_client = client is None
-        self.use_cache = use_cache
+        self.use_cache = use_cache or cache_backend is not None
         self.db_path = db_path
-        self.db: sqlite3.Connection | None = None
         self.timeout = timeout
+        self.local_search = local_search
+        self.local_search_score = local_search_score
+        self.search_index: TitleIndex | None = None
+        self.search_ttl = search_ttl
+        self.cache_batch_size = cache_batch_size
+        self.cache_flush_interval = cache_flush_interval
+        self.cache_synchronous = cache_synchronous
+        self.cache_compression = cache_compression
+        self.archive_pages = archive_pages
+        self.cache_limit = cache_limit
+        # None keeps the cache in SQLite at `db_path`, written with the cache_* options
+        self.cache: CacheBackend = cache_backend or SQLiteBackend(
+            db_path, cache_batch_size, cache_flush_interval, cache_synchronous, cache_compression, cache_limit,
+            cache_process_lock
+        )
+        if archive_pages and not hasattr(self.cache, "store_page"):
+            raise ValueError("archive_pages needs a cache backend that archives pages (SQLite)")
+        # response headers of fetched pages that are about to be archived, by url
+        self._headers: Dict[str, Dict[str, str]] = {}
+        self.cache_ttl = cache_ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        # built objects in front of the cache, kept across `with` blocks
+        self.memory: LRUCache | None = None
+        if memory_cache_entries is not None or memory_cache_bytes is not None:
+            self.memory = LRUCache(memory_cache_entries, memory_cache_bytes)
+        self._refresher: ThreadPoolExecutor | None = None
+        self._refreshes: Dict[Tuple[str, str], Future] = {}
+        self._refreshes_lock = threading.Lock()
+        # concurrent identical fetches, searches and top lists (from several threads) share one request
+        self.flights = SingleFlight()
+
 
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
@@ -55,24 +121,62 @@ class SyncMalScraper():
         "Upgrade-Insecure-Requests": "1"
     }
 
+    # pooled keep-alive connections to MAL, like `MalScraper`
+    CONNECTION_LIMIT = 10
+    KEEPALIVE_TIMEOUT = 30
+
     def __enter__(self):
 
         if not self.client:
-            self.client = httpx.Client(headers=self.headers)
+            self.client = self._new_client()
 
         if self.use_cache:
-            _start_database(self.db_path)
-            self.db = sqlite3.connect(self.db_path)
+            self.cache.open()
+            if self.local_search and self.search_index is None:
+                # built once, then kept up to date by get_anime
+                self._build_search_index()
         return self
 
 
+    def _build_search_index(self)-> None:
+        """Builds the title index from the cached anime, it replaces the current one once complete."""
+        index = TitleIndex()
+        for anime_id, data in self.cache.items("anime"):
+            index.add_row(anime_id, data)
+        self.search_index = index
+
+
+    def _cache_rewritten(self)-> None:
+        """
+        Catches up with cached rows rewritten in the database (reparse, import): the objects
+        built from the old rows are dropped and the title index is built again from the new ones.
+        """
+        if self.memory is not None:
+            self.memory.clear()
+        if self.use_cache and self.local_search:
+            self._build_search_index()
+
+
+    def _new_client(self)-> httpx.Client:
+        """A client with the MAL headers over a keep-alive connection pool."""
+        limits = httpx.Limits(
+            max_connections=self.CONNECTION_LIMIT,
+            max_keepalive_connections=self.CONNECTION_LIMIT,
+            keepalive_expiry=self.KEEPALIVE_TIMEOUT,
+        )
+        return httpx.Client(headers=self.headers, limits=limits)
+
+
     def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._refresher:
+            self._refresher.shutdown(wait=True)
+            self._refresher = None
         if self.client and self.own_client:
             self.client.close()
             self.client = None
 
-        if self.db:
-            self.db.close()
+        if self.use_cache:
+            self.cache.close()
 
 
     def _fetch(self, url: str, query: str, req: int | None = None)-> str:
@@ -85,41 +189,210 @@ class SyncMalScraper():
                 raise AnimeNotFoundError(query)
             elif response.status_code == 404 and self.CHARACTER == req:
                 raise CharacterNotFoundError(query)
+            if self.archive_pages and _page_key(url):
+                self._headers[url] = dict(response.headers)
             return response.text
 
         except httpx.NetworkError as e:
             raise NetworkError(f"A NetworkError error occurred {e}")
 
 
-    def get_anime(self, anime_id: str)->Anime:
+    def get_anime(self, anime_id: str, fields: Optional[Iterable[str]] = None, lazy: bool = False)->Anime:
         """
         Fetch and parse anime details.
 
         Args:
             anime_id (str): The MyAnimeList ID of the anime.
+            fields (Optional[Iterable[str]]): Only parse these `Anime` fields, the others are None.
+                None parses everything.
+            lazy (bool): Return a `LazyAnime` that parses each section when it is first read.
+                Lazy results are not written to the cache.
 
         Returns:
             Anime: An object containing detailed anime information.
         """
+        if lazy and fields is not None:
+            raise ValueError("Pass either `fields` or `lazy`, not both")
+        wanted = anime_fields(fields) if fields is not None else None
+        cached = None
         if self.use_cache:
-            cached_data = _from_cache(self.db, "anime", anime_id)
-            if cached_data:
-                return Anime.from_json(cached_data)
-
+            cached = self._memory_row("anime", anime_id) or self.cache.get("anime", anime_id)
+        return self._anime_from_row(anime_id, wanted, lazy, cached)
+
+
+    def _anime_from_row(
+        self,
+        anime_id: str,
+        wanted: Optional[FrozenSet[str]],
+        lazy: bool,
+        cached: Optional[Row]
+    )-> Anime:
+        """Returns the anime from its cached row if it has the `wanted` fields, otherwise fetches it."""
+        anime = self._from_row("anime", anime_id, cached, wanted)
+        if anime:
+            return anime
+        if cached and wanted is not None:
+            # keep the fields the cached row already had, an expired full row is fetched in full
+            wanted = None if cached[1] is None else wanted | set(cached[1].split(","))
+        return self.flights.run(("anime", anime_id, wanted, lazy), partial(self._fetch_anime, anime_id, wanted, lazy))
+
+
+    def _fetch_anime(self, anime_id: str, wanted: Optional[FrozenSet[str]], lazy: bool)-> Anime:
         url = f"{self.BASE_URL}/anime/{anime_id}"
 
         html = self._fetch(url, anime_id,self.ANIME)
-        anime =  _parse_anime_data(html)
+        self._archive(url, html)
+        if lazy:
+            return LazyAnime(html)
+        anime =  _parse_anime_data(html, wanted)
         if self.use_cache:
-            _store_cache(self.db, "anime", anime_id, anime.model_dump_json())
+            data = anime.model_dump_bytes()
+            self.cache.put("anime", anime_id, data, wanted)
+            self._remember("anime", anime_id, anime, _fields_key(wanted), time.time(), len(data))
+            if self.search_index is not None:
+                self.search_index.add_anime(anime_id, anime)
         return anime
 
 
-    def get_batch_anime(self, anime_ids: List[str])-> List[Anime]:
-        """Fetches multiple anime from a list of anime id"""
+    def _memory_row(self, table: str, key: str)-> Optional[Row]:
+        """The (object, fields, fetched_at) row of the memory cache."""
+        return self.memory.get((table, key)) if self.memory is not None else None
+
+
+    def _archive(self, url: str, html: str)-> None:
+        headers = self._headers.pop(url, None)
+        if self.use_cache and self.archive_pages:
+            self.cache.store_page(url, html, headers)
+
+
+    def _remember(self, table: str, key: str, cached: Any, fields: Optional[str], fetched_at: Optional[float], size: int)-> None:
+        if self.memory is not None:
+            self.memory.put((table, key), (cached, fields, fetched_at), size)
+
+
+    def query_cached(self, query: AnimeQuery)-> List[Anime]:
+        """
+        The cached anime matching `query`, filtered and sorted by the SQLite side tables so
+        only the matches are decoded. Nothing is fetched, expired anime are returned too.
+        """
+        if not self.use_cache:
+            raise ValueError("query_cached needs use_cache=True")
+        if not hasattr(self.cache, "query"):
+            raise ValueError("query_cached needs a cache backend that can be queried (SQLite)")
+        found = []
+        for key, row in self.cache.query(query):
+            try:
+                found.append(self._built("anime", key, self._memory_row("anime", key) or row))
+            except ValueError:
+                continue # a row that can't be decoded, see `_from_row`
+        return found
+
+
+    def _sqlite_cache(self, action: str)-> SQLiteBackend:
+        """
+        The SQLite backend of the cache for `action` (reparse, export, ...), which works on its database
+        file directly. The pending writes are flushed first, so `action` sees them and they can't be
+        written over its rows later. Other backends raise ValueError.
+        """
+        backend = self.cache
+        if not isinstance(backend, SQLiteBackend):
+            raise ValueError(f"{action} needs the SQLite cache backend, not {type(backend).__name__}")
+        if backend.writer is not None:
+            backend.writer.flush()
+        return backend
+
+
+    def cache_stats(self)-> Dict[str, int]:
+        """
+        Counters of the memory cache (entries, bytes, hits, misses, evictions) and of the
+        cache backend prefixed with "cache_" (cache_hits, cache_misses, cache_puts, ...).
+        The SQLite backend adds its flushes and evicted rows (cache_evictions).
+        """
+        stats = self.memory.stats() if self.memory is not None else {}
+        if self.use_cache:
+            stats.update((f"cache_{name}", count) for name, count in self.cache.stats().items())
+        return stats
+
+
+    def _built(self, table: str, key: str, row: Row)-> Any:
+        """The `Anime` or `Character` of a cached row, decoded rows are kept in the memory cache."""
+        if isinstance(row[0], bytes):
+            cached = (Anime if table == "anime" else Character).from_bytes(row[0])
+            self._remember(table, key, cached, row[1], row[2], len(row[0]))
+        elif isinstance(row[0], str):
+            # rows cached as json before the binary format
+            cached = (Anime if table == "anime" else Character).from_json(row[0])
+            self._remember(table, key, cached, row[1], row[2], len(row[0]))
+        else:
+            # a row of the memory cache holds the built object
+            cached = row[0]
+        return cached
+
+
+    def _from_row(self, table: str, key: str, row: Optional[Row], wanted: Optional[FrozenSet[str]] = None)-> Any:
+        """
+        The `Anime` or `Character` of a cached row that has the `wanted` fields and hasn't expired, else None.
+        With `stale_while_revalidate` an expired one is returned too and refreshed in the background.
+        """
+        if not row or not _covers(row[1], wanted):
+            return None
+        try:
+            cached = self._built(table, key, row)
+        except ValueError:
+            # written by an older binary format (or damaged), fetched again like a miss
+            return None
+        if self.cache_ttl is None or not _expired(row[2], self.cache_ttl.seconds(table, cached)):
+            self.cache.touch(table, key)
+            return cached
+        if self.stale_while_revalidate:
+            self._revalidate(table, key, row)
+            self.cache.touch(table, key)
+            return cached
+        return None
+
+
+    def _revalidate(self, table: str, key: str, row: Row)-> None:
+        """Fetches an expired row again on a background thread, once per row at a time."""
+        with self._refreshes_lock:
+            if (table, key) in self._refreshes:
+                return
+            if self._refresher is None:
+                self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="animescraper-refresh")
+            if table == "anime":
+                fields = None if row[1] is None else frozenset(row[1].split(","))
+                future = self._refresher.submit(self._anime_from_row, key, fields, False, None)
+            else:
+                future = self._refresher.submit(self._character_from_row, key, None)
+            self._refreshes[(table, key)] = future
+        # a failed refresh keeps the expired row, the next read tries again
+        future.add_done_callback(lambda _: self._refreshes.pop((table, key), None))
+
+
+    def _cached_rows(self, table: str, keys: List[str])-> Dict[str, Row]:
+        """The cached rows of `keys` (pending writes included), looked up with a few `IN` queries."""
+        if not self.use_cache:
+            return {}
+        rows = {key: row for key in keys if (row := self._memory_row(table, key))}
+        rows.update(self.cache.get_many(table, (key for key in keys if key not in rows)))
+        return rows
+
+
+    def get_batch_anime(self, anime_ids: List[str], fields: Optional[Iterable[str]] = None, lazy: bool = False)-> List[Anime]:
+        """
+        Fetches multiple anime from a list of anime id. Cached anime are read with a few
+        bulk queries, only the rest are fetched. A repeated id is fetched once.
+        """
+        if lazy and fields is not None:
+            raise ValueError("Pass either `fields` or `lazy`, not both")
+        wanted = anime_fields(fields) if fields is not None else None
+        rows = self._cached_rows("anime", anime_ids)
+        anime = {key: hit for key, row in rows.items() if (hit := self._from_row("anime", key, row, wanted))}
+
+        misses = [key for key in dict.fromkeys(anime_ids) if key not in anime]
         with ThreadPoolExecutor(max_workers=4) as threat:
-            results = threat.map(self.get_anime, anime_ids)
-        return [anime for anime in results]
+            results = threat.map(lambda anime_id: self._anime_from_row(anime_id, wanted, lazy, rows.get(anime_id)), misses)
+            anime.update(zip(misses, results))
+        return [anime[key] for key in anime_ids]
 
 
 
@@ -133,30 +406,72 @@ class SyncMalScraper():
         Returns:
             Character: An object containing detailed character information.
         """
-        
+        cached = None
         if self.use_cache:
-            cached_data = _from_cache(self.db, "character", character_id)
-            if cached_data:
-                return Character.from_json(cached_data)
+            cached = self._memory_row("character", character_id) or self.cache.get("character", character_id)
+        return self._character_from_row(character_id, cached)
 
+
+    def _character_from_row(self, character_id: str, cached: Optional[Row])-> Character:
+        """Returns the character from its cached row, fetches it if there is none (or it expired)."""
+        character = self._from_row("character", character_id, cached)
+        if character:
+            return character
+        return self.flights.run(("character", character_id), partial(self._fetch_character, character_id))
+
+
+    def _fetch_character(self, character_id: str)-> Character:
         url = f"{self.BASE_URL}/character/{character_id}"
         html = self._fetch(url, character_id, self.CHARACTER)
+        self._archive(url, html)
         character = parse_the_character(html)
         if self.use_cache:
-            _store_cache(self.db, "character", character_id, character.model_dump_json())
+            data = character.model_dump_bytes()
+            self.cache.put("character", character_id, data)
+            self._remember("character", character_id, character, None, time.time(), len(data))
            
         return character
 
 
     def get_batch_character(self, character_ids: List[str])-> List[Character]:
-        """Fetches multiple character from a list of character id"""
+        """
+        Fetches multiple character from a list of character id. Cached characters are read
+        with a few bulk queries, only the rest are fetched. A repeated id is fetched once.
+        """
+        rows = self._cached_rows("character", character_ids)
+        characters = {key: hit for key, row in rows.items() if (hit := self._from_row("character", key, row))}
+
+        misses = [key for key in dict.fromkeys(character_ids) if key not in characters]
         with ThreadPoolExecutor(max_workers=4) as threat:
-            results = threat.map(self.get_character, character_ids)
-        return [character for character in results]
+            characters.update(zip(misses, threat.map(lambda key: self._character_from_row(key, None), misses)))
+        return [characters[key] for key in character_ids]
+
 
 
+    def _resolved_search(self, kind: str, query: str)-> str | None:
+        """The cached id a search for `query` resolved to, if it hasn't expired."""
+        if not self.use_cache:
+            return None
+        row = self.cache.get("search", _search_key(kind, normalize_title(query)))
+        if row and not _expired(row[2], self.search_ttl):
+            return row[0]
+        return None
 
-    def search_anime(self, query: str)-> Anime:
+
+    def search_anime(self, query: str, fields: Optional[Iterable[str]] = None)-> Anime:
+        wanted = frozenset(fields) if fields is not None else None
+        return self.flights.run(("search", "anime", query, wanted), partial(self._search_anime, query, fields))
+
+
+    def _search_anime(self, query: str, fields: Optional[Iterable[str]])-> Anime:
+        cached_id = self._resolved_search("anime", query)
+        if cached_id:
+            return self.get_anime(cached_id, fields)
+
+        if self.search_index is not None:
+            anime_id = self.search_index.match(query, self.local_search_score)
+            if anime_id:
+                return self.get_anime(anime_id, fields)
 
         url = f"{self.BASE_URL}/anime.php?q={quote(query)}&cat=anime"
         html = self._fetch(url, query,self.ANIME)
@@ -173,7 +488,11 @@ class SyncMalScraper():
         # if match rate > 50 return matched anime else first anime from list
         index = matched[2] if matched[1] > 50 else 0
         url = allanime[index][1]
-        return self.get_anime(get_id(url))
+        anime_id = get_id(url)
+        anime = self.get_anime(anime_id, fields)
+        if self.use_cache:
+            self.cache.put("search", _search_key("anime", normalize_title(query)), anime_id)
+        return anime
 
 
 
@@ -187,6 +506,13 @@ class SyncMalScraper():
         Returns:
             Character: A Character object with The Character Details.
         """
+        return self.flights.run(("search", "character", query), partial(self._search_character, query))
+
+
+    def _search_character(self, query: str)-> Character:
+        cached_id = self._resolved_search("character", query)
+        if cached_id:
+            return self.get_character(cached_id)
 
         url = f"{self.BASE_URL}/character.php?q={query}&cat=character"
         html = self._fetch(url, query,self.CHARACTER)
@@ -197,28 +523,33 @@ class SyncMalScraper():
         table = html.split(start)[1].split(end)[0].split('width="175">', 8)
         chars = tuple((parse_character_search(x) for x in table))
 
-        names = tuple((normalize(x[0]) for x in chars))
+        names = tuple((x[0] for x in chars))
 
         # if match rate higher than 50 return match else first char
         matched = get_close_match(query, names)
         index = matched[2] if matched[1] > 50 else 0
         
         url = chars[index][1]
-
-        return self.get_character(get_id(url))
+        character_id = get_id(url)
+        character = self.get_character(character_id)
+        if self.use_cache:
+            self.cache.put("search", _search_key("character", normalize_title(query)), character_id)
+        return character
 
 
 
-    def search_batch_anime(self, anime_names: List[str])-> List[Anime]:
+    def search_batch_anime(self, anime_names: List[str], fields: Optional[Iterable[str]] = None)-> List[Anime]:
+        # a repeated name is searched once
+        names = list(dict.fromkeys(anime_names))
         with ThreadPoolExecutor(max_workers=4) as threat:
-            results = threat.map(self.search_anime, anime_names)
-            return [result for result in results]
+            results = dict(zip(names, threat.map(lambda name: self.search_anime(name, fields), names)))
+        return [results[name] for name in anime_names]
 
 
     def search_batch_character(self, characters_name: List[str])-> List[Character]:
 
-        characters_lists = [self.search_character(name) for name in characters_name]
-        return characters_lists
+        characters = {name: self.search_character(name) for name in dict.fromkeys(characters_name)}
+        return [characters[name] for name in characters_name]
 
     
     def top_anime(self, top_type: str | None)-> List[Dict[str, str]]:
@@ -228,6 +559,10 @@ class SyncMalScraper():
         Returns:
             Dict: Returns a Dictionary with anime name, img, url
         """
+        return self.flights.run(("top", top_type), partial(self._top_anime, top_type))
+
+
+    def _top_anime(self, top_type: str | None)-> List[Dict[str, str]]:
         url = 'https://myanimelist.net/topanime.php'
 
         if top_type:
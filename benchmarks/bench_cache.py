@@ -0,0 +1,145 @@
+"""
+Offline benchmark of the cache backends: SQLiteBackend, MemoryBackend and
+FileBackend, each in a fresh temporary directory.
+
+The anime pages of the corpus (``benchmarks/corpus`` by default) are parsed
+once and their ``model_dump_bytes`` payloads are cached under ``--rows``
+ids, then every operation is timed over all of them:
+
+    put          one ``put`` per row, the SQLite writer flushed at the end
+    put_many     the rows again in chunks of ``--chunk``
+    get          one ``get`` per row, in random order
+    get_many     ``get_many`` of ``--chunk`` random ids at a time
+    items        every row, as the title index reads them
+
+Usage:
+    python -m benchmarks.bench_cache
+    python -m benchmarks.bench_cache --backend file --compression zdict --output after.json --compare before.json
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from AnimeScraper import __version__
+from AnimeScraper._cache_backend import FileBackend, MemoryBackend, SQLiteBackend
+from AnimeScraper._parse_anime_data import _parse_anime_data
+from benchmarks.bench_parsers import DEFAULT_CORPUS
+
+BACKENDS: Dict[str, Callable[[Path, str], object]] = {
+    "sqlite": lambda root, compression: SQLiteBackend(str(root / "cache.db"), compression=compression),
+    "memory": lambda root, compression: MemoryBackend(),
+    "file": lambda root, compression: FileBackend(str(root / "files"), compression=compression),
+}
+
+
+def payloads(corpus: Path) -> List[bytes]:
+    found = [_parse_anime_data(page.read_text(encoding="utf-8")).model_dump_bytes()
+             for page in sorted(corpus.glob("anime_*.html")) if not page.name.startswith("anime_search")]
+    if not found:
+        raise SystemExit(f"No anime pages in {corpus}")
+    return found
+
+
+def timed(func: Callable[[], object], rows: int) -> Dict[str, float]:
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    return {"rows": rows, "seconds": seconds, "rows_per_sec": rows / seconds}
+
+
+def run_backend(name: str, data: List[bytes], rows: int, chunk: int, compression) -> Dict[str, Dict]:
+    keys = [str(i) for i in range(rows)]
+    shuffled = random.Random(0).sample(keys, len(keys))
+    chunks = [shuffled[i:i + chunk] for i in range(0, rows, chunk)]
+    rows_of = lambda batch: [(key, data[int(key) % len(data)], None) for key in batch]
+
+    with tempfile.TemporaryDirectory() as root:
+        backend = BACKENDS[name](Path(root), compression)
+        backend.open()
+        try:
+            def put():
+                for key in keys:
+                    backend.put("anime", key, data[int(key) % len(data)])
+                if name == "sqlite":
+                    backend.writer.flush()
+
+            def put_many():
+                for batch in chunks:
+                    backend.put_many("anime", rows_of(batch))
+                if name == "sqlite":
+                    backend.writer.flush()
+
+            return {
+                "put": timed(put, rows),
+                "put_many": timed(put_many, rows),
+                "get": timed(lambda: [backend.get("anime", key) for key in shuffled], rows),
+                "get_many": timed(lambda: [backend.get_many("anime", batch) for batch in chunks], rows),
+                "items": timed(lambda: list(backend.items("anime")), rows),
+            }
+        finally:
+            backend.close()
+
+
+def run(corpus: Path, backends: List[str], rows: int, chunk: int, compression) -> Dict:
+    data = payloads(corpus)
+    results: Dict[str, Dict] = {}
+    for name in backends:
+        for operation, result in run_backend(name, data, rows, chunk, compression).items():
+            key = f"{name}/{operation}"
+            results[key] = result
+            print(f"{key:<20} {result['seconds'] * 1000:9.1f} ms  {result['rows_per_sec']:12.0f} rows/s")
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "animescraper": __version__,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "corpus": str(corpus),
+            "rows": rows,
+            "chunk": chunk,
+            "compression": compression,
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict) -> None:
+    """Prints the throughput change of every operation found in both runs."""
+    print(f"\n{'benchmark':<20} {'rows/s before':>14} {'rows/s after':>13} {'speedup':>8}")
+    for key, result in current["results"].items():
+        before = baseline["results"].get(key)
+        if before:
+            print(f"{key:<20} {before['rows_per_sec']:14.0f} {result['rows_per_sec']:13.0f} "
+                  f"{result['rows_per_sec'] / before['rows_per_sec']:7.2f}x")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS, help="directory of saved pages")
+    parser.add_argument("--backend", default="all", choices=[*BACKENDS, "all"])
+    parser.add_argument("--rows", type=int, default=5000, help="rows cached per backend")
+    parser.add_argument("--chunk", type=int, default=100, help="rows per put_many/get_many call")
+    parser.add_argument("--compression", choices=["zlib", "zdict"], help="compression of the sqlite and file rows")
+    parser.add_argument("--output", type=Path, default=Path("bench_cache.json"), help="where to save the JSON results")
+    parser.add_argument("--compare", type=Path, help="a previous JSON result to compare against")
+    args = parser.parse_args(argv)
+
+    backends = list(BACKENDS) if args.backend == "all" else [args.backend]
+    report = run(args.corpus, backends, args.rows, args.chunk, args.compression)
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"\nSaved results to {args.output}")
+
+    if args.compare:
+        compare(report, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Offline benchmark of the model codecs: ``model_dump_json``/``from_json``
+against ``model_dump_bytes``/``from_bytes``.
+
+Every anime and character page of the corpus (``benchmarks/corpus`` by
+default) is parsed once, then each codec encodes and decodes the model:
+
+    anime_*.html             Anime (full and a 3 field projection)
+    character_*.html         Character
+
+Usage:
+    python -m benchmarks.bench_codec
+    python -m benchmarks.bench_codec --output after.json --compare before.json
+"""
+import argparse
+import json
+import platform
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from AnimeScraper import __version__
+from AnimeScraper._model import CODEC_VERSION, Anime, Character
+from AnimeScraper._parse_anime_data import _parse_anime_data, parse_the_character
+from benchmarks.bench_parsers import DEFAULT_CORPUS, bench, compare
+
+# (name, encode, decode) of each codec
+CODECS: List[Tuple[str, Callable, Callable]] = [
+    ("json", lambda model: model.model_dump_json(), lambda cls, data: cls.from_json(data)),
+    ("bytes", lambda model: model.model_dump_bytes(), lambda cls, data: cls.from_bytes(data)),
+]
+
+
+def models(corpus: Path) -> List[Tuple[str, type, object]]:
+    """The (name, class, parsed model) of every anime and character page of the corpus."""
+    found = []
+    for page in sorted(corpus.glob("*.html")):
+        html = page.read_text(encoding="utf-8")
+        if page.name.startswith("anime_") and not page.name.startswith("anime_search"):
+            found.append((page.name, Anime, _parse_anime_data(html)))
+            found.append((f"{page.name}[title,stats,genres]", Anime, _parse_anime_data(html, fields=["title", "stats", "genres"])))
+        elif page.name.startswith("character_") and not page.name.startswith("character_search"):
+            found.append((page.name, Character, parse_the_character(html)))
+    return found
+
+
+def run(corpus: Path, repeat: int, warmup: int) -> Dict:
+    pages = models(corpus)
+    if not pages:
+        raise SystemExit(f"No anime or character pages in {corpus}")
+
+    results: Dict[str, Dict] = {}
+    for page, cls, model in pages:
+        for codec, encode, decode in CODECS:
+            data = encode(model)
+            if decode(cls, data) != model:
+                raise SystemExit(f"{codec} doesn't round-trip {page}")
+            for step, func, arg in (("encode", encode, model), ("decode", lambda d: decode(cls, d), data)):
+                key = f"{codec}/{step}/{page}"
+                results[key] = {"payload_bytes": len(data.encode() if isinstance(data, str) else data), **bench(func, arg, repeat, warmup)}
+                print(f"{key:<60} p50 {results[key]['p50_ms'] * 1000:8.2f} us  "
+                      f"{results[key]['pages_per_sec']:10.0f} /s  {results[key]['payload_bytes']:6d} bytes")
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "animescraper": __version__,
+            "codec_version": CODEC_VERSION,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "corpus": str(corpus),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def speedups(report: Dict) -> None:
+    """Prints how much faster the binary codec is than json for each model."""
+    print(f"\n{'model':<45} {'encode':>8} {'decode':>8} {'size':>7}")
+    for key, result in report["results"].items():
+        codec, step, page = key.split("/", 2)
+        if codec != "json" or step != "encode":
+            continue
+        binary = report["results"][f"bytes/encode/{page}"]
+        decode = report["results"][f"json/decode/{page}"]["p50_ms"] / report["results"][f"bytes/decode/{page}"]["p50_ms"]
+        print(f"{page:<45} {result['p50_ms'] / binary['p50_ms']:7.2f}x {decode:7.2f}x "
+              f"{binary['payload_bytes'] / result['payload_bytes']:6.0%}")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS, help="directory of saved pages")
+    parser.add_argument("--repeat", type=int, default=2000, help="timed runs per model")
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--output", type=Path, default=Path("bench_codec.json"), help="where to save the JSON results")
+    parser.add_argument("--compare", type=Path, help="a previous JSON result to compare against")
+    args = parser.parse_args(argv)
+
+    report = run(args.corpus, args.repeat, args.warmup)
+    args.output.write_text(json.dumps(report, indent=2))
+    speedups(report)
+    print(f"\nSaved results to {args.output}")
+
+    if args.compare:
+        compare(report, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
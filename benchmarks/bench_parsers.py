@@ -0,0 +1,178 @@
+"""
+Offline benchmark of the parse_* entry points.
+
+Every page of the corpus (``benchmarks/corpus`` by default: the test
+fixtures inside full-size MyAnimeList page chrome) is parsed by the entry
+point matching its file name:
+
+    anime_*.html             _parse_anime_data, LazyAnime (3 fields read)
+    character_*.html         parse_the_character
+    anime_search*.html       parse_anime_search
+    character_search*.html   parse_character_search (per result row)
+    topanime*.html           parse_top_anime
+
+Usage:
+    python -m benchmarks.bench_parsers
+    python -m benchmarks.bench_parsers --backend all --output after.json --compare before.json
+"""
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import bs4
+
+from AnimeScraper import __version__
+from AnimeScraper._lazy_anime import LazyAnime
+from AnimeScraper._parse_anime_data import (
+    DEFAULT_PARSER,
+    PARSER_BACKENDS,
+    _parse_anime_data,
+    parse_anime_search,
+    parse_character_search,
+    parse_the_character,
+    parse_top_anime,
+    set_parser_backend,
+)
+
+DEFAULT_CORPUS = Path(__file__).resolve().parent / "corpus"
+
+
+def _character_search(html: str):
+    # same slicing as MalScraper.search_character
+    start = '<table border="0" cellpadding="0" cellspacing="0" width="100%">'
+    table = html.split(start)[1].split("</table>")[0].split('width="175">', 8)
+    return [parse_character_search(row) for row in table]
+
+
+def _lazy_anime(html: str):
+    anime = LazyAnime(html)
+    return anime.title, anime.stats, anime.genres
+
+
+# (file name prefix, entry point name, callable), the longest matching prefix wins
+ENTRY_POINTS: List[Tuple[str, str, Callable[[str], object]]] = [
+    ("anime_search", "parse_anime_search", parse_anime_search),
+    ("character_search", "parse_character_search", _character_search),
+    ("anime_", "_parse_anime_data", _parse_anime_data),
+    ("anime_", "LazyAnime", _lazy_anime),
+    ("character_", "parse_the_character", parse_the_character),
+    ("topanime", "parse_top_anime", parse_top_anime),
+]
+
+
+def entry_points_for(page: Path) -> List[Tuple[str, Callable[[str], object]]]:
+    matches = [entry for entry in ENTRY_POINTS if page.name.startswith(entry[0])]
+    if not matches:
+        return []
+    longest = max(len(prefix) for prefix, _, _ in matches)
+    return [(name, func) for prefix, name, func in matches if len(prefix) == longest]
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def bench(func: Callable[[str], object], html: str, repeat: int, warmup: int) -> Dict[str, float]:
+    """Times `repeat` calls, then measures the peak traced memory of one call."""
+    for _ in range(warmup):
+        func(html)
+
+    samples = []
+    gc.collect()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(html)
+        samples.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "runs": repeat,
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p90_ms": percentile(samples, 90) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples) * 1000,
+        "pages_per_sec": len(samples) / sum(samples),
+        "peak_memory_kb": peak / 1024,
+    }
+
+
+def run(corpus: Path, backends: List[str], repeat: int, warmup: int) -> Dict:
+    pages = sorted(corpus.glob("*.html"))
+    if not pages:
+        raise SystemExit(f"No .html pages in {corpus}")
+
+    results: Dict[str, Dict] = {}
+    for backend in backends:
+        set_parser_backend(backend)
+        for page in pages:
+            html = page.read_text(encoding="utf-8")
+            for name, func in entry_points_for(page):
+                key = f"{backend}/{name}/{page.name}"
+                results[key] = {"page_bytes": len(html.encode()), **bench(func, html, repeat, warmup)}
+                print(f"{key:<60} p50 {results[key]['p50_ms']:8.3f} ms  "
+                      f"{results[key]['pages_per_sec']:9.1f} pages/s  "
+                      f"peak {results[key]['peak_memory_kb']:9.1f} KiB")
+    set_parser_backend()
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "animescraper": __version__,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "bs4": bs4.__version__,
+            "corpus": str(corpus),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict) -> None:
+    """Prints the p50 and throughput change of every benchmark found in both runs."""
+    print(f"\n{'benchmark':<60} {'p50 before':>11} {'p50 after':>10} {'speedup':>8} {'pages/s':>17}")
+    for key, result in current["results"].items():
+        before = baseline["results"].get(key)
+        if before:
+            print(f"{key:<60} {before['p50_ms']:9.3f}ms {result['p50_ms']:8.3f}ms "
+                  f"{before['p50_ms'] / result['p50_ms']:7.2f}x "
+                  f"{before['pages_per_sec']:8.1f} -> {result['pages_per_sec']:.1f}")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS, help="directory of saved pages")
+    parser.add_argument("--backend", default=DEFAULT_PARSER, choices=[*PARSER_BACKENDS, "all"])
+    parser.add_argument("--repeat", type=int, default=50, help="timed runs per page")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=Path("bench_parsers.json"), help="where to save the JSON results")
+    parser.add_argument("--compare", type=Path, help="a previous JSON result to compare against")
+    args = parser.parse_args(argv)
+
+    backends = [b for b in PARSER_BACKENDS if b == "html.parser" or DEFAULT_PARSER == "lxml"] \
+        if args.backend == "all" else [args.backend]
+    report = run(args.corpus, backends, args.repeat, args.warmup)
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"\nSaved results to {args.output}")
+
+    if args.compare:
+        compare(report, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
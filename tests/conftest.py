@@ -0,0 +1,48 @@
+"""
+Shared helpers for the offline tests. Pages in ``tests/fixtures`` follow
+MyAnimeList markup and are served in place of the live site.
+"""
+from pathlib import Path
+
+import pytest
+
+from AnimeScraper.async_malscraper import MalScraper
+from AnimeScraper.sync_malscraper import SyncMalScraper
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def read_fixture(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+def fixture_page(url: str) -> str:
+    """Returns the fixture page standing in for a MyAnimeList url."""
+    if "topanime.php" in url:
+        return read_fixture("topanime.html")
+    if "anime.php" in url:
+        return read_fixture("anime_search.html")
+    if "character.php" in url:
+        return read_fixture("character_search.html")
+    if "/character/" in url:
+        return read_fixture("character_1.html")
+    return read_fixture("anime_2.html" if url.endswith("/anime/2") else "anime_1.html")
+
+
+def fake_fetch(self, url: str, query: str, req=None) -> str:
+    self.fetched.append(url)
+    return fixture_page(url)
+
+
+async def fake_async_fetch(self, url: str, query: str, req=None) -> str:
+    self.fetched.append(url)
+    return fixture_page(url)
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    """Serves fixture pages to both scrapers. Fetched urls are kept in ``scraper.fetched``."""
+    monkeypatch.setattr(SyncMalScraper, "fetched", [], raising=False)
+    monkeypatch.setattr(MalScraper, "fetched", [], raising=False)
+    monkeypatch.setattr(SyncMalScraper, "_fetch", fake_fetch)
+    monkeypatch.setattr(MalScraper, "_fetch", fake_async_fetch)
@@ -0,0 +1,96 @@
+"""
+Offline tests for the async scraper, pages are served from ``tests/fixtures``.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from AnimeScraper import KunYu
+from AnimeScraper.async_malscraper import MalScraper
+from AnimeScraper.exceptions import AnimeNotFoundError
+from AnimeScraper.sync_malscraper import SyncMalScraper
+from tests.conftest import fake_fetch
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("parse_executor", ["inline", "thread", "process"])
+async def test_parse_executor(offline, parse_executor):
+    async with KunYu(parse_executor=parse_executor, parse_workers=2) as scraper:
+        anime = await scraper.get_batch_anime(["1", "2"])
+        character = await scraper.get_character("1")
+        top = await scraper.top_anime_list()
+    assert [a.id for a in anime] == ["1", "2"]
+    assert anime[1].status == "Currently Airing"
+    assert character.name.strip() == "Spike Spiegel"
+    assert top[0]["name"] == "Sousou no Frieren"
+    assert scraper._Scraper._executor is None
+
+
+def test_unknown_parse_executor():
+    with pytest.raises(ValueError):
+        KunYu(parse_executor="gpu")
+
+
+@pytest.mark.asyncio
+async def test_lazy_batch(offline, tmp_path):
+    async with KunYu(use_cache=True, db_path=str(tmp_path / "cache.db")) as scraper:
+        anime = await scraper.get_batch_anime(["1", "2"], lazy=True)
+        assert [a.status for a in anime] == ["Finished Airing", "Currently Airing"]
+        assert "characters" not in anime[0].parsed_fields()
+        with pytest.raises(ValueError):
+            await scraper.get_anime("1", fields=["title"], lazy=True)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_fetch(offline):
+    async with MalScraper(use_cache=False, db_path="", max_requests=5, per_second=1, timeout=10) as scraper:
+        anime = await asyncio.gather(*(scraper.get_anime("1") for _ in range(50)))
+        assert len(scraper.fetched) == 1
+        assert {a.title for a in anime} == {"Cowboy Bebop"}
+
+        await asyncio.gather(scraper.get_character("1"), scraper.get_character("1"), scraper.top_anime(), scraper.top_anime())
+        assert len(scraper.fetched) == 3
+
+        # a projection is a different call
+        await asyncio.gather(scraper.get_anime("2"), scraper.get_anime("2", fields=["title"]))
+        assert len(scraper.fetched) == 5
+
+        searched = await scraper.search_batch_anime(["Cowboy Bebop", "Cowboy Bebop", "Bebop"])
+        assert len(searched) == 3 and searched[0] is searched[1]
+        # two searches, then the anime they resolve to once
+        assert len(scraper.fetched) == 8
+        assert len(scraper.flights) == 0 and scraper.flights.shared > 0
+
+        # finished calls run again
+        await scraper.get_anime("1")
+        assert len(scraper.fetched) == 9
+
+
+@pytest.mark.asyncio
+async def test_shared_failure(offline, monkeypatch):
+    calls = []
+
+    async def missing(self, url, query, req=None):
+        calls.append(url)
+        await asyncio.sleep(0)
+        raise AnimeNotFoundError(query)
+    monkeypatch.setattr(MalScraper, "_fetch", missing)
+    async with MalScraper(use_cache=False, db_path="", max_requests=5, per_second=1, timeout=10) as scraper:
+        results = await asyncio.gather(*(scraper.get_anime("404") for _ in range(5)), return_exceptions=True)
+    assert len(calls) == 1
+    assert all(isinstance(result, AnimeNotFoundError) for result in results)
+
+
+def test_threads_share_one_fetch(offline, monkeypatch):
+    def slow_fetch(self, url, query, req=None):
+        time.sleep(0.2)
+        return fake_fetch(self, url, query, req)
+    monkeypatch.setattr(SyncMalScraper, "_fetch", slow_fetch)
+    with SyncMalScraper(client=None, use_cache=False, db_path="", timeout=10) as scraper:
+        with ThreadPoolExecutor(8) as pool:
+            anime = list(pool.map(lambda _: scraper.get_anime("1"), range(8)))
+        assert len(scraper.fetched) == 1 and all(a is anime[0] for a in anime)
+        assert len(scraper.search_batch_character(["Spike", "Spike"])) == 2
+        assert len(scraper.fetched) == 3
@@ -0,0 +1,938 @@
+"""
+Offline tests for the SQLite cache, pages are served from ``tests/fixtures``.
+"""
+import asyncio
+import gzip
+import json
+import multiprocessing
+import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from AnimeScraper import CacheLimit, CacheTTL, FileBackend, KunYu, MemoryBackend, SQLiteBackend, SyncKunYu
+from AnimeScraper._cache_backend import _search_key
+from AnimeScraper._cache_query import AnimeQuery
+from AnimeScraper._cache_utils import (
+    _decode_payload,
+    _encode_payload,
+    _initialize_database,
+    _open_connection,
+    _retry_busy,
+    _start_database,
+)
+from AnimeScraper._cache_writer import AsyncCacheWriter, CacheWriter
+from AnimeScraper._memory_cache import LRUCache
+from AnimeScraper._model import Anime
+from AnimeScraper.async_malscraper import MalScraper
+from AnimeScraper._search_index import TitleIndex
+from AnimeScraper.sync_malscraper import SyncMalScraper
+from tests.conftest import read_fixture
+
+
+def scraper_for(db_path, **options):
+    return MalScraper(use_cache=True, db_path=db_path, max_requests=5, per_second=1, timeout=10, **options)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "cache.db")
+
+
+def test_projected_rows_are_widened(offline, db_path):
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10) as scraper:
+        partial = scraper.get_anime("1", fields=["title"])
+        assert partial.characters is None
+        # a different projection refetches and keeps the fields cached before
+        assert scraper.get_anime("1", fields=["stats"]).title == "Cowboy Bebop"
+        assert scraper.get_anime("1", fields=["title", "stats"]).stats.score == "8.75"
+        assert len(scraper.fetched) == 2
+        # a full parse replaces the partial row, projections are then served from it
+        assert scraper.get_anime("1").characters
+        assert scraper.get_anime("1", fields=["related"]).related
+        assert len(scraper.fetched) == 3
+
+
+@pytest.mark.asyncio
+async def test_async_projection_cache(offline, db_path):
+    async with KunYu(use_cache=True, db_path=db_path) as scraper:
+        anime = await scraper.get_batch_anime(["1", "2"], fields=["genres"])
+        assert [a.genres for a in anime][1] == ["Action", "Award Winning", "Sci-Fi"]
+        assert anime[0].stats is None
+        full = await scraper.get_anime("1")
+        assert full.stats.ranked == "#46"
+        assert (await scraper.get_anime("1", fields=["genres"])) == full
+
+
+def test_old_schema_is_migrated(offline, db_path):
+    with sqlite3.connect(db_path) as db:
+        db.execute("CREATE TABLE anime (id TEXT PRIMARY KEY, data TEXT)")
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10) as scraper:
+        scraper.get_anime("1")
+        assert scraper.get_anime("1").title == "Cowboy Bebop"
+        assert len(scraper.fetched) == 1
+    with sqlite3.connect(db_path) as db:
+        db.execute("INSERT INTO anime (id, data) VALUES ('2', ?)", (read_fixture("anime_2.json"),))
+    # rows cached before fetched_at existed count as expired once a TTL is set
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10, cache_ttl=CacheTTL()) as scraper:
+        assert scraper.get_batch_anime(["1", "2"])[1].id == "2"
+        assert len(scraper.fetched) == 2
+
+
+def test_title_index():
+    index = TitleIndex()
+    index.add("1", ["Cowboy Bebop", None, "カウボーイビバップ"])
+    index.add("2", ["Cowboy Bebop: Tengoku no Tobira", "Cowboy Bebop: The Movie", None])
+    assert index.match("cowboy bebop!", 90) == "1"
+    assert index.match("カウボーイビバップ", 90) == "1"
+    assert index.match("Cowboy Bebop the movie", 90) == "2"
+    assert index.match("Violet Evergarden", 90) is None
+    index.add("3", ["Cowboy Bebop"])
+    assert index.match("Cowboy Bebop", 90) is None  # two anime with the same title
+    index.remove("3")
+    assert index.match("Cowboy Bebop", 90) == "1" and len(index) == 2
+
+
+def test_local_search(offline, db_path):
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10) as scraper:
+        scraper.get_anime("1")
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10, local_search=True) as scraper:
+        assert "1" in scraper.search_index
+        assert scraper.search_anime("cowboy bebop").id == "1"
+        assert len(scraper.fetched) == 1
+        # not cached, goes to MAL and lands in the index
+        scraper.search_anime("Violet Evergarden")
+        assert len(scraper.fetched) == 3 and "33352" in scraper.search_index
+
+
+@pytest.mark.asyncio
+async def test_async_local_search(offline, db_path):
+    async with KunYu(use_cache=True, db_path=db_path, local_search=True) as scraper:
+        await scraper.get_anime("2")
+        anime = await scraper.search_anime(json.loads(read_fixture("anime_2.json"))["title"])
+        assert anime.id == "2"
+        assert len(scraper._Scraper.fetched) == 1
+
+
+def test_search_resolution_is_cached(offline, db_path):
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10) as scraper:
+        anime = scraper.search_anime("Violet Evergarden")
+        character = scraper.search_character("Spike Spiegel")
+        assert len(scraper.fetched) == 4
+        assert scraper.search_anime("violet  evergarden!") == anime
+        assert scraper.search_character("spike spiegel") == character
+        assert len(scraper.fetched) == 4
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10, search_ttl=0) as scraper:
+        time.sleep(0.01)
+        scraper.search_anime("Violet Evergarden")
+        # the expired search is fetched again, the anime itself comes from the cache
+        assert "anime.php" in scraper.fetched[-1] and len(scraper.fetched) == 5
+
+
+@pytest.mark.asyncio
+async def test_async_search_resolution_is_cached(offline, db_path):
+    async with KunYu(use_cache=True, db_path=db_path) as scraper:
+        anime = await scraper.search_batch_anime(["Violet Evergarden", "violet evergarden"])
+        assert anime[0] == anime[1]
+        fetched = len(scraper._Scraper.fetched)
+        assert (await scraper.search_anime("VIOLET EVERGARDEN")) == anime[0]
+        assert len(scraper._Scraper.fetched) == fetched
+
+
+def test_writes_are_batched(offline, db_path):
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10,
+                        cache_batch_size=3, cache_flush_interval=60) as scraper:
+        scraper.get_anime("1")
+        scraper.get_anime("2")
+        # pending rows are served before they are written
+        assert scraper.get_anime("1").title == "Cowboy Bebop" and len(scraper.fetched) == 2
+        assert scraper.cache.writer.flushes == 0
+        scraper.get_character("1")
+        # written by the writer thread, flush() waits for it
+        scraper.cache.writer.flush()
+        assert scraper.cache.writer.flushes == 1 and len(scraper.cache.writer) == 0
+        scraper.search_anime("Violet Evergarden")
+    # flushed on exit
+    with sqlite3.connect(db_path) as db:
+        assert db.execute("SELECT COUNT(*) FROM anime").fetchone()[0] == 3
+        assert db.execute("SELECT id FROM search").fetchone()[0] == "33352"
+
+
+def test_writes_are_flushed_after_the_interval(db_path):
+    _start_database(db_path)
+    writer = CacheWriter(db_path, flush_interval=0.01)
+    try:
+        # let the writer thread go idle first
+        time.sleep(0.1)
+        writer.store("anime", "1", read_fixture("anime_1.json"))
+        time.sleep(0.3)
+        # committed by the writer thread on its own, without flush()
+        assert writer.flushes == 1
+        with sqlite3.connect(db_path) as db:
+            assert db.execute("SELECT COUNT(*) FROM anime").fetchone()[0] == 1
+    finally:
+        writer.close()
+
+
+@pytest.mark.asyncio
+async def test_async_writes_are_batched(offline, db_path):
+    async with scraper_for(db_path, cache_flush_interval=60) as scraper:
+        await scraper.get_batch_anime(["1", "2", "1"])
+        assert scraper.cache.writer.flushes == 0 and len(scraper.cache.writer) == 2
+    with sqlite3.connect(db_path) as db:
+        assert db.execute("SELECT COUNT(*) FROM anime").fetchone()[0] == 2
+
+    async with scraper_for(db_path, cache_flush_interval=0.01) as scraper:
+        await scraper.get_character("1")
+        await asyncio.sleep(0.1)
+        assert scraper.cache.writer.flushes == 1
+
+
+def failing_once(writer_class, monkeypatch):
+    """Makes the next write of `writer_class` fail, like a full disk would."""
+    failures = [sqlite3.OperationalError("disk I/O error")]
+    write = writer_class._write
+
+    def failing(self, *args):
+        if failures:
+            raise failures.pop()
+        return write(self, *args)
+    monkeypatch.setattr(writer_class, "_write", failing)
+
+
+def test_failed_flush_keeps_rows(db_path, monkeypatch):
+    _start_database(db_path)
+    failing_once(CacheWriter, monkeypatch)
+    writer = CacheWriter(db_path, flush_interval=60)
+    writer.store("anime", "1", read_fixture("anime_1.json"))
+    with pytest.raises(sqlite3.OperationalError, match="disk"):
+        writer.flush()
+    # still pending, the next flush writes it
+    assert writer.row("anime", "1") and len(writer) == 1
+    writer.close()
+    with sqlite3.connect(db_path) as db:
+        assert db.execute("SELECT COUNT(*) FROM anime").fetchone()[0] == 1
+
+
+@pytest.mark.asyncio
+async def test_async_failed_flush_keeps_rows(db_path, monkeypatch):
+    await _initialize_database(db_path)
+    failing_once(AsyncCacheWriter, monkeypatch)
+    db = await _open_connection(db_path)
+    writer = AsyncCacheWriter(db, flush_interval=0.01)
+    await writer.store("anime", "1", read_fixture("anime_1.json"))
+    # the timed flush fails and is retried
+    await asyncio.sleep(0.1)
+    assert writer.flushes == 1 and len(writer) == 0 and not writer._background
+    await writer.store("anime", "2", read_fixture("anime_1.json"))
+    await writer.close()
+    await db.close()
+    with sqlite3.connect(db_path) as db:
+        assert db.execute("SELECT COUNT(*) FROM anime").fetchone()[0] == 2
+
+
+@pytest.mark.asyncio
+async def test_async_flush_indexes_off_the_loop(offline, db_path, monkeypatch):
+    from AnimeScraper import _cache_writer
+    threads = []
+    index_row = _cache_writer._try_index_row
+
+    def recorded(*args):
+        threads.append(threading.current_thread())
+        return index_row(*args)
+    monkeypatch.setattr(_cache_writer, "_try_index_row", recorded)
+    async with scraper_for(db_path, cache_flush_interval=60) as scraper:
+        await scraper.get_batch_anime(["1", "2"])
+    assert len(threads) == 2 and threading.main_thread() not in threads
+    with sqlite3.connect(db_path) as db:
+        assert db.execute("SELECT COUNT(*) FROM anime_index").fetchone()[0] == 2
+
+
+def test_unknown_synchronous_mode(db_path):
+    with pytest.raises(ValueError):
+        SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10, cache_synchronous="fast")
+
+
+def cache_copies(db_path, count):
+    """Caches `count` copies of anime 1 under the ids 1000, 1001, ..."""
+    data = read_fixture("anime_1.json")
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10):
+        pass
+    with sqlite3.connect(db_path) as db:
+        db.executemany("INSERT INTO anime (id, data) VALUES (?, ?)", [(str(1000 + i), data) for i in range(count)])
+    return [str(1000 + i) for i in range(count)]
+
+
+@pytest.mark.asyncio
+async def test_async_batch_reads_cache_in_bulk(offline, db_path):
+    ids = cache_copies(db_path, 1200)
+    async with scraper_for(db_path) as scraper:
+        anime = await scraper.get_batch_anime(ids + ["2", ids[0]])
+        assert len(anime) == 1202 and anime[-1].title == "Cowboy Bebop"
+        assert scraper.fetched == ["https://myanimelist.net/anime/2"]
+        characters = await scraper.get_batch_character(["1", "1"])
+        assert characters[0] == characters[1] and len(scraper.fetched) == 2
+
+
+def test_batch_reads_cache_in_bulk(offline, db_path):
+    ids = cache_copies(db_path, 600)
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10) as scraper:
+        anime = scraper.get_batch_anime(ids, fields=["title"])
+        assert {a.title for a in anime} == {"Cowboy Bebop"} and not scraper.fetched
+
+
+def test_threaded_batch_with_cache(offline, db_path):
+    ids = cache_copies(db_path, 50)
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10, cache_batch_size=1) as scraper:
+        # misses are fetched and stored from the pool threads
+        anime = scraper.get_batch_anime(["1", "2"] + ids, fields=["title"])
+        assert [a.id for a in anime[:2]] == ["1", "2"]
+        scraper.get_anime("1")
+        scraper.get_anime("2")
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            again = list(pool.map(scraper.get_anime, ["1", "2"] * 10))
+        assert {a.title for a in again} == {"Cowboy Bebop"}
+        assert len(scraper.fetched) == 4  # the full parses of 1 and 2
+    with sqlite3.connect(db_path) as db:
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert db.execute("SELECT COUNT(*) FROM anime WHERE fields IS NULL").fetchone()[0] == 52
+
+
+def age_rows(db_path, seconds, title=None):
+    """Moves `fetched_at` of every cached anime back by `seconds`, optionally changing the cached title."""
+    with sqlite3.connect(db_path) as db:
+        db.execute("UPDATE anime SET fetched_at = fetched_at - ?", (seconds,))
+        if title:
+            for key, data, format in db.execute("SELECT id, data, format FROM anime").fetchall():
+                anime = Anime.from_bytes(_decode_payload(data, format))
+                anime.title = title
+                db.execute("UPDATE anime SET data = ?, format = 'bin' WHERE id = ?", (anime.model_dump_bytes(), key))
+
+
+def test_expired_rows_are_fetched_again(offline, db_path):
+    ttl = CacheTTL(airing=60 * 60, finished=24 * 60 * 60)
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10, cache_ttl=ttl) as scraper:
+        scraper.get_batch_anime(["1", "2"])
+    age_rows(db_path, 2 * 60 * 60, title="Old")
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10, cache_ttl=ttl) as scraper:
+        finished, airing = scraper.get_batch_anime(["1", "2"], fields=["title"])
+        # only the airing anime expired, it is fetched in full and replaces the full row
+        assert finished.title == "Old" and airing.title == "Cowboy Bebop"
+        assert scraper.fetched[-1].endswith("/anime/2") and len(scraper.fetched) == 3
+    with sqlite3.connect(db_path) as db:
+        assert db.execute("SELECT fields FROM anime WHERE id = '2'").fetchone()[0] is None
+
+
+@pytest.mark.asyncio
+async def test_stale_while_revalidate(offline, db_path):
+    ttl = CacheTTL(airing=60)
+    async with scraper_for(db_path, cache_ttl=ttl, stale_while_revalidate=True) as scraper:
+        await scraper.get_anime("2")
+    age_rows(db_path, 120, title="Old")
+    async with scraper_for(db_path, cache_ttl=ttl, stale_while_revalidate=True) as scraper:
+        stale = await scraper.get_batch_anime(["2", "2"])
+        assert stale[0].title == "Old" and len(scraper._refreshes) == 1
+    async with scraper_for(db_path, cache_ttl=ttl) as scraper:
+        assert (await scraper.get_anime("2")).title == "Cowboy Bebop"
+        assert len(scraper.fetched) == 2
+
+
+def test_sync_stale_while_revalidate(offline, db_path):
+    ttl = CacheTTL(airing=60)
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10, cache_ttl=ttl) as scraper:
+        scraper.get_anime("2")
+    age_rows(db_path, 120, title="Old")
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10,
+                        cache_ttl=ttl, stale_while_revalidate=True) as scraper:
+        assert scraper.get_anime("2").title == "Old"
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10, cache_ttl=ttl) as scraper:
+        assert scraper.get_anime("2").title == "Cowboy Bebop"
+        assert len(scraper.fetched) == 2
+
+
+def test_lru_cache_limits():
+    lru = LRUCache(max_entries=2)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    assert lru.get("a") == 1
+    lru.put("c", 3)  # evicts b, a was used more recently
+    assert lru.get("b") is None and lru.get("c") == 3
+    by_size = LRUCache(max_entries=None, max_bytes=10)
+    by_size.put("a", 1, size=6)
+    by_size.put("b", 2, size=6)
+    by_size.put("huge", 3, size=11)
+    assert by_size.stats() == {"entries": 1, "bytes": 6, "hits": 0, "misses": 0, "evictions": 1}
+    assert lru.stats()["hits"] == 2 and lru.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_memory_cache(offline, db_path, monkeypatch):
+    async with KunYu(use_cache=True, db_path=db_path, memory_cache_entries=10) as scraper:
+        first = await scraper.get_anime("1")
+        with monkeypatch.context() as patch:
+            # served from memory: no query, no decode
+            patch.setattr(Anime, "from_json", None)
+            patch.setattr(Anime, "from_bytes", None)
+            assert await scraper.get_anime("1") is first
+            assert (await scraper.get_anime("1", fields=["title"])) is first
+            assert (await scraper.get_batch_anime(["1"]))[0] is first
+        assert scraper.cache_stats()["hits"] == 3
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10, memory_cache_bytes=10**6) as scraper:
+        scraper.get_anime("1", fields=["title"])
+        assert scraper.get_anime("1").title == "Cowboy Bebop"
+        assert scraper.cache_stats()["entries"] == 1 and not scraper.fetched
+
+
+
+@pytest.mark.parametrize("compression, format", [("zlib", "zlib"), ("zdict", "zdict1")])
+def test_compressed_rows(offline, db_path, compression, format):
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10) as scraper:
+        plain = scraper.get_anime("1")
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10, cache_compression=compression) as scraper:
+        # the row written before still reads, the new one is compressed
+        assert scraper.get_anime("1") == plain
+        second = scraper.get_anime("2")
+        assert scraper.get_batch_anime(["1", "2"]) == [plain, second]
+        assert len(scraper.fetched) == 2
+    with sqlite3.connect(db_path) as db:
+        rows = dict((key, (format, size)) for key, format, size in db.execute("SELECT id, format, LENGTH(data) FROM anime"))
+    assert rows["1"] == ("bin", len(plain.model_dump_bytes()))
+    assert rows["2"][0] == f"bin+{format}" and rows["2"][1] < len(second.model_dump_bytes()) * 3 / 4
+
+
+@pytest.mark.asyncio
+async def test_async_compressed_rows(offline, db_path):
+    async with scraper_for(db_path, cache_compression="zdict") as scraper:
+        first = await scraper.get_anime("1")
+    async with scraper_for(db_path, local_search=True) as scraper:
+        assert "1" in scraper.search_index
+        assert await scraper.get_anime("1") == first and len(scraper.fetched) == 1
+
+
+def test_old_binary_rows_are_fetched_again(offline, db_path):
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10) as scraper:
+        scraper.get_anime("1")
+    with sqlite3.connect(db_path) as db:
+        db.execute("UPDATE anime SET data = ?, format = 'bin'", (b"\x01" + b"\x00" * 16,))
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10, local_search=True) as scraper:
+        assert scraper.get_anime("1").title == "Cowboy Bebop" and len(scraper.fetched) == 2
+        assert scraper.get_anime("1") and len(scraper.fetched) == 2
+
+
+def test_unknown_compression(db_path):
+    with pytest.raises(ValueError):
+        SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10, cache_compression="brotli")
+
+
+@pytest.mark.parametrize("compression", [None, "zlib", "zdict1"])
+def test_payload_formats(compression):
+    anime = Anime.from_json(read_fixture("anime_1.json"))
+    for payload in (anime.model_dump_json(), anime.model_dump_bytes()):
+        data, format = _encode_payload(payload, compression)
+        assert _decode_payload(data, format) == payload
+
+
+def test_reparse_archived_pages(offline, db_path):
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10, archive_pages=True) as scraper:
+        scraper.get_anime("1", fields=["title"])
+        scraper.get_batch_anime(["2"])
+        scraper.get_character("1")
+        scraper.search_anime("Violet Evergarden")
+    fetched = len(scraper.fetched)
+    age_rows(db_path, 60, title="Old Parser")
+    with sqlite3.connect(db_path) as db:
+        pages = dict(db.execute("SELECT url, html FROM pages"))
+        # only detail pages are archived
+        assert set(pages) == {f"https://myanimelist.net/{page}" for page in ("anime/1", "anime/2", "anime/33352", "character/1")}
+        assert zlib.decompress(pages["https://myanimelist.net/anime/2"]).decode() == read_fixture("anime_2.html")
+        db.execute("INSERT INTO pages VALUES ('https://myanimelist.net/anime/404', ?, NULL, 0)", (zlib.compress(b"<html></html>"),))
+
+    assert SyncKunYu(use_cache=True, db_path=db_path).reparse(workers=2) == {"anime": 3, "character": 1, "failed": 1}
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10) as scraper:
+        # the projected row was replaced by a full parse
+        assert scraper.get_anime("1") == Anime.from_json(read_fixture("anime_1.json"))
+        assert scraper.get_anime("2").title != "Old Parser"
+        assert len(scraper.fetched) == fetched
+
+
+@pytest.mark.asyncio
+async def test_async_reparse(offline, db_path):
+    async with scraper_for(db_path, archive_pages=True, cache_compression="zlib") as scraper:
+        await scraper.get_anime("1")
+    age_rows(db_path, 60, title="Old Parser")
+    scraper = KunYu(use_cache=True, db_path=db_path, cache_compression="zlib", memory_cache_entries=10)
+    assert await scraper.reparse(workers=1) == {"anime": 1, "character": 0, "failed": 0}
+    assert (await scraper.get_anime("1")).title == "Cowboy Bebop"
+
+
+def test_reparse_in_open_kunyu(offline, db_path):
+    with SyncKunYu(use_cache=True, db_path=db_path, archive_pages=True, cache_flush_interval=60) as kunyu:
+        kunyu.get_anime("1")
+        # the queued row and page are flushed before the rebuild, not written over it afterwards
+        assert kunyu.reparse(workers=1) == {"anime": 1, "character": 0, "failed": 0}
+    with pytest.raises(ValueError, match="SQLite"):
+        SyncKunYu(cache_backend=MemoryBackend()).reparse()
+
+
+@pytest.mark.asyncio
+async def test_async_reparse_in_open_kunyu(offline, db_path):
+    async with KunYu(use_cache=True, db_path=db_path, archive_pages=True, cache_flush_interval=60) as kunyu:
+        await kunyu.get_anime("1")
+        assert await kunyu.reparse(workers=1) == {"anime": 1, "character": 0, "failed": 0}
+    with pytest.raises(ValueError, match="SQLite"):
+        await KunYu(cache_backend=MemoryBackend()).reparse()
+
+
+def cached_ids(db_path):
+    with sqlite3.connect(db_path) as db:
+        return {table: {key for key, in db.execute(f"SELECT id FROM {table}")} for table in ("anime", "character")}
+
+
+def test_lru_eviction(offline, db_path):
+    limit = CacheLimit(max_rows=3)
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10, cache_batch_size=1, cache_limit=limit, archive_pages=True) as scraper:
+        scraper.get_anime("1")
+        scraper.get_anime("2")
+        scraper.get_character("1")
+        scraper.get_anime("1")
+        scraper.get_anime("5")
+    assert scraper.cache_stats()["cache_evictions"] == 1
+    # anime 2 was read the longest time ago, its archived page goes with it
+    assert cached_ids(db_path) == {"anime": {"1", "5"}, "character": {"1"}}
+    with sqlite3.connect(db_path) as db:
+        assert "https://myanimelist.net/anime/2" not in {url for url, in db.execute("SELECT url FROM pages")}
+
+
+def measured_size(db_path):
+    with sqlite3.connect(db_path) as db:
+        counted = db.execute("SELECT rows, bytes FROM cache_size").fetchone()
+        rows = sum(db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ("anime", "character"))
+        size = sum(db.execute(f"SELECT COALESCE(SUM(LENGTH({column})), 0) FROM {table}").fetchone()[0]
+                   for table, column in (("anime", "data"), ("character", "data"), ("pages", "html")))
+    return counted, (rows, size)
+
+
+def test_cache_size_is_counted(offline, db_path):
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10, cache_batch_size=1,
+                        cache_limit=CacheLimit(max_rows=3), archive_pages=True) as scraper:
+        scraper.get_anime("1", fields=["title"])
+        scraper.get_anime("1")
+        scraper.get_anime("2")
+        scraper.get_character("1")
+        scraper.get_anime("5")
+        scraper.cache.delete("character", "1")
+    counted, measured = measured_size(db_path)
+    assert counted == measured and measured[0] == 2
+    # a cache from before the counter is measured once
+    with sqlite3.connect(db_path) as db:
+        db.execute("DROP TABLE cache_size")
+        db.execute("UPDATE anime SET last_access = NULL")
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10) as scraper:
+        scraper.get_anime("7")
+    counted, measured = measured_size(db_path)
+    assert counted == measured and measured[0] == 3
+    with sqlite3.connect(db_path) as db:
+        assert db.execute("SELECT COUNT(*) FROM anime WHERE last_access IS NULL").fetchone()[0] == 0
+
+
+def test_lfu_eviction(offline, db_path):
+    limit = CacheLimit(max_rows=2, policy="lfu")
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10, cache_batch_size=1, cache_limit=limit) as scraper:
+        scraper.get_anime("1")
+        scraper.get_anime("2")
+        scraper.get_anime("1")
+        scraper.get_anime("2")
+        scraper.get_anime("2")
+        # the new row is never the one evicted, even with the fewest reads
+        scraper.get_anime("5")
+    assert cached_ids(db_path)["anime"] == {"2", "5"}
+    with sqlite3.connect(db_path) as db:
+        assert dict(db.execute("SELECT id, hits FROM anime")) == {"2": 3, "5": 1}
+
+
+@pytest.mark.asyncio
+async def test_async_byte_limit(offline, db_path):
+    size = len(_encode_payload(Anime.from_json(read_fixture("anime_1.json")).model_dump_bytes(), "zlib")[0])
+    limit = CacheLimit(max_bytes=int(2.5 * size), batch=1)
+    async with scraper_for(db_path, cache_compression="zlib", cache_limit=limit) as scraper:
+        await scraper.get_batch_anime(["1", "3", "4", "5"])
+    # every row was written by the same flush, they are evicted one per flush from the next one on
+    assert len(cached_ids(db_path)["anime"]) == 4
+    async with scraper_for(db_path, cache_compression="zlib", cache_limit=limit, cache_batch_size=1) as scraper:
+        await scraper.get_anime("6")
+        await scraper.get_anime("7")
+        await scraper.get_anime("8")
+        assert scraper.cache_stats()["cache_evictions"] == 3
+    assert "8" in cached_ids(db_path)["anime"]
+    assert len(cached_ids(db_path)["anime"]) == 4
+
+
+def test_unknown_eviction_policy():
+    with pytest.raises(ValueError):
+        CacheLimit(max_rows=10, policy="fifo")
+
+
+def backend_for(kind, tmp_path):
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "file":
+        return FileBackend(str(tmp_path / "files"), shards=4, compression="zdict")
+    return SQLiteBackend(str(tmp_path / "cache.db"), batch_size=2)
+
+
+@pytest.mark.parametrize("kind", ["memory", "file", "sqlite"])
+def test_cache_backends(tmp_path, kind):
+    backend = backend_for(kind, tmp_path)
+    anime = Anime.from_json(read_fixture("anime_1.json")).model_dump_bytes()
+    backend.open()
+    try:
+        backend.put("anime", "1", anime)
+        backend.put_many("anime", [("2", "{}", ["title"]), ("a/b c", anime, None)])
+        # a partial parse never replaces a full one
+        backend.put("anime", "1", "{}", ["title"])
+        backend.put("search", _search_key("anime", "cowboy bebop"), "1")
+        assert backend.get("anime", "1")[:2] == (anime, None)
+        assert backend.get("anime", "2")[:2] == ("{}", "title")
+        assert backend.get("anime", "3") is None
+        assert set(backend.get_many("anime", ["1", "a/b c", "3"])) == {"1", "a/b c"}
+        assert backend.get("search", _search_key("anime", "cowboy bebop"))[0] == "1"
+        backend.delete("anime", "2")
+        backend.delete("anime", "4")
+        assert backend.get("anime", "2") is None
+        assert dict(backend.items("anime")) == {"1": anime, "a/b c": anime}
+        stats = backend.stats()
+        assert (stats["hits"], stats["misses"], stats["deletes"]) == (5, 3, 1)
+    finally:
+        backend.close()
+
+
+def test_memory_backend(offline):
+    backend = MemoryBackend()
+    with SyncMalScraper(client=None, use_cache=False, db_path="unused.db", timeout=10, cache_backend=backend) as scraper:
+        scraper.get_anime("1")
+        scraper.search_anime("Cowboy Bebop")
+        scraper.search_anime("Cowboy Bebop")
+        assert scraper.get_anime("1").title == "Cowboy Bebop"
+        assert len(scraper.fetched) == 3
+        assert scraper.cache_stats()["cache_puts"] == 3
+    with pytest.raises(ValueError):
+        SyncMalScraper(client=None, use_cache=True, db_path="unused.db", timeout=10, cache_backend=backend, archive_pages=True)
+
+
+@pytest.mark.asyncio
+async def test_async_file_backend(offline, tmp_path):
+    root = str(tmp_path / "files")
+    async with KunYu(cache_backend=FileBackend(root)) as scraper:
+        await scraper.get_batch_anime(["1", "1"])
+        await scraper.get_character("1")
+    # another process (or scraper) with the same directory reads the same cache
+    scraper = KunYu(cache_backend=FileBackend(root), local_search=True)
+    assert (await scraper.search_anime("cowboy bebop")).id == "1"
+    assert (await scraper.get_character("1")).name == json.loads(read_fixture("character_1.json"))["name"]
+    assert len(MalScraper.fetched) == 2
+
+
+def test_cache_benchmark_runner(tmp_path):
+    from benchmarks.bench_cache import main
+    output = tmp_path / "bench.json"
+    main(["--rows", "20", "--chunk", "8", "--output", str(output)])
+    results = json.loads(output.read_text())["results"]
+    assert {key.split("/")[0] for key in results} == {"sqlite", "memory", "file"}
+
+
+def other_anime(anime_id, **values):
+    anime = Anime.from_json(read_fixture("anime_1.json"))
+    anime.id = anime_id
+    for name, value in values.items():
+        setattr(anime, name, value)
+    return anime
+
+
+def test_query_cached(offline, db_path):
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10) as scraper:
+        scraper.get_batch_anime(["1", "2"])
+        anime = other_anime("3", genres=["Comedy"], studios="Bones, Sunrise", premiered="Fall 2004", anime_type="Movie")
+        anime.stats.score = "7.10"
+        scraper.cache.put("anime", "3", anime.model_dump_bytes())
+        scraper.get_anime("4", fields=["title"])
+
+        ids = lambda **filters: [anime.id for anime in scraper.query_cached(AnimeQuery(**filters))]
+        assert ids(genre="action") == ["1", "2"]
+        assert [a.title for a in scraper.query_cached(AnimeQuery(genre=["Comedy"]))] == ["Cowboy Bebop"]
+        assert ids(studio="bones") == ["3"]
+        assert ids(studio="Sunrise", order_by="score", descending=False) == ["3", "1", "2"]
+        assert ids(season="Fall", year=2004, anime_type="movie") == ["3"]
+        assert ids(min_score=8, status="Currently Airing") == ["2"]
+        # the partial row has no score, it sorts last and never matches a score filter
+        everything = scraper.query_cached(AnimeQuery())
+        assert len(everything) == 4 and everything[-1].stats is None
+        assert len(ids(min_score=1)) == 3
+        assert ids(limit=1, order_by="rank") == ["1"]
+
+        scraper.cache.delete("anime", "3")
+        assert ids(studio="bones") == []
+    with sqlite3.connect(db_path) as db:
+        assert db.execute("SELECT COUNT(*) FROM anime_genre WHERE id = '3'").fetchone() == (0,)
+    with pytest.raises(ValueError):
+        AnimeQuery(order_by="episodes")
+    with pytest.raises(ValueError):
+        SyncKunYu(cache_backend=MemoryBackend()).query_cached(genre="Action")
+
+
+def test_old_cache_is_indexed(db_path):
+    with sqlite3.connect(db_path) as db:
+        db.execute("CREATE TABLE anime (id TEXT PRIMARY KEY, data TEXT)")
+        db.execute("INSERT INTO anime (id, data) VALUES ('2', ?)", (read_fixture("anime_2.json"),))
+    anime = SyncKunYu(use_cache=True, db_path=db_path).query_cached(genre="Sci-Fi", year=1998, season="spring")
+    assert [a.id for a in anime] == ["2"]
+
+
+@pytest.mark.asyncio
+async def test_async_query_cached(offline, db_path):
+    scraper = KunYu(use_cache=True, db_path=db_path, cache_compression="zdict", memory_cache_entries=10)
+    await scraper.get_batch_anime(["1", "2"])
+    anime = await scraper.query_cached(genre=["Action", "Sci-Fi"], min_members=1_000_000, order_by="members")
+    assert {a.status for a in anime} == {"Finished Airing", "Currently Airing"}
+    assert await scraper.query_cached(max_score=8) == []
+
+
+def write_rows(db_path, worker, rows):
+    """Caches `rows` anime of its own through a process-locked backend, run in a spawned process."""
+    anime = Anime.from_json(read_fixture("anime_1.json")).model_dump_bytes()
+    backend = SQLiteBackend(db_path, batch_size=5, process_lock=True)
+    backend.open()
+    try:
+        for i in range(rows):
+            backend.put("anime", f"{worker}-{i}", anime)
+    finally:
+        backend.close()
+
+
+def test_processes_share_the_cache(db_path):
+    # every worker opens the schema at the same time and writes while the others do
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=write_rows, args=(db_path, worker, 40)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(60)
+    assert [process.exitcode for process in workers] == [0] * 4
+    with sqlite3.connect(db_path) as db:
+        assert db.execute("SELECT COUNT(*) FROM anime").fetchone()[0] == 160
+        assert db.execute("SELECT COUNT(*) FROM anime_index").fetchone()[0] == 160
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_busy_writes_are_retried(db_path):
+    backend = SQLiteBackend(db_path, batch_size=1)
+    backend.open()
+    try:
+        # another process holds the write lock for a while, the flush waits for it
+        other = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        other.execute("BEGIN IMMEDIATE")
+        release = threading.Timer(0.3, other.execute, ("COMMIT",))
+        release.start()
+        backend.put("anime", "1", Anime.from_json(read_fixture("anime_1.json")).model_dump_bytes())
+        backend.writer.flush()
+        release.join()
+        other.close()
+        assert backend.get("anime", "1")
+    finally:
+        backend.close()
+
+
+def test_retry_busy():
+    attempts = []
+
+    def locked(failures):
+        attempts.append(failures)
+        if len(attempts) <= failures:
+            raise sqlite3.OperationalError("database is locked")
+        return "done"
+
+    assert _retry_busy(locked, 2) == "done" and len(attempts) == 3
+    attempts.clear()
+    with pytest.raises(sqlite3.OperationalError, match="locked"):
+        _retry_busy(locked, 5, retries=1)
+    assert len(attempts) == 2
+    # other errors aren't retried
+    with pytest.raises(sqlite3.OperationalError, match="no such table"):
+        _retry_busy(sqlite3.connect(":memory:").execute, "SELECT * FROM missing")
+
+
+def test_export_import(offline, tmp_path, db_path):
+    with SyncMalScraper(client=None, use_cache=True, db_path=db_path, timeout=10, cache_compression="zdict") as scraper:
+        scraper.get_batch_anime(["1", "2"])
+        scraper.get_anime("3", fields=["title"])
+        scraper.get_character("1")
+    with sqlite3.connect(db_path) as db:
+        # a json row of an older cache and a row that can't be decoded
+        db.execute("INSERT INTO anime (id, data) VALUES ('5', ?)", (read_fixture("anime_2.json"),))
+        db.execute("INSERT INTO anime (id, data, format) VALUES ('6', x'00', 'bin')")
+    export = str(tmp_path / "cache.jsonl.gz")
+    assert SyncKunYu(use_cache=True, db_path=db_path).export_cache(export) == {"anime": 4, "character": 1, "skipped": 1}
+
+    new_db = str(tmp_path / "new.db")
+    kunyu = SyncKunYu(use_cache=True, db_path=new_db)
+    assert kunyu.import_cache(export, chunk_size=2) == {"anime": 4, "character": 1, "skipped": 0}
+    with sqlite3.connect(new_db) as db, sqlite3.connect(db_path) as old:
+        query = "SELECT id, fields, fetched_at FROM anime WHERE id != '6' ORDER BY id"
+        assert db.execute(query).fetchall() == old.execute(query).fetchall()
+        # the deferred indexes are back
+        assert db.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'anime_index_score'").fetchone() == (1,)
+    with SyncMalScraper(client=None, use_cache=True, db_path=new_db, timeout=10) as scraper:
+        fetched = len(scraper.fetched)
+        assert scraper.get_anime("1") == Anime.from_json(read_fixture("anime_1.json"))
+        assert scraper.get_character("1").name
+        assert len(scraper.fetched) == fetched
+    # anime 2 and the json row holding it
+    assert len(kunyu.query_cached(status="Currently Airing")) == 2
+
+    with gzip.open(export, "rt") as f:
+        header, *lines = f.read().splitlines()
+    rows = {(row["table"], row["id"]): row for row in map(json.loads, lines)}
+    partial = {**rows[("anime", "1")], "fields": "id,title"}
+    no_fetch_time = {key: value for key, value in rows[("character", "1")].items() if key != "fetched_at"}
+    with gzip.open(tmp_path / "partial.jsonl.gz", "wt") as f:
+        f.write("\n".join([header, json.dumps(partial), json.dumps(no_fetch_time), json.dumps(rows[("anime", "2")])]) + "\n")
+    # the partial row doesn't replace the full one, the line without a fetch time is skipped
+    assert kunyu.import_cache(str(tmp_path / "partial.jsonl.gz")) == {"anime": 1, "character": 0, "skipped": 1}
+
+    with gzip.open(tmp_path / "not_an_export.jsonl.gz", "wt") as f:
+        f.write("{}\n")
+    with pytest.raises(ValueError, match="not an AnimeScraper cache export"):
+        kunyu.import_cache(str(tmp_path / "not_an_export.jsonl.gz"))
+
+
+@pytest.mark.asyncio
+async def test_async_export_import(offline, tmp_path, db_path):
+    scraper = KunYu(use_cache=True, db_path=db_path, memory_cache_entries=10)
+    await scraper.get_anime("1")
+    export = str(tmp_path / "cache.jsonl.gz")
+    assert await scraper.export_cache(export, tables=["anime"]) == {"anime": 1, "skipped": 0}
+    new = KunYu(use_cache=True, db_path=str(tmp_path / "new.db"))
+    assert await new.import_cache(export) == {"anime": 1, "character": 0, "skipped": 0}
+    assert [anime.id for anime in await new.query_cached(genre="Action")] == ["1"]
+
+
+def test_export_import_in_open_kunyu(offline, tmp_path, db_path, monkeypatch):
+    export = str(tmp_path / "cache.jsonl.gz")
+    with SyncKunYu(use_cache=True, db_path=db_path, cache_flush_interval=60) as kunyu:
+        kunyu.get_anime("1")
+        # the queued row is flushed before the export
+        assert kunyu.export_cache(export) == {"anime": 1, "character": 0, "skipped": 0}
+    age_rows(db_path, 60, title="Imported")
+    assert SyncKunYu(use_cache=True, db_path=db_path).export_cache(export)["anime"] == 1
+
+    new_db = str(tmp_path / "new.db")
+    with SyncKunYu(use_cache=True, db_path=new_db, cache_flush_interval=60, memory_cache_entries=10) as kunyu:
+        assert kunyu.get_anime("1").title == "Cowboy Bebop"
+        kunyu.import_cache(export)
+        # not written over by the row that was queued, nor served from the memory cache
+        assert kunyu.get_anime("1").title == "Imported"
+    with sqlite3.connect(new_db) as db:
+        assert Anime.from_bytes(db.execute("SELECT data FROM anime").fetchone()[0]).title == "Imported"
+
+    cwd = tmp_path / "cwd"
+    cwd.mkdir()
+    monkeypatch.chdir(cwd)
+    with pytest.raises(ValueError, match="SQLite"):
+        SyncKunYu(cache_backend=MemoryBackend()).export_cache("memory.jsonl.gz")
+    assert not list(cwd.iterdir())
+
+
+@pytest.mark.asyncio
+async def test_async_export_import_in_open_kunyu(offline, tmp_path, db_path):
+    export = str(tmp_path / "cache.jsonl.gz")
+    async with KunYu(use_cache=True, db_path=db_path, cache_flush_interval=60) as kunyu:
+        await kunyu.get_anime("1")
+        assert await kunyu.export_cache(export) == {"anime": 1, "character": 0, "skipped": 0}
+    age_rows(db_path, 60, title="Imported")
+    await KunYu(use_cache=True, db_path=db_path).export_cache(export)
+
+    async with KunYu(use_cache=True, db_path=str(tmp_path / "new.db"), cache_flush_interval=60, memory_cache_entries=10) as kunyu:
+        assert (await kunyu.get_anime("1")).title == "Cowboy Bebop"
+        await kunyu.import_cache(export)
+        assert (await kunyu.get_anime("1")).title == "Imported"
+    with pytest.raises(ValueError, match="SQLite"):
+        await KunYu(cache_backend=MemoryBackend()).import_cache(export)
+
+
+def test_local_search_after_import(offline, tmp_path, db_path):
+    export = str(tmp_path / "cache.jsonl.gz")
+    with SyncKunYu(use_cache=True, db_path=db_path) as kunyu:
+        kunyu.get_anime("1")
+        kunyu.export_cache(export)
+    with SyncKunYu(use_cache=True, db_path=str(tmp_path / "new.db"), local_search=True) as kunyu:
+        kunyu.import_cache(export)
+        fetched = len(kunyu._Scraper.fetched)
+        # the title index holds the imported anime, nothing is fetched
+        assert kunyu.search_anime("Cowboy Bebop").id == "1"
+        assert len(kunyu._Scraper.fetched) == fetched
+
+
+@pytest.mark.asyncio
+async def test_async_local_search_after_import(offline, tmp_path, db_path):
+    export = str(tmp_path / "cache.jsonl.gz")
+    async with KunYu(use_cache=True, db_path=db_path) as kunyu:
+        await kunyu.get_anime("1")
+        await kunyu.export_cache(export)
+    async with KunYu(use_cache=True, db_path=str(tmp_path / "new.db"), local_search=True) as kunyu:
+        await kunyu.import_cache(export)
+        fetched = len(kunyu._Scraper.fetched)
+        assert (await kunyu.search_anime("Cowboy Bebop")).id == "1"
+        assert len(kunyu._Scraper.fetched) == fetched
+        await kunyu.reparse(workers=1)
+        assert kunyu._Scraper.search_index is not None
+
+
+def counted_opens(backend):
+    """Counts the `open` calls of a cache backend."""
+    opens = []
+    original = backend.open
+
+    def open():
+        opens.append(1)
+        return original()
+    backend.open = open
+    return opens
+
+
+@pytest.mark.asyncio
+async def test_kunyu_stays_open(offline, db_path):
+    kunyu = KunYu(use_cache=True, db_path=db_path)
+    opens = counted_opens(kunyu._Scraper.cache)
+    async with kunyu:
+        session = kunyu._Scraper.session
+        assert session is kunyu._shared_session
+        await kunyu.get_anime("1")
+        await kunyu.get_character("1")
+        await kunyu.search_anime("Cowboy Bebop")
+        assert kunyu._Scraper.session is session
+    assert len(opens) == 1
+    assert session.closed and kunyu._Scraper.session is None
+
+    # outside a block the calls in flight share one opening
+    await asyncio.gather(*(kunyu.get_anime(anime_id) for anime_id in ("1", "2", "3")))
+    assert len(opens) == 2
+    assert kunyu._Scraper.session is None
+
+
+def test_sync_kunyu_stays_open(offline, db_path):
+    kunyu = SyncKunYu(use_cache=True, db_path=db_path)
+    opens = counted_opens(kunyu._Scraper.cache)
+    with kunyu:
+        client = kunyu._Scraper.client
+        assert client is kunyu._shared_client
+        kunyu.get_anime("1")
+        kunyu.get_batch_anime(["1", "2"])
+        assert kunyu._Scraper.client is client
+    assert len(opens) == 1
+    assert client.is_closed and kunyu._Scraper.client is None
+
+    with ThreadPoolExecutor(4) as pool:
+        assert [a.id for a in pool.map(kunyu.get_anime, ["1", "2", "1", "2"])] == ["1", "2", "1", "2"]
+    assert kunyu._users == 0 and kunyu._Scraper.client is None
@@ -0,0 +1,194 @@
+"""
+Offline parser tests. Pages in ``tests/fixtures`` follow MyAnimeList markup.
+"""
+import difflib
+import json
+import marshal
+
+import pytest
+from bs4 import BeautifulSoup
+
+from AnimeScraper._model import CODEC_VERSION, Anime, Character
+from AnimeScraper._lazy_anime import LazyAnime
+from AnimeScraper.sync_malscraper import SyncMalScraper
+from AnimeScraper._parse_anime_data import (
+    DEFAULT_PARSER,
+    _index_sidebar,
+    _parse_anime_data,
+    get_anime_stats,
+    get_close_match,
+    get_span_text,
+    normalize,
+    parse_anime_search,
+    parse_the_character,
+    parse_top_anime,
+    set_parser_backend,
+)
+from tests.conftest import FIXTURES, read_fixture
+
+BACKENDS = ["html.parser"] + (["lxml"] if DEFAULT_PARSER == "lxml" else [])
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    yield set_parser_backend(request.param)
+    set_parser_backend()
+
+
+@pytest.fixture
+def scraper(offline):
+    return SyncMalScraper(client=None, use_cache=False, db_path="", timeout=10)
+
+
+@pytest.mark.parametrize("name", ["anime_1", "anime_2"])
+def test_parse_anime_matches_snapshot(backend, name):
+    anime = _parse_anime_data(read_fixture(f"{name}.html"))
+    expected = json.loads(read_fixture(f"{name}.json"))
+    assert json.loads(anime.model_dump_json()) == expected
+
+
+def test_parse_character_matches_snapshot(backend):
+    character = parse_the_character(read_fixture("character_1.html"))
+    assert character.__dict__ == json.loads(read_fixture("character_1.json"))
+
+
+def test_parse_top_anime_matches_snapshot(backend):
+    top = parse_top_anime(read_fixture("topanime.html"))
+    assert top == json.loads(read_fixture("topanime.json"))
+
+
+def test_parse_anime_search(backend):
+    results = parse_anime_search(read_fixture("anime_search.html"))
+    assert results[0] == ["Violet Evergarden", "https://myanimelist.net/anime/33352/Violet_Evergarden"]
+    assert len(results) == 10
+
+
+def test_search_through_scraper(backend, scraper):
+    assert scraper.search_character("Spike Spiegel").name.strip() == "Spike Spiegel"
+    assert scraper.search_anime("Violet Evergarden").title == "Cowboy Bebop"
+
+
+@pytest.mark.parametrize("query", ["Violet Evergarden", "violet evergarden: the movie", "Frieren", "", "!!"])
+def test_close_match_scores_match_difflib(query):
+    names = [row[0] for row in parse_anime_search(read_fixture("anime_search.html"))]
+    names += ["", "Violet Evergarden", "VIOLET-EVERGARDEN"]
+    scores = [difflib.SequenceMatcher(None, normalize(query), normalize(name)).ratio() for name in names]
+    best = scores.index(max(scores))
+    assert get_close_match(query, names) == (names[best], scores[best] * 100, best)
+    assert get_close_match(query, []) is None
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        set_parser_backend("selectolax")
+
+
+def test_sidebar_index_matches_find():
+    soup = BeautifulSoup(read_fixture("anime_1.html"), "html.parser")
+    sidebar = _index_sidebar(soup)
+    for label in ("Japanese", "Type", "Episodes", "Aired", "Studios", "Members", "Missing"):
+        assert get_span_text(soup, label, sidebar) == get_span_text(soup, label)
+    assert get_anime_stats(soup, sidebar) == get_anime_stats(soup)
+
+
+def test_anime_json_roundtrip():
+    anime = _parse_anime_data(read_fixture("anime_1.html"))
+    assert Anime.from_json(anime.model_dump_json()) == anime
+
+
+def test_parse_anime_fields_projection():
+    anime = _parse_anime_data(read_fixture("anime_1.html"), fields=["title", "stats", "genres"])
+    assert anime.id == "1"
+    assert anime.title == "Cowboy Bebop"
+    assert anime.genres == ["Action", "Award Winning", "Sci-Fi"]
+    assert anime.stats.score == "8.75"
+    assert anime.characters is None and anime.related is None and anime.synopsis is None
+    assert Anime.from_json(anime.model_dump_json()) == anime
+
+
+def test_parse_anime_unknown_field():
+    with pytest.raises(ValueError):
+        _parse_anime_data(read_fixture("anime_1.html"), fields=["score"])
+
+
+@pytest.mark.parametrize("name", ["anime_1", "anime_2"])
+def test_lazy_anime_matches_eager(backend, name):
+    html = read_fixture(f"{name}.html")
+    anime = LazyAnime(html)
+    assert anime.parsed_fields() == {"id"}
+    assert anime.genres == _parse_anime_data(html).genres
+    assert "stats" in anime.parsed_fields() and "characters" not in anime.parsed_fields()
+    assert anime.to_anime() == _parse_anime_data(html)
+    assert isinstance(anime, Anime)
+
+
+@pytest.mark.parametrize("name", ["anime_1", "anime_2"])
+def test_benchmark_corpus_matches_fixtures(name):
+    corpus = FIXTURES.parent.parent / "benchmarks" / "corpus"
+    page = (corpus / f"{name}.html").read_text(encoding="utf-8")
+    assert _parse_anime_data(page) == _parse_anime_data(read_fixture(f"{name}.html"))
+
+
+def test_benchmark_runner(tmp_path):
+    from benchmarks.bench_parsers import main
+    output = tmp_path / "bench.json"
+    main(["--repeat", "1", "--warmup", "0", "--output", str(output)])
+    results = json.loads(output.read_text())["results"]
+    assert {key.split("/")[1] for key in results} == {
+        "_parse_anime_data", "LazyAnime", "parse_the_character",
+        "parse_anime_search", "parse_character_search", "parse_top_anime",
+    }
+
+
+@pytest.mark.parametrize("fields", [None, ["title", "stats", "genres"]])
+def test_anime_bytes_roundtrip(fields):
+    anime = _parse_anime_data(read_fixture("anime_1.html"), fields=fields)
+    data = anime.model_dump_bytes()
+    assert Anime.from_bytes(data) == anime
+    assert len(data) < len(anime.model_dump_json())
+    assert LazyAnime(read_fixture("anime_1.html")).model_dump_bytes() == _parse_anime_data(read_fixture("anime_1.html")).model_dump_bytes()
+
+
+def test_character_bytes_roundtrip():
+    character = parse_the_character(read_fixture("character_1.html"))
+    assert Character.from_bytes(character.model_dump_bytes()) == character
+
+
+def test_bytes_version_is_checked():
+    data = _parse_anime_data(read_fixture("anime_1.html")).model_dump_bytes()
+    with pytest.raises(ValueError):
+        Anime.from_bytes(bytes([CODEC_VERSION + 1]) + data[1:])
+    with pytest.raises(ValueError):
+        Character.from_bytes(data)
+
+
+def test_bytes_edge_values():
+    character = parse_the_character(read_fixture("character_1.html"))
+    character.japanese_name = None
+    character.about = {"Age": "", "Note": "a\x00b", "日本": "語"}
+    assert Character.from_bytes(character.model_dump_bytes()) == character
+    character.about = {}
+    character.description = ""
+    assert Character.from_bytes(character.model_dump_bytes()) == character
+
+
+def test_malformed_bytes():
+    data = _parse_anime_data(read_fixture("anime_1.html")).model_dump_bytes()
+    # the marshal payloads of version 1 aren't read anymore
+    for payload in (b"", data[:3], data[:40], data + b"\x00", bytes([1]) + marshal.dumps(("1",) * 20)):
+        with pytest.raises(ValueError):
+            Anime.from_bytes(payload)
+    damaged = bytearray(data)
+    damaged[5:9] = (10 ** 6).to_bytes(4, "little")
+    with pytest.raises(ValueError):
+        Anime.from_bytes(bytes(damaged))
+
+
+def test_codec_benchmark_runner(tmp_path):
+    from benchmarks.bench_codec import main
+    output = tmp_path / "bench.json"
+    main(["--repeat", "1", "--warmup", "0", "--output", str(output)])
+    results = json.loads(output.read_text())["results"]
+    assert {tuple(key.split("/")[:2]) for key in results} == {
+        ("json", "encode"), ("json", "decode"), ("bytes", "encode"), ("bytes", "decode"),
+    }